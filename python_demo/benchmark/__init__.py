@@ -0,0 +1,10 @@
+"""
+压测套件
+用 powerstation.sql（可按比例合成扩充）准备数据，对 /data 和 /qa 接口回放典型的请求组合，
+按场景统计吞吐量和 p50/p95/p99 延迟，并与保存的基线对比，退化超过容差时返回非 0 退出码
+
+用法（在 python_demo 目录下）:
+    python -m benchmark seed --rows 200000
+    python -m benchmark run --start-server --save-baseline
+    python -m benchmark run --start-server
+"""
@@ -0,0 +1,148 @@
+"""
+压测命令行入口
+
+    python -m benchmark seed [--rows N]          准备压测数据（覆盖 powerstation 表）
+    python -m benchmark run [--start-server] ...  运行场景并与基线对比
+    python -m benchmark list                     列出所有场景
+"""
+
+import argparse
+import sys
+
+from .mock_ollama import MockOllama
+from .runner import (DEFAULT_BASELINE_PATH, compare, format_table, load_baseline, run_scenario,
+                     save_results, start_server, stop_server, wait_until_ready)
+from .scenarios import build_scenarios
+from .seed import SEED_BATCH_SIZE, seed_database
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='/data 与 /qa 接口压测')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed = subparsers.add_parser('seed', help='用 powerstation.sql 准备压测数据（会覆盖 powerstation 表）')
+    seed.add_argument('--rows', type=int, default=0,
+                      help='目标总行数，大于原始行数时按原始数据合成扩充，如 100000 (默认: 只导入原始数据)')
+    seed.add_argument('--seed', type=int, default=42, help='合成数据的随机种子 (默认: 42)')
+    seed.add_argument('--batch-size', type=int, default=SEED_BATCH_SIZE,
+                      help=f'每个事务插入的合成行数 (默认: {SEED_BATCH_SIZE})')
+
+    run = subparsers.add_parser('run', help='运行压测场景并与基线对比')
+    run.add_argument('--base-url', default='http://127.0.0.1:8899', help='服务地址 (默认: http://127.0.0.1:8899)')
+    run.add_argument('--scenarios', default='',
+                     help='要运行的场景，逗号分隔 (默认: 全部，见 python -m benchmark list)')
+    run.add_argument('--duration', type=float, default=20, help='每个场景计入统计的秒数 (默认: 20)')
+    run.add_argument('--warmup', type=float, default=3, help='每个场景的预热秒数 (默认: 3)')
+    run.add_argument('--concurrency', type=int, default=8, help='并发线程数 (默认: 8)')
+    run.add_argument('--crud-burst', type=int, default=5, help='crud_burst 场景每次连续新增的条数 (默认: 5)')
+    run.add_argument('--seed', type=int, default=1, help='请求参数的随机种子 (默认: 1)')
+    run.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help='基线文件路径 (默认: benchmark/baseline.json)')
+    run.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线，不做对比')
+    run.add_argument('--tolerance', type=float, default=0.15,
+                     help='允许的退化比例，延迟升高或吞吐量下降超过该比例即失败 (默认: 0.15)')
+    run.add_argument('--output', help='把本次结果另存为 JSON 文件')
+    run.add_argument('--start-server', action='store_true',
+                     help='用 serve.py 在 --base-url 的地址启动服务，压测结束后停止')
+    run.add_argument('--workers', type=int, default=2, help='--start-server 时的 worker 进程数 (默认: 2)')
+    run.add_argument('--threads', type=int, default=8, help='--start-server 时每个 worker 的线程数 (默认: 8)')
+    run.add_argument('--mock-ollama-port', type=int, default=11435,
+                     help='--start-server 时模拟 Ollama 的端口 (默认: 11435)')
+    run.add_argument('--ollama-first-token-ms', type=float, default=200,
+                     help='模拟 Ollama 的首 token 延迟毫秒数 (默认: 200)')
+    run.add_argument('--ollama-token-ms', type=float, default=5,
+                     help='模拟 Ollama 每个 token 的耗时毫秒数 (默认: 5)')
+
+    subparsers.add_parser('list', help='列出所有场景')
+    return parser.parse_args()
+
+
+def command_seed(args):
+    print("开始准备压测数据...")
+    result = seed_database(rows=args.rows, batch_size=args.batch_size, seed=args.seed)
+    print(f"✓ 原始数据 {result['template_rows']} 行，合成 {result['synthetic_rows']} 行，"
+          f"用时 {result['seconds']:.1f} 秒")
+    print("请重启服务，使内存索引加载新数据")
+    return 0
+
+
+def command_run(args):
+    scenarios = build_scenarios(args.crud_burst)
+    if args.scenarios:
+        names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+        unknown = set(names) - {s.name for s in scenarios}
+        if unknown:
+            print(f"未知的场景: {', '.join(sorted(unknown))}")
+            return 2
+        scenarios = [s for s in scenarios if s.name in names]
+
+    mock, server = None, None
+    try:
+        if args.start_server:
+            mock = MockOllama(port=args.mock_ollama_port, first_token_ms=args.ollama_first_token_ms,
+                              token_ms=args.ollama_token_ms).start()
+            print(f"模拟 Ollama: {mock.base_url}")
+            server = start_server(args.base_url, args.workers, args.threads, {'OLLAMA_BASE_URL': mock.base_url})
+        if not wait_until_ready(args.base_url, timeout=120 if server else 5):
+            print(f"服务不可用: {args.base_url}")
+            return 2
+
+        results = {}
+        for scenario in scenarios:
+            print(f"运行场景 {scenario.name}: {scenario.description}")
+            results[scenario.name] = run_scenario(scenario, args.base_url, args.concurrency,
+                                                  args.duration, args.warmup, args.seed)
+    finally:
+        if server:
+            stop_server(server)
+        if mock:
+            mock.stop()
+
+    config = {
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'crud_burst': args.crud_burst,
+        'workers': args.workers if args.start_server else None,
+        'threads': args.threads if args.start_server else None,
+        'ollama_first_token_ms': args.ollama_first_token_ms,
+        'ollama_token_ms': args.ollama_token_ms,
+    }
+    if args.output:
+        save_results(args.output, results, config)
+
+    if args.save_baseline:
+        print(format_table(results))
+        save_results(args.baseline, results, config)
+        print(f"✓ 已保存基线: {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    print(format_table(results, baseline))
+    if baseline is None:
+        print(f"没有基线文件 {args.baseline}，使用 --save-baseline 保存本次结果作为基线")
+        return 0
+    if baseline.get('config') != config:
+        print(f"注意: 本次参数与基线不同，对比结果仅供参考（基线: {baseline.get('config')}）")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("性能退化:")
+        for line in regressions:
+            print(f"  ✗ {line}")
+        return 1
+    print("✓ 没有超过容差的退化")
+    return 0
+
+
+def main():
+    args = parse_args()
+    if args.command == 'seed':
+        return command_seed(args)
+    if args.command == 'list':
+        for scenario in build_scenarios():
+            print(f"{scenario.name:<16}{scenario.description}")
+        return 0
+    return command_run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
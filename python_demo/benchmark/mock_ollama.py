@@ -0,0 +1,103 @@
+"""
+本地模拟 Ollama 服务
+实现 /api/chat（非流式）和 /api/tags，按配置的首 token 延迟和每 token 耗时等待后返回固定格式的回答，
+使问答接口的压测结果只反映本服务自身（数据库读写、上下文拼接、并发限制）的开销
+
+启动 main.py / serve.py 前设置 OLLAMA_BASE_URL 指向本服务
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODEL = 'deepseek-r1:32b'
+
+
+class MockOllama:
+    """在后台线程中运行的模拟 Ollama 服务"""
+
+    def __init__(self, host='127.0.0.1', port=11435, first_token_ms=200.0, token_ms=5.0,
+                 completion_tokens=120, model=DEFAULT_MODEL):
+        """
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0 表示随机端口
+            first_token_ms (float): 首个 token 的延迟（毫秒）
+            token_ms (float): 之后每个 token 的耗时（毫秒）
+            completion_tokens (int): 每次回答的 token 数
+            model (str): /api/tags 返回的模型名
+        """
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.completion_tokens = completion_tokens
+        self.model = model
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send_json(200, {'models': [{'name': mock.model}]})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                if self.path != '/api/chat':
+                    self._send_json(404, {'error': 'not found'})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                self._send_json(200, mock.chat(body))
+
+        return Handler
+
+    def chat(self, body):
+        """模拟一次非流式对话：按提示词长度估算 token 数，等待后返回"""
+        with self._lock:
+            self.request_count += 1
+        prompt_chars = sum(len(m.get('content', '')) for m in body.get('messages', []))
+        prompt_tokens = max(1, prompt_chars // 2)
+        eval_seconds = self.completion_tokens * self.token_ms / 1000
+        time.sleep(self.first_token_ms / 1000 + eval_seconds)
+        return {
+            'model': body.get('model', self.model),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'message': {'role': 'assistant', 'content': '模拟回答：' + '电站' * (self.completion_tokens // 2)},
+            'done': True,
+            'load_duration': 0,
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(self.first_token_ms * 1e6),
+            'eval_count': self.completion_tokens,
+            'eval_duration': int(eval_seconds * 1e9),
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
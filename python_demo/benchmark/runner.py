@@ -0,0 +1,239 @@
+"""
+压测执行与结果对比
+闭环压测：每个线程发完一个请求再发下一个，预热阶段的请求不计入统计；
+结果与基线对比时，延迟或吞吐量的变化超过容差（且超过噪声下限）即视为退化
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+import requests
+
+from .scenarios import new_rng
+
+# 延迟变化小于该毫秒数时视为噪声，不判定退化
+NOISE_FLOOR_MS = 2.0
+
+# 错误率允许上升的绝对值
+ERROR_RATE_TOLERANCE = 0.01
+
+PYTHON_DEMO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+class BenchClient:
+    """单个压测线程使用的 HTTP 客户端，记录每个请求的耗时和状态码"""
+
+    def __init__(self, base_url, timeout=90):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.recording = False
+        self.latencies = []
+        self.operations = {}  # 操作标签 -> 耗时列表
+        self.statuses = Counter()
+
+    def url(self, path):
+        return self.base_url + path
+
+    def request(self, method, path, label, **kwargs):
+        """发出请求并计时；连接失败等异常记为错误，返回 None"""
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.url(path), timeout=self.timeout, **kwargs)
+            response.content  # 计时包含读取完整响应体
+            status = response.status_code
+        except requests.exceptions.RequestException as e:
+            response, status = None, type(e).__name__
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if self.recording:
+            self.latencies.append(elapsed_ms)
+            self.operations.setdefault(label, []).append(elapsed_ms)
+            self.statuses[str(status)] += 1
+        return response
+
+    def get(self, path, label, **kwargs):
+        return self.request('GET', path, label, **kwargs)
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法百分位数，sorted_values 须已排序"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(fraction * len(sorted_values) + 0.999999))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, seconds):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'throughput': round(len(values) / seconds, 2) if seconds else 0.0,
+        'mean_ms': round(sum(values) / len(values), 3) if values else None,
+        'p50_ms': _round(percentile(values, 0.50)),
+        'p95_ms': _round(percentile(values, 0.95)),
+        'p99_ms': _round(percentile(values, 0.99)),
+        'max_ms': _round(values[-1] if values else None),
+    }
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+def run_scenario(scenario, base_url, concurrency=8, duration=20.0, warmup=3.0, seed=1):
+    """
+    运行一个场景
+
+    Args:
+        scenario: scenarios.Scenario
+        base_url (str): 服务地址
+        concurrency (int): 并发线程数
+        duration (float): 计入统计的压测秒数
+        warmup (float): 预热秒数（不计入统计）
+        seed (int): 随机种子
+
+    Returns:
+        dict: 吞吐量、延迟百分位、错误率、状态码分布和各操作的延迟
+    """
+    scenario.setup(BenchClient(base_url))
+    concurrency = min(concurrency, scenario.max_concurrency or concurrency)
+    clients = [BenchClient(base_url) for _ in range(concurrency)]
+    started = time.monotonic()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    def worker(index):
+        client, rng, state = clients[index], new_rng(seed, index), {}
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            client.recording = now >= measure_from
+            try:
+                scenario.run_once(client, rng, state)
+            except Exception as e:
+                # 响应格式不符合预期等，计为错误后继续
+                if client.recording:
+                    client.statuses[type(e).__name__] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies, statuses, operations = [], Counter(), {}
+    for client in clients:
+        latencies.extend(client.latencies)
+        statuses.update(client.statuses)
+        for label, values in client.operations.items():
+            operations.setdefault(label, []).extend(values)
+
+    result = summarize(latencies, duration)
+    total = sum(statuses.values())
+    errors = sum(count for status, count in statuses.items() if not (status.isdigit() and int(status) < 400))
+    result['errors'] = errors
+    result['error_rate'] = round(errors / total, 4) if total else 0.0
+    result['statuses'] = dict(sorted(statuses.items()))
+    result['operations'] = {label: summarize(values, duration) for label, values in sorted(operations.items())}
+    return result
+
+
+def compare(results, baseline, tolerance=0.15):
+    """
+    与基线对比
+
+    Returns:
+        list: 退化说明，空列表表示没有退化
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if current.get(key) is None or base.get(key) is None:
+                continue
+            limit = base[key] * (1 + tolerance)
+            if current[key] > limit and current[key] - base[key] > NOISE_FLOOR_MS:
+                regressions.append(f'{name}: {key} {current[key]:.1f} > 基线 {base[key]:.1f} × {1 + tolerance:.2f}')
+        if base.get('throughput') and current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: 吞吐量 {current['throughput']:.1f} < 基线 {base['throughput']:.1f}"
+                               f" × {1 - tolerance:.2f}")
+        if current['error_rate'] > base.get('error_rate', 0) + ERROR_RATE_TOLERANCE:
+            regressions.append(f"{name}: 错误率 {current['error_rate']:.2%} > 基线 {base.get('error_rate', 0):.2%}")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(path, results, config):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': config,
+            'scenarios': results,
+        }, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def format_table(results, baseline=None):
+    """按场景输出结果表格，有基线时附上与基线相比的 p95 变化"""
+    lines = [f"{'scenario':<16}{'requests':>9}{'req/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}"
+             f"{'p99(ms)':>10}{'errors':>9}{'p95 vs base':>13}"]
+    for name, r in results.items():
+        change = ''
+        base = (baseline or {}).get('scenarios', {}).get(name)
+        if base and base.get('p95_ms') and r.get('p95_ms') is not None:
+            change = f"{(r['p95_ms'] / base['p95_ms'] - 1):+.1%}"
+        lines.append(f"{name:<16}{r['requests']:>9}{r['throughput']:>10.1f}{_fmt(r['p50_ms']):>10}"
+                     f"{_fmt(r['p95_ms']):>10}{_fmt(r['p99_ms']):>10}{r['error_rate']:>9.2%}{change:>13}")
+    return '\n'.join(lines)
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def wait_until_ready(base_url, timeout=120.0):
+    """等待服务可以响应请求"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(base_url.rstrip('/') + '/test-connection', timeout=5).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start_server(base_url, workers=2, threads=8, env=None):
+    """用 serve.py 在 base_url 对应的地址启动服务"""
+    address = urlparse(base_url)
+    return subprocess.Popen(
+        [sys.executable, 'serve.py', '--bind', f'{address.hostname}:{address.port or 80}',
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=PYTHON_DEMO_DIR, env={**os.environ, **(env or {})},
+    )
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
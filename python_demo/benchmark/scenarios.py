@@ -0,0 +1,189 @@
+"""
+压测场景
+每个场景的 run_once 执行一次操作（可能包含多个请求），通过 BenchClient 发出的请求会被计时；
+每个压测线程有独立的随机数生成器和 state 字典（如游标翻页的位置）
+"""
+
+import random
+
+from .seed import load_template_rows
+
+# 与 main.ALLOWED_SORT_FIELDS 一致
+SORT_FIELDS = ['id', 'lng', 'lat', 'annualCarbon', 'capacity', 'coalType',
+               'country', 'plant', 'status', 'type', 'retire1', 'retire2',
+               'retire3', 'start1', 'start2', 'year1', 'year2',
+               'startLabel', 'regionLabel']
+
+SEARCH_FIELD_CHOICES = ['', 'plant', 'country', 'plant,country,regionLabel']
+
+QA_QUESTIONS = [
+    '系统里一共有多少条电站记录？',
+    '如何按装机容量排序查看电站？',
+    '怎么搜索某个国家的电站？',
+    '如何添加一条新的电站数据？',
+    '运行中和已退役的电站有什么区别？',
+    '亚临界和超临界机组分别是什么意思？',
+]
+
+
+class Scenario:
+    """压测场景基类"""
+
+    name = ''
+    description = ''
+    # 场景的最大并发线程数，None 表示使用 --concurrency
+    max_concurrency = None
+
+    def setup(self, client):
+        """正式压测前执行一次（不计时）"""
+
+    def run_once(self, client, rng, state):
+        raise NotImplementedError
+
+
+class DeepPagination(Scenario):
+    name = 'deep_pagination'
+    description = 'offset 分页访问后半部分的深页'
+
+    def setup(self, client):
+        response = client.session.get(client.url('/data'), params={'pageSize': 1}, timeout=60)
+        response.raise_for_status()
+        self.total = max(1, response.json().get('total') or 1)
+
+    def run_once(self, client, rng, state):
+        page_size = rng.choice([20, 50, 100])
+        last_page = max(1, (self.total + page_size - 1) // page_size)
+        page = rng.randint(max(1, last_page // 2), last_page)
+        client.get('/data', 'offset', params={
+            'page': page, 'pageSize': page_size, 'sortBy': 'id', 'sortOrder': rng.choice(['asc', 'desc']),
+        })
+
+
+class CursorScroll(Scenario):
+    name = 'cursor_scroll'
+    description = '游标分页连续向后翻页（模拟无限滚动）'
+
+    # 每个线程连续翻页的最大页数，之后从第一页重新开始
+    MAX_PAGES = 200
+
+    def run_once(self, client, rng, state):
+        if not state.get('cursor') or state.get('pages', 0) >= self.MAX_PAGES:
+            state['sort'] = (rng.choice(['id', 'capacity', 'country']), rng.choice(['asc', 'desc']))
+            state['cursor'], state['pages'] = None, 0
+        sort_by, sort_order = state['sort']
+        params = {'pagination': 'cursor', 'pageSize': 50, 'sortBy': sort_by, 'sortOrder': sort_order}
+        if state['cursor']:
+            params['cursor'] = state['cursor']
+        response = client.get('/data', 'cursor', params=params)
+        state['cursor'] = response.json().get('nextCursor') if response is not None and response.ok else None
+        state['pages'] += 1
+
+
+class SortColumns(Scenario):
+    name = 'sort_columns'
+    description = '依次按每个排序字段和方向查询前 50 页中的一页'
+
+    def run_once(self, client, rng, state):
+        index = state.get('index', rng.randrange(len(SORT_FIELDS) * 2))
+        state['index'] = index + 1
+        field = SORT_FIELDS[index % len(SORT_FIELDS)]
+        order = 'asc' if (index // len(SORT_FIELDS)) % 2 == 0 else 'desc'
+        client.get('/data', field, params={
+            'page': rng.randint(1, 50), 'pageSize': 20, 'sortBy': field, 'sortOrder': order,
+        })
+
+
+class Search(Scenario):
+    name = 'search'
+    description = '用数据中的国家名和电站名关键词搜索，部分按相关度排序'
+
+    def setup(self, client):
+        columns, rows = load_template_rows()
+        country, plant = columns.index('country'), columns.index('plant')
+        terms = {row[country] for row in rows if row[country]}
+        for row in rows:
+            for word in (row[plant] or '').split():
+                if len(word) >= 4 and word.isalpha():
+                    terms.add(word)
+        self.terms = sorted(terms)
+
+    def run_once(self, client, rng, state):
+        params = {'search': rng.choice(self.terms), 'pageSize': 20}
+        fields = rng.choice(SEARCH_FIELD_CHOICES)
+        if fields:
+            params['searchFields'] = fields
+        if rng.random() < 0.3:
+            params['sortBy'] = 'relevance'
+        client.get('/data', 'relevance' if 'sortBy' in params else 'search', params=params)
+
+
+class CrudBurst(Scenario):
+    name = 'crud_burst'
+    description = '连续新增若干条记录，再逐条读取、更新、删除'
+
+    def __init__(self, burst=5):
+        self.burst = burst
+
+    def run_once(self, client, rng, state):
+        ids = []
+        for _ in range(self.burst):
+            response = client.request('POST', '/data', 'create', json={
+                'plant': f'Benchmark plant {rng.randrange(10 ** 9)}',
+                'country': rng.choice(['China', 'India', 'Poland', 'Germany']),
+                'status': 'Operating',
+                'capacity': rng.randint(100, 5000),
+                'lng': round(rng.uniform(-180, 180), 6),
+                'lat': round(rng.uniform(-80, 80), 6),
+            })
+            if response is not None and response.ok:
+                ids.append(response.json()['id'])
+        for new_id in ids:
+            client.get(f'/data/{new_id}', 'read')
+        for new_id in ids:
+            client.request('PUT', f'/data/{new_id}', 'update', json={
+                'capacity': rng.randint(100, 5000), 'status': 'Retired',
+            })
+        for new_id in ids:
+            client.request('DELETE', f'/data/{new_id}', 'delete')
+
+
+class QA(Scenario):
+    name = 'qa'
+    description = '问答请求（需要服务端的 OLLAMA_BASE_URL 指向模拟 Ollama）'
+    # 不超过单个 worker 的问答并发名额，否则大部分请求是立即返回的 503
+    max_concurrency = 2
+
+    def run_once(self, client, rng, state):
+        client.request('POST', '/qa/ask', 'ask', json={
+            'question': rng.choice(QA_QUESTIONS),
+            'user_id': f"bench-{state.setdefault('user', rng.randrange(10 ** 6))}",
+        })
+
+
+class Mixed(Scenario):
+    name = 'mixed'
+    description = '按权重混合以上所有场景（读多写少）'
+
+    def __init__(self, weighted):
+        self.weighted = weighted
+
+    def setup(self, client):
+        for scenario, _ in self.weighted:
+            scenario.setup(client)
+
+    def run_once(self, client, rng, state):
+        scenario = rng.choices([s for s, _ in self.weighted], [w for _, w in self.weighted])[0]
+        scenario.run_once(client, rng, state.setdefault(scenario.name, {}))
+
+
+def build_scenarios(crud_burst=5):
+    """所有场景，按执行顺序排列"""
+    deep, cursor, sort, search = DeepPagination(), CursorScroll(), SortColumns(), Search()
+    crud, qa = CrudBurst(crud_burst), QA()
+    mixed = Mixed([(deep, 15), (cursor, 15), (sort, 30), (search, 25), (crud, 10), (qa, 5)])
+    return [deep, cursor, sort, search, crud, qa, mixed]
+
+
+def new_rng(seed, worker):
+    """每个压测线程独立、可复现的随机数生成器"""
+    return random.Random(seed * 1000003 + worker)
@@ -0,0 +1,116 @@
+"""
+压测数据准备
+先完整导入 powerstation.sql（MySQL 使用 init_database 的导入器，SQLite 重新创建数据库文件），
+再以原始数据为模板合成更多的行
+（坐标、装机容量等数值随机扰动，电站名加序号），随机种子固定，同样的参数得到同样的数据
+"""
+
+import os
+import random
+import time
+
+import pymysql
+
+from init_database import DB_CONFIG, SQL_FILE_PATH, BulkLoader, create_database_if_missing, iter_dump
+from storage import get_storage
+
+# 每个事务插入的合成行数
+SEED_BATCH_SIZE = 2000
+
+# plant 列的长度（varchar(100)）
+PLANT_MAX_LENGTH = 100
+
+
+def load_template_rows(path=SQL_FILE_PATH, table='powerstation'):
+    """读取 SQL 文件中的原始行，作为合成数据的模板"""
+    columns, rows = None, []
+    for item in iter_dump(path):
+        if item[0] == 'rows' and item[1] == table:
+            columns = item[2]
+            rows.extend(item[3])
+    if not rows:
+        raise ValueError(f'SQL 文件中没有 {table} 表的数据')
+    return columns, rows
+
+
+def synthesize(columns, template, count, start_id, seed=42):
+    """
+    以模板行为基础生成 count 行合成数据
+
+    Yields:
+        tuple: 与 columns 顺序一致的一行
+    """
+    rng = random.Random(seed)
+    index = {name: i for i, name in enumerate(columns)}
+    for n in range(count):
+        row = list(template[n % len(template)])
+        row[index['id']] = start_id + n
+        copy = n // len(template) + 2
+        if row[index['plant']] is not None:
+            suffix = f" #{copy}"
+            row[index['plant']] = row[index['plant']][:PLANT_MAX_LENGTH - len(suffix)] + suffix
+        if row[index['lng']] is not None:
+            row[index['lng']] = round(max(-180.0, min(180.0, float(row[index['lng']]) + rng.uniform(-0.5, 0.5))), 6)
+        if row[index['lat']] is not None:
+            row[index['lat']] = round(max(-90.0, min(90.0, float(row[index['lat']]) + rng.uniform(-0.5, 0.5))), 6)
+        factor = rng.uniform(0.5, 1.5)
+        if row[index['capacity']] is not None:
+            row[index['capacity']] = int(int(row[index['capacity']]) * factor)
+        if row[index['annualCarbon']] is not None:
+            row[index['annualCarbon']] = round(float(row[index['annualCarbon']]) * factor, 2)
+        yield tuple(row)
+
+
+def seed_database(rows=0, batch_size=SEED_BATCH_SIZE, seed=42):
+    """
+    准备压测数据（会覆盖 powerstation 表中的现有数据）
+
+    Args:
+        rows (int): 目标总行数，不大于原始行数时只导入原始数据
+        batch_size (int): 每个事务插入的合成行数
+        seed (int): 随机种子
+
+    Returns:
+        dict: 原始行数、合成行数和用时
+    """
+    started = time.perf_counter()
+    storage = get_storage(DB_CONFIG)
+    if storage.name == 'sqlite':
+        # 删除数据库文件，首次获取连接时重新建表并导入 SQL 文件
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(storage.path + suffix):
+                os.remove(storage.path + suffix)
+        connection = storage.connection()
+    else:
+        create_database_if_missing()
+        connection = pymysql.connect(**DB_CONFIG)
+        BulkLoader(connection, SQL_FILE_PATH, force=True).run()
+    try:
+        columns, template = load_template_rows()
+        extra = max(0, rows - len(template))
+        if extra:
+            start_id = max(int(row[columns.index('id')]) for row in template) + 1
+            sql = (f"INSERT INTO powerstation ({', '.join(f'`{c}`' for c in columns)}) "
+                   f"VALUES ({', '.join(['%s'] * len(columns))})")
+            batch = []
+            with connection.cursor() as cursor:
+                for row in synthesize(columns, template, extra, start_id, seed):
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        cursor.executemany(sql, batch)
+                        connection.commit()
+                        batch = []
+                if batch:
+                    cursor.executemany(sql, batch)
+                    connection.commit()
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE powerstation" if storage.name == 'sqlite' else "ANALYZE TABLE powerstation")
+                cursor.fetchall()
+            connection.commit()
+        return {
+            'template_rows': len(template),
+            'synthetic_rows': extra,
+            'seconds': time.perf_counter() - started,
+        }
+    finally:
+        connection.close()
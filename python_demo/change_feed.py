@@ -0,0 +1,199 @@
+"""
+增量变更模块
+GET /data/changes 按变更日志返回某个版本之后新增、更新和删除的行，客户端据此修补本地数据，
+不必在每次增删改后重新加载整页；stream=1 时以 Server-Sent Events 持续推送。
+同一行在一批变更中只返回一次，data 为读取时该行的最新内容，重复应用同一条变更不影响结果
+"""
+
+import json
+import os
+import threading
+import time
+
+import change_log
+from row_codec import TypedDictCursor
+
+# 单次返回的默认和最大变更记录数
+CHANGES_DEFAULT_LIMIT = 500
+CHANGES_MAX_LIMIT = 5000
+
+# 变更日志中的操作类型
+OPS = {'I': 'insert', 'U': 'update', 'D': 'delete'}
+
+# SSE 连接在没有收到本进程变更通知时查询变更日志的间隔秒数（其他进程的写入靠轮询发现）
+CHANGE_STREAM_POLL_INTERVAL = float(os.getenv('CHANGE_STREAM_POLL_INTERVAL', 2))
+
+# 单个 SSE 连接的最长秒数，到期后关闭，浏览器的 EventSource 会带着 Last-Event-ID 自动重连
+CHANGE_STREAM_MAX_SECONDS = float(os.getenv('CHANGE_STREAM_MAX_SECONDS', 60))
+
+# 每个进程同时保持的 SSE 连接数上限（每个连接占用一个处理线程），serve.py 会按线程数设置默认值
+CHANGE_STREAM_MAX_CONNECTIONS = int(os.getenv('CHANGE_STREAM_MAX_CONNECTIONS', 2))
+
+# 没有变更时发送心跳注释的间隔秒数，避免代理断开空闲连接
+HEARTBEAT_INTERVAL = 15
+
+# 客户端断线后的重连间隔毫秒数
+RETRY_MS = 3000
+
+
+class ChangesExpired(Exception):
+    """请求的版本早于保留的变更日志（或新于当前版本），客户端需要重新加载数据"""
+
+
+class ChangeFeed:
+    """读取变更日志并附上变更后的行，供 GET /data/changes 和 SSE 推送使用"""
+
+    def __init__(self, get_connection, fetch_rows, poll_interval=CHANGE_STREAM_POLL_INTERVAL,
+                 max_seconds=CHANGE_STREAM_MAX_SECONDS, max_streams=CHANGE_STREAM_MAX_CONNECTIONS):
+        """
+        Args:
+            get_connection (callable): 返回数据库连接的函数
+            fetch_rows (callable): fetch_rows(cursor, ids) 返回这些 id 当前的完整行
+            poll_interval (float): SSE 连接查询变更日志的间隔秒数
+            max_seconds (float): 单个 SSE 连接的最长秒数
+            max_streams (int): 同时保持的 SSE 连接数上限
+        """
+        self.get_connection = get_connection
+        self.fetch_rows = fetch_rows
+        self.poll_interval = poll_interval
+        self.max_seconds = max_seconds
+        self.max_streams = max(0, max_streams)
+        self._cond = threading.Condition()
+        self._notified = 0   # 收到的变更通知次数
+        self._streams = 0
+        self.rejected_count = 0
+
+    def apply_changes(self, upserted_rows, deleted_ids):
+        """数据变更监听函数：唤醒等待中的 SSE 连接（变更日志在通知之前已经写入）"""
+        with self._cond:
+            self._notified += 1
+            self._cond.notify_all()
+
+    def _connection(self):
+        connection = self.get_connection()
+        if not connection:
+            raise RuntimeError('数据库连接失败')
+        return connection
+
+    def latest_version(self):
+        connection = self._connection()
+        try:
+            return change_log.latest_version(connection)
+        finally:
+            connection.close()
+
+    def read(self, since, limit=CHANGES_DEFAULT_LIMIT):
+        """
+        读取 since 之后的变更
+
+        Returns:
+            dict: since、version（下次请求使用的版本号）、hasMore 和按版本号排列的 changes，
+                每项为 {version, op: insert/update/delete, id, data}，删除时 data 为 None
+
+        Raises:
+            ChangesExpired: since 早于保留的最早变更或新于当前版本
+        """
+        connection = self._connection()
+        try:
+            oldest, latest = change_log.version_range(connection)
+            if since > latest or (oldest is not None and since + 1 < oldest):
+                raise ChangesExpired(f'版本 {since} 已不在变更日志中（当前保留 {oldest or 0} ~ {latest}）')
+            entries, position, has_more = change_log.read_contiguous(connection, since, limit)
+
+            # 同一行只保留最后一次变更的版本号；窗口内新增过的行即使随后又被更新也报告为 insert
+            changed = {}
+            for entry in entries:
+                change = changed.setdefault(entry['row_id'], {'id': entry['row_id'], 'inserted': False})
+                change['version'] = entry['version']
+                change['inserted'] = change['inserted'] or entry['op'] == 'I'
+            rows = {}
+            if changed:
+                with connection.cursor(TypedDictCursor) as cursor:
+                    rows = {row['id']: row for row in self.fetch_rows(cursor, sorted(changed))}
+                connection.commit()
+        finally:
+            connection.close()
+
+        changes = []
+        for change in sorted(changed.values(), key=lambda c: c['version']):
+            row = rows.get(change['id'])
+            if row is None:
+                op = OPS['D']
+            else:
+                op = OPS['I'] if change['inserted'] else OPS['U']
+            changes.append({'version': change['version'], 'op': op, 'id': change['id'], 'data': row})
+        return {'since': since, 'version': position, 'hasMore': has_more, 'changes': changes}
+
+    def open_stream(self, since):
+        """
+        占用一个 SSE 连接名额
+
+        Returns:
+            tuple: (事件生成器, 释放名额的函数)，名额已满时返回 (None, None)
+        """
+        with self._cond:
+            if self._streams >= self.max_streams:
+                self.rejected_count += 1
+                return None, None
+            self._streams += 1
+        released = []
+
+        def release():
+            # 生成器结束和响应关闭时都会调用，只释放一次
+            with self._cond:
+                if not released:
+                    released.append(True)
+                    self._streams -= 1
+
+        def generate():
+            try:
+                yield from self._events(since)
+            finally:
+                release()
+
+        return generate(), release
+
+    def _events(self, since):
+        """SSE 事件：先补发 since 之后的变更，之后有新变更时推送，到达最长时间后结束"""
+        deadline = time.monotonic() + self.max_seconds
+        last_sent = time.monotonic()
+        position = since
+        yield f'retry: {RETRY_MS}\n\n'
+        while time.monotonic() < deadline:
+            with self._cond:
+                notified = self._notified
+            try:
+                result = self.read(position, CHANGES_MAX_LIMIT)
+            except ChangesExpired as e:
+                yield _event('expired', {'since': position, 'message': str(e)})
+                return
+            except Exception as e:
+                print(f"读取变更失败: {e}")
+                result = None
+            if result is not None:
+                position = result['version']
+                if result['changes']:
+                    yield _event('changes', result, position)
+                    last_sent = time.monotonic()
+                    if result['hasMore']:
+                        continue
+            if time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+                yield ': keep-alive\n\n'
+                last_sent = time.monotonic()
+            with self._cond:
+                if self._notified == notified:
+                    self._cond.wait(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'streams': self._streams,
+                'max_streams': self.max_streams,
+                'rejected_count': self.rejected_count,
+            }
+
+
+def _event(name, payload, event_id=None):
+    """格式化一条 SSE 事件（JSON 为单行，不需要拆分 data 行）"""
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {name}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n'
@@ -0,0 +1,365 @@
+"""
+变更日志模块
+写接口提交后把变更的 id 记录到 powerstation_changes 表，版本号自增，
+op 为 I（新增）、U（更新）或 D（删除）。
+多进程部署时，每个 worker 的 ChangeFollower 定期读取其他进程记录的变更，
+重新读取对应行并通过数据变更通知同步本进程的缓存和索引
+"""
+
+import os
+import threading
+import time
+
+import data_events
+
+TABLE = 'powerstation_changes'
+
+# 变更日志保留天数，过期的记录定期清理
+RETENTION_DAYS = int(os.getenv('CHANGE_LOG_RETENTION_DAYS', 7))
+
+# 两次清理之间的最短间隔（秒）
+PRUNE_INTERVAL = 3600
+
+# 版本号出现空洞（并发事务尚未提交）时最多等待的秒数
+GAP_TIMEOUT = 5.0
+
+_initialized = False
+_init_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def origin():
+    """当前进程的标识（fork 后 pid 不同，因此每次调用时计算）"""
+    return f'{os.getpid()}-{data_events.BOOT_ID}'
+
+
+def _dialect(connection):
+    """连接的 SQL 方言（SQLite 后端的连接带有 dialect 属性，见 storage.py）"""
+    return getattr(connection, 'dialect', 'mysql')
+
+
+def ensure_table(connection):
+    """首次使用时创建变更日志表"""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        with connection.cursor() as cursor:
+            if _dialect(connection) == 'sqlite':
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {TABLE} (
+                        version INTEGER PRIMARY KEY AUTOINCREMENT,
+                        row_id INTEGER NOT NULL,
+                        op TEXT NOT NULL,
+                        origin TEXT NOT NULL,
+                        created_at TIMESTAMP NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+                    )
+                """)
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE}_created_at ON {TABLE} (created_at)")
+            else:
+                cursor.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {TABLE} (
+                        version BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                        row_id INT NOT NULL,
+                        op CHAR(1) NOT NULL,
+                        origin VARCHAR(64) NOT NULL,
+                        created_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+                        KEY idx_created_at (created_at)
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+                """)
+        connection.commit()
+        _initialized = True
+
+
+def record(connection, upserted_ids=(), deleted_ids=(), inserted=False):
+    """
+    记录一次写操作变更的 id：在写事务中、提交之前调用，变更记录与数据修改一起提交或回滚。
+    不提交事务，由调用方提交；变更日志表须已创建（见 ensure_table，MySQL 的建表语句会隐式提交事务）
+
+    Args:
+        connection: 数据库连接
+        upserted_ids (list): 新增/更新的 id
+        deleted_ids (list): 删除的 id
+        inserted (bool): upserted_ids 是否为新增的行
+    """
+    global _last_prune
+    op = 'I' if inserted else 'U'
+    entries = [(int(i), op, origin()) for i in upserted_ids]
+    entries += [(int(i), 'D', origin()) for i in deleted_ids]
+    if not entries:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {TABLE} (row_id, op, origin) VALUES (%s, %s, %s)", entries)
+        if time.monotonic() - _last_prune > PRUNE_INTERVAL:
+            _last_prune = time.monotonic()
+            if _dialect(connection) == 'sqlite':
+                cursor.execute(
+                    f"DELETE FROM {TABLE} WHERE created_at < datetime('now', 'localtime', %s)",
+                    (f'-{RETENTION_DAYS} days',)
+                )
+            else:
+                cursor.execute(
+                    f"DELETE FROM {TABLE} WHERE created_at < NOW(3) - INTERVAL %s DAY", (RETENTION_DAYS,)
+                )
+
+
+def latest_version(connection, ensure=True):
+    """
+    返回当前最大的变更版本号，没有记录时返回 0
+
+    Args:
+        connection: 数据库连接
+        ensure (bool): 表不存在时是否创建（只读副本上传 False，表由主库复制过来）
+    """
+    if ensure:
+        ensure_table(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COALESCE(MAX(version), 0) as version FROM {TABLE}")
+        version = int(cursor.fetchone()['version'])
+    connection.commit()
+    return version
+
+
+def latest_change(connection):
+    """
+    Returns:
+        tuple: (最大版本号, 该变更的记录时间)，没有记录时为 (0, None)；
+            记录时间用于区分重建数据库后从头开始的版本号
+    """
+    ensure_table(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT version, created_at FROM {TABLE} ORDER BY version DESC LIMIT 1")
+        row = cursor.fetchone()
+    connection.commit()
+    if row is None:
+        return 0, None
+    return int(row['version']), row['created_at']
+
+
+def _age_sql(connection, column):
+    """column 距今秒数的 SQL 表达式（由数据库计算，不受应用服务器时钟和时区影响）"""
+    if _dialect(connection) == 'sqlite':
+        return f"(julianday('now', 'localtime') - julianday({column})) * 86400"
+    return f"TIMESTAMPDIFF(MICROSECOND, {column}, NOW(3)) / 1000000"
+
+
+def pending_age(connection, version):
+    """
+    版本号大于 version 的最早一条变更距今的秒数（在主库上由数据库计算，没有这样的变更时返回 0），
+    用于衡量只复制到 version 的副本落后多久
+    """
+    ensure_table(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT {_age_sql(connection, 'MIN(created_at)')} as age
+            FROM {TABLE} WHERE version > %s
+        """, (version,))
+        age = cursor.fetchone()['age']
+    connection.commit()
+    return max(0.0, float(age)) if age is not None else 0.0
+
+
+def read_since(connection, version, limit):
+    """读取版本号大于 version 的变更记录（按版本号升序）"""
+    ensure_table(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT version, row_id, op, origin, created_at
+            FROM {TABLE}
+            WHERE version > %s
+            ORDER BY version
+            LIMIT %s
+        """, (version, limit))
+        entries = cursor.fetchall()
+    # 结束只读事务，下一次读取能看到新提交的记录
+    connection.commit()
+    return entries
+
+
+def version_range(connection):
+    """
+    Returns:
+        tuple: (仍保留的最早版本号, 最大版本号)，更早的记录已按保留天数清理；没有记录时为 (None, 0)
+    """
+    ensure_table(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(version) as oldest, MAX(version) as latest FROM {TABLE}")
+        row = cursor.fetchone()
+    connection.commit()
+    if row['oldest'] is None:
+        return None, 0
+    return int(row['oldest']), int(row['latest'])
+
+
+def read_contiguous(connection, version, limit):
+    """
+    读取 version 之后的变更记录，不越过可能尚未提交的空洞
+
+    版本号按插入顺序分配、按提交顺序可见：记录之前缺少的版本号在其后的记录写入不到
+    GAP_TIMEOUT 秒时视为未提交的事务，只返回空洞之前的记录；超过后视为已回滚，跳过空洞
+
+    Returns:
+        tuple: (变更记录列表, 读取到的位置, 是否还有更多记录)
+    """
+    ensure_table(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT version, row_id, op, created_at, {_age_sql(connection, 'created_at')} as age
+            FROM {TABLE}
+            WHERE version > %s
+            ORDER BY version
+            LIMIT %s
+        """, (version, limit))
+        rows = cursor.fetchall()
+    connection.commit()
+    entries, position = [], version
+    for row in rows:
+        if row['version'] != position + 1 and float(row['age'] or 0) < GAP_TIMEOUT:
+            return entries, position, True
+        entries.append(row)
+        position = row['version']
+    return entries, position, len(rows) == limit
+
+
+class ChangeFollower:
+    """
+    后台线程：轮询变更日志，把其他进程的写入同步到本进程
+
+    自增版本号按插入顺序分配、但按提交顺序可见，较小的版本号可能晚于较大的提交。
+    因此只把"已连续读到"的位置作为下次读取的起点，空洞等待 GAP_TIMEOUT 秒后跳过；
+    已处理过的版本号记录在 _seen 中，避免重复通知
+    """
+
+    def __init__(self, get_connection, fetch_rows, interval=1.0, batch_size=500):
+        """
+        Args:
+            get_connection (callable): 返回数据库连接的函数
+            fetch_rows (callable): fetch_rows(cursor, ids) 返回这些 id 当前的完整行
+            interval (float): 轮询间隔秒数
+            batch_size (int): 每次最多读取的变更数
+        """
+        self.get_connection = get_connection
+        self.fetch_rows = fetch_rows
+        self.interval = interval
+        self.batch_size = batch_size
+        self._position = None  # 已连续处理到的版本号
+        self._seen = {}        # 大于 _position 且已处理的版本号 -> 记录时间
+        self._head = (None, None)  # (_position, 该变更的记录时间)，整体替换，读取时无需加锁
+        self._gap_since = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.applied_count = 0
+        self.error_count = 0
+
+    def start(self):
+        """
+        从当前最新版本开始跟随（之前的变更已包含在随后加载的全表数据中）；
+        数据库暂时不可用时由后台线程重试
+        """
+        if self._thread is not None:
+            return
+        try:
+            self._init_position()
+        except Exception as e:
+            print(f"读取变更日志版本失败，稍后重试: {e}")
+        self._thread = threading.Thread(target=self._run, name='change-follower', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def position(self):
+        """已连续处理到的版本号，尚未确定起点时为 None"""
+        return self._position
+
+    @property
+    def head(self):
+        """(已连续处理到的版本号, 该变更的记录时间)，尚未确定起点时为 (None, None)，变更日志为空时记录时间为 None"""
+        return self._head
+
+    def _init_position(self):
+        connection = self.get_connection()
+        if not connection:
+            raise RuntimeError('数据库连接失败')
+        try:
+            version, created_at = latest_change(connection)
+        finally:
+            connection.close()
+        self._position = version
+        self._head = (version, created_at)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self._position is None:
+                    self._init_position()
+                else:
+                    self.poll()
+            except Exception as e:
+                self.error_count += 1
+                print(f"同步变更日志失败: {e}")
+
+    def poll(self):
+        """读取并应用一批新的变更"""
+        connection = self.get_connection()
+        if not connection:
+            raise RuntimeError('数据库连接失败')
+        try:
+            entries = read_since(connection, self._position, self.batch_size)
+            own = origin()
+            changed = set()
+            for entry in entries:
+                if entry['version'] not in self._seen:
+                    self._seen[entry['version']] = entry['created_at']
+                    if entry['origin'] != own:
+                        changed.add(entry['row_id'])
+            if changed:
+                # 重新读取当前行：存在的视为更新，不存在的视为删除，重复应用不影响结果
+                with connection.cursor() as cursor:
+                    rows = self.fetch_rows(cursor, sorted(changed))
+                connection.commit()
+                found = {row['id'] for row in rows}
+                data_events.publish(rows, sorted(changed - found))
+                self.applied_count += len(changed)
+        finally:
+            connection.close()
+        self._advance()
+
+    def _advance(self):
+        created_at = self._head[1]
+        while True:
+            if self._position + 1 in self._seen:
+                self._position += 1
+                created_at = self._seen.pop(self._position)
+                self._gap_since = None
+            elif self._seen:
+                # 后面的版本已经可见，说明 _position + 1 是尚未提交或已回滚的空洞
+                if self._gap_since is None:
+                    self._gap_since = time.monotonic()
+                if time.monotonic() - self._gap_since < GAP_TIMEOUT:
+                    break
+                self._position += 1
+                self._gap_since = None
+            else:
+                break
+        self._head = (self._position, created_at)
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'position': self._position,
+            'pending_versions': len(self._seen),
+            'applied_count': self.applied_count,
+            'error_count': self.error_count,
+        }
+
+
+# 是否记录变更日志
+CHANGE_LOG_ENABLED = os.getenv('CHANGE_LOG_ENABLED', '1') not in ('0', 'false', 'False')
@@ -0,0 +1,189 @@
+"""
+地图聚合模块
+按 Web 墨卡托瓦片坐标为每个缩放级别预先计算网格聚合（金字塔），
+每个网格保存电站数量、装机容量合计、年碳排放合计和各状态数量，
+写接口提交后按差量增减，地图平移时只需返回少量聚合点
+"""
+
+import math
+
+from data_events import SyncedSnapshot
+
+# 预计算的缩放级别 0..MAX_ZOOM，更大的缩放级别使用 MAX_ZOOM 的网格
+MAX_ZOOM = 14
+
+# 每个 256px 瓦片在每个方向上划分的网格数（4 即每个网格约 64px）
+CELLS_PER_TILE = 4
+
+# Web 墨卡托投影的纬度范围
+MAX_LATITUDE = 85.05112878
+
+
+def _world_xy(lng, lat):
+    """经纬度转换为 [0, 1) 范围内的墨卡托平面坐标"""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    x = (lng + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def _grid_size(zoom):
+    return (2 ** zoom) * CELLS_PER_TILE
+
+
+def _cell(x, y, size):
+    return min(int(x * size), size - 1), min(int(y * size), size - 1)
+
+
+class _Cluster:
+    """单个网格的聚合值"""
+
+    __slots__ = ('count', 'capacity', 'annual_carbon', 'lng_sum', 'lat_sum', 'statuses', 'ids')
+
+    def __init__(self):
+        self.count = 0
+        self.capacity = 0
+        self.annual_carbon = 0.0
+        self.lng_sum = 0.0
+        self.lat_sum = 0.0
+        self.statuses = {}
+        self.ids = set()
+
+    def add(self, point, sign):
+        self.count += sign
+        self.capacity += sign * (point['capacity'] or 0)
+        self.annual_carbon += sign * (point['annualCarbon'] or 0.0)
+        self.lng_sum += sign * point['lng']
+        self.lat_sum += sign * point['lat']
+        status = point['status']
+        if status:
+            remaining = self.statuses.get(status, 0) + sign
+            if remaining:
+                self.statuses[status] = remaining
+            else:
+                del self.statuses[status]
+        if sign > 0:
+            self.ids.add(point['id'])
+        else:
+            self.ids.discard(point['id'])
+
+    def to_dict(self):
+        # 状态数量相同时按名称取第一个，保证结果稳定
+        status = min(self.statuses.items(), key=lambda item: (-item[1], item[0]))[0] \
+            if self.statuses else None
+        cluster = {
+            'lng': round(self.lng_sum / self.count, 6),
+            'lat': round(self.lat_sum / self.count, 6),
+            'count': self.count,
+            'capacity': self.capacity,
+            'annualCarbon': round(self.annual_carbon, 4),
+            'status': status,
+        }
+        if self.count == 1:
+            cluster['id'] = next(iter(self.ids))
+        return cluster
+
+
+class ClusterIndex(SyncedSnapshot):
+    """线程安全的多分辨率网格聚合金字塔"""
+
+    def __init__(self):
+        super().__init__()
+        self._points = {}  # id -> (点, 每个缩放级别的网格坐标)
+        self._levels = [{} for _ in range(MAX_ZOOM + 1)]  # 缩放级别 -> {(gx, gy): _Cluster}
+
+    def _rebuild(self, rows):
+        self._points.clear()
+        for level in self._levels:
+            level.clear()
+        for row in rows:
+            self._add(row)
+
+    def _add(self, row):
+        if row.get('lng') is None or row.get('lat') is None:
+            return
+        point = {
+            'id': row['id'],
+            'lng': float(row['lng']),
+            'lat': float(row['lat']),
+            'capacity': int(row['capacity']) if row.get('capacity') is not None else None,
+            'annualCarbon': float(row['annualCarbon']) if row.get('annualCarbon') is not None else None,
+            'status': row.get('status'),
+        }
+        x, y = _world_xy(point['lng'], point['lat'])
+        cells = []
+        for zoom, level in enumerate(self._levels):
+            key = _cell(x, y, _grid_size(zoom))
+            cluster = level.get(key)
+            if cluster is None:
+                cluster = level[key] = _Cluster()
+            cluster.add(point, 1)
+            cells.append(key)
+        self._points[point['id']] = (point, cells)
+
+    def _remove(self, row_id):
+        entry = self._points.pop(row_id, None)
+        if entry is None:
+            return
+        point, cells = entry
+        for level, key in zip(self._levels, cells):
+            cluster = level[key]
+            cluster.add(point, -1)
+            if cluster.count == 0:
+                del level[key]
+
+    def _apply(self, upserted_rows, deleted_ids):
+        for row_id in deleted_ids:
+            self._remove(row_id)
+        for row in upserted_rows:
+            self._remove(row['id'])
+            self._add(row)
+
+    def clusters(self, zoom, min_lng=-180.0, min_lat=-90.0, max_lng=180.0, max_lat=90.0):
+        """
+        返回指定缩放级别下与矩形范围相交的网格聚合
+
+        Args:
+            zoom (int): 缩放级别，大于 MAX_ZOOM 时按 MAX_ZOOM 计算
+            min_lng, min_lat, max_lng, max_lat (float): 范围，min_lng > max_lng 表示跨越 180 度经线
+
+        Returns:
+            list: 聚合点列表（count 为 1 时包含该电站的 id）
+        """
+        zoom = max(0, min(int(zoom), MAX_ZOOM))
+        size = _grid_size(zoom)
+        if min_lng > max_lng:
+            ranges = [(min_lng, 180.0), (-180.0, max_lng)]
+        else:
+            ranges = [(min_lng, max_lng)]
+
+        with self._lock:
+            level = self._levels[zoom]
+            keys = set()
+            for range_min, range_max in ranges:
+                # 墨卡托坐标的 y 轴向南增大
+                x0, y1 = _world_xy(range_min, min_lat)
+                x1, y0 = _world_xy(range_max, max_lat)
+                min_gx, min_gy = _cell(x0, y0, size)
+                max_gx, max_gy = _cell(x1, y1, size)
+                if (max_gx - min_gx + 1) * (max_gy - min_gy + 1) > len(level):
+                    keys.update(k for k in level
+                                if min_gx <= k[0] <= max_gx and min_gy <= k[1] <= max_gy)
+                else:
+                    keys.update((gx, gy) for gx in range(min_gx, max_gx + 1)
+                                for gy in range(min_gy, max_gy + 1) if (gx, gy) in level)
+            return [level[key].to_dict() for key in sorted(keys)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready,
+                'points': len(self._points),
+                'max_zoom': MAX_ZOOM,
+                'cells_per_level': [len(level) for level in self._levels],
+            }
+
+
+# 全局聚合金字塔实例
+cluster_index = ClusterIndex()
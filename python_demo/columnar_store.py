@@ -0,0 +1,481 @@
+"""
+列式内存快照模块
+启动后把 powerstation 全表加载为按列存储的类型化数组：
+数值列使用 array 模块的紧凑数组（配合空值位图），字符串列使用字典编码，
+在内存中完成 GET /data 的过滤、排序、分页以及 GET /data/<id>，
+写接口提交后通过数据变更通知同步（write-through）
+"""
+
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+
+from data_events import SyncedSnapshot
+from filter_query import plan_memory
+from search_index import normalize_text
+
+# 列类型，与 powerstation.sql 中的表结构一致
+DOUBLE_COLUMNS = ['lng', 'lat', 'annualCarbon']
+INT_COLUMNS = ['capacity', 'retire1', 'retire2', 'retire3', 'start1', 'start2', 'year1', 'year2']
+STRING_COLUMNS = ['coalType', 'country', 'plant', 'status', 'type', 'startLabel', 'regionLabel']
+
+# 输出字段顺序，与 SELECT 列表一致
+COLUMNS = ['id', 'lng', 'lat', 'annualCarbon', 'capacity', 'coalType', 'country', 'plant',
+           'status', 'type', 'retire1', 'retire2', 'retire3', 'start1', 'start2', 'year1',
+           'year2', 'startLabel', 'regionLabel']
+
+# 一次写入涉及的行数不超过该值时增量维护已排好的顺序，否则丢弃后按需重新排序
+ORDER_PATCH_LIMIT = 1000
+
+# 字典中不再被任何行引用的值超过该数量且超过仍在使用的值的数量时重新编码
+DICT_PRUNE_MIN = 1024
+
+
+def _bisect_left(order, key_func, target):
+    """order 按 key_func 升序排列，返回第一个键不小于 target 的下标"""
+    lo, hi = 0, len(order)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key_func(order[mid]) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class ColumnarStore(SyncedSnapshot):
+    """线程安全的 powerstation 列式快照"""
+
+    def __init__(self):
+        super().__init__()
+        self._reset()
+
+    def _reset(self):
+        self._ids = array('q')
+        self._pos = {}  # id -> 行位置
+        self._numbers = {c: array('d') for c in DOUBLE_COLUMNS}
+        self._numbers.update({c: array('q') for c in INT_COLUMNS})
+        self._nulls = {c: bytearray() for c in DOUBLE_COLUMNS + INT_COLUMNS}
+        # 字符串字典编码：codes 中 -1 表示 NULL
+        self._codes = {c: array('i') for c in STRING_COLUMNS}
+        self._dict = {c: [] for c in STRING_COLUMNS}
+        self._dict_index = {c: {} for c in STRING_COLUMNS}
+        self._dict_sort_key = {c: [] for c in STRING_COLUMNS}
+        self._dict_refs = {c: [] for c in STRING_COLUMNS}  # 每个字典值被多少行引用
+        self._dict_unused = {c: 0 for c in STRING_COLUMNS}  # 引用数为 0 的字典值个数
+        self._orders = {}  # 排序字段 -> 按升序排列的 id（写入时增量维护）
+        self._value_orders = {}  # 数值字段 -> (非空行位置, 对应的值)，按值升序（写入后失效）
+        self._code_positions = {}  # 字符串字段 -> {编码: 行位置列表}（写入后失效）
+
+    def _rebuild(self, rows):
+        self._reset()
+        for row in rows:
+            self._upsert(row)
+
+    # ---------- 写入 ----------
+
+    def _encode(self, column, value):
+        if value is None:
+            return -1
+        index = self._dict_index[column]
+        code = index.get(value)
+        if code is None:
+            code = len(self._dict[column])
+            index[value] = code
+            self._dict[column].append(value)
+            self._dict_sort_key[column].append(normalize_text(value))
+            self._dict_refs[column].append(0)
+            self._dict_unused[column] += 1
+        return code
+
+    def _set_code(self, column, pos, code):
+        """修改一行的字符串编码，同时维护字典值的引用数"""
+        codes, refs = self._codes[column], self._dict_refs[column]
+        old = codes[pos]
+        if old == code:
+            return
+        if old >= 0:
+            refs[old] -= 1
+            if not refs[old]:
+                self._dict_unused[column] += 1
+        if code >= 0:
+            if not refs[code]:
+                self._dict_unused[column] -= 1
+            refs[code] += 1
+        codes[pos] = code
+
+    def _prune_dictionary(self, column):
+        """不再被引用的值较多时重新编码，字典不随更新无限增长"""
+        refs = self._dict_refs[column]
+        unused = self._dict_unused[column]
+        if unused <= DICT_PRUNE_MIN or unused <= len(refs) - unused:
+            return
+        remap = array('i', [-1]) * len(refs)
+        values, sort_keys, new_refs = [], [], []
+        for code, count in enumerate(refs):
+            if count:
+                remap[code] = len(values)
+                values.append(self._dict[column][code])
+                sort_keys.append(self._dict_sort_key[column][code])
+                new_refs.append(count)
+        codes = self._codes[column]
+        for pos, code in enumerate(codes):
+            if code >= 0:
+                codes[pos] = remap[code]
+        self._dict[column] = values
+        self._dict_index[column] = {value: code for code, value in enumerate(values)}
+        self._dict_sort_key[column] = sort_keys
+        self._dict_refs[column] = new_refs
+        self._dict_unused[column] = 0
+
+    def _upsert(self, row):
+        row_id = int(row['id'])
+        pos = self._pos.get(row_id)
+        if pos is None:
+            pos = len(self._ids)
+            self._pos[row_id] = pos
+            self._ids.append(row_id)
+            for column, values in self._numbers.items():
+                values.append(0)
+                self._nulls[column].append(1)
+            for codes in self._codes.values():
+                codes.append(-1)
+
+        for column, values in self._numbers.items():
+            value = row.get(column)
+            if value is None:
+                values[pos] = 0
+                self._nulls[column][pos] = 1
+            else:
+                values[pos] = float(value) if column in DOUBLE_COLUMNS else int(value)
+                self._nulls[column][pos] = 0
+        for column in self._codes:
+            self._set_code(column, pos, self._encode(column, row.get(column)))
+
+    def _delete(self, row_id):
+        pos = self._pos.pop(row_id, None)
+        if pos is None:
+            return
+        for column in self._codes:
+            self._set_code(column, pos, -1)
+        # 用最后一行填补被删除的位置，保持数组紧凑
+        last = len(self._ids) - 1
+        if pos != last:
+            moved_id = self._ids[last]
+            self._ids[pos] = moved_id
+            self._pos[moved_id] = pos
+            for column, values in self._numbers.items():
+                values[pos] = values[last]
+                self._nulls[column][pos] = self._nulls[column][last]
+            for codes in self._codes.values():
+                codes[pos] = codes[last]
+        self._ids.pop()
+        for column, values in self._numbers.items():
+            values.pop()
+            self._nulls[column].pop()
+        for codes in self._codes.values():
+            codes.pop()
+
+    def _apply(self, upserted_rows, deleted_ids):
+        upserted = {int(row['id']) for row in upserted_rows}
+        changed = upserted | {int(row_id) for row_id in deleted_ids}
+        if len(changed) > ORDER_PATCH_LIMIT:
+            self._orders.clear()
+        # 先按修改前的值把受影响的行从已排好的顺序中移除，写入后再按新值插回
+        for column in list(self._orders):
+            order, key_func = self._orders[column], self._id_key_func(column)
+            for row_id in changed:
+                if row_id not in self._pos:
+                    continue
+                index = _bisect_left(order, key_func, key_func(row_id))
+                if index < len(order) and order[index] == row_id:
+                    del order[index]
+                else:
+                    # 排序结果与数据不一致，丢弃后重新排序
+                    del self._orders[column]
+                    break
+
+        for row_id in deleted_ids:
+            self._delete(int(row_id))
+        for row in upserted_rows:
+            self._upsert(row)
+
+        for column, order in self._orders.items():
+            key_func = self._id_key_func(column)
+            for row_id in upserted:
+                order.insert(_bisect_left(order, key_func, key_func(row_id)), row_id)
+        for column in self._codes:
+            self._prune_dictionary(column)
+        self._value_orders.clear()
+        self._code_positions.clear()
+
+    # ---------- 读取 ----------
+
+    def _row(self, pos):
+        row = {}
+        for column in COLUMNS:
+            if column == 'id':
+                row['id'] = self._ids[pos]
+            elif column in self._numbers:
+                row[column] = None if self._nulls[column][pos] else self._numbers[column][pos]
+            else:
+                code = self._codes[column][pos]
+                row[column] = None if code < 0 else self._dict[column][code]
+        return row
+
+    def _key_func(self, column):
+        """
+        返回行位置的排序键函数，顺序与 MySQL 一致：
+        NULL 最小，字符串按不区分大小写/重音比较，相同值按 id 排序
+        """
+        ids = self._ids
+        if column == 'id':
+            return lambda pos: ids[pos]
+        if column in self._numbers:
+            values, nulls = self._numbers[column], self._nulls[column]
+            return lambda pos: (0, 0, ids[pos]) if nulls[pos] else (1, values[pos], ids[pos])
+        codes, sort_keys = self._codes[column], self._dict_sort_key[column]
+        return lambda pos: (0, '', ids[pos]) if codes[pos] < 0 else (1, sort_keys[codes[pos]], ids[pos])
+
+    def _id_key_func(self, column):
+        """与 _key_func 相同顺序的排序键函数，参数为 id"""
+        if column == 'id':
+            return lambda row_id: row_id
+        key_func, positions = self._key_func(column), self._pos
+        return lambda row_id: key_func(positions[row_id])
+
+    def _value_key(self, column, value, row_id):
+        """把游标中的 (值, id) 转换为与 _key_func 可比较的键"""
+        if column == 'id':
+            return row_id
+        if value is None:
+            return (0, 0 if column in self._numbers else '', row_id)
+        if column in self._numbers:
+            return (1, value, row_id)
+        return (1, normalize_text(value), row_id)
+
+    def _ascending(self, column):
+        """按 column 升序排列的全部 id"""
+        order = self._orders.get(column)
+        if order is None:
+            ids = self._ids
+            order = [ids[pos] for pos in sorted(range(len(ids)), key=self._key_func(column))]
+            self._orders[column] = order
+        return order
+
+    def _filtered(self, column, id_filter):
+        order = self._ascending(column)
+        if id_filter is None:
+            return order
+        return [row_id for row_id in order if row_id in id_filter]
+
+    # ---------- 结构化过滤 ----------
+
+    def _value(self, column, pos):
+        if column == 'id':
+            return self._ids[pos]
+        if column in self._numbers:
+            return None if self._nulls[column][pos] else self._numbers[column][pos]
+        code = self._codes[column][pos]
+        return None if code < 0 else self._dict[column][code]
+
+    def _sorted_values(self, column):
+        """数值字段中非空行按值升序排列的 (行位置列表, 值列表)，用于二分查找"""
+        cached = self._value_orders.get(column)
+        if cached is None:
+            positions = [self._pos[row_id] for row_id in self._ascending(column)]
+            if column != 'id':
+                nulls = self._nulls[column]
+                positions = [pos for pos in positions if not nulls[pos]]
+            values = [self._value(column, pos) for pos in positions]
+            cached = self._value_orders[column] = (positions, values)
+        return cached
+
+    def _positions_by_code(self, column):
+        cached = self._code_positions.get(column)
+        if cached is None:
+            cached = {}
+            for pos, code in enumerate(self._codes[column]):
+                cached.setdefault(code, []).append(pos)
+            self._code_positions[column] = cached
+        return cached
+
+    def _numeric_ranges(self, predicate):
+        """返回满足条件的 (起, 止) 区间列表（在 _sorted_values 中的下标），不支持的运算返回 None"""
+        _, values = self._sorted_values(predicate.field)
+        op, keys = predicate.op, predicate.keys
+        if op == '=':
+            return [(bisect_left(values, keys[0]), bisect_right(values, keys[0]))]
+        if op == 'in':
+            return [(bisect_left(values, k), bisect_right(values, k)) for k in sorted(set(keys))]
+        if op == 'between':
+            return [(bisect_left(values, keys[0]), bisect_right(values, keys[1]))]
+        if op == '>':
+            return [(bisect_right(values, keys[0]), len(values))]
+        if op == '>=':
+            return [(bisect_left(values, keys[0]), len(values))]
+        if op == '<':
+            return [(0, bisect_left(values, keys[0]))]
+        if op == '<=':
+            return [(0, bisect_right(values, keys[0]))]
+        if op == 'notnull':
+            return [(0, len(values))]
+        return None
+
+    def _matching_codes(self, predicate):
+        column = predicate.field
+        return [code for code in self._positions_by_code(column)
+                if predicate.test(None if code < 0 else self._dict[column][code])]
+
+    def _count(self, predicate):
+        """满足条件的精确行数（不逐行扫描）"""
+        column = predicate.field
+        if column in self._codes:
+            positions = self._positions_by_code(column)
+            return sum(len(positions[code]) for code in self._matching_codes(predicate))
+        non_null, _ = self._sorted_values(column)
+        if predicate.op == 'isnull':
+            return len(self._ids) - len(non_null)
+        ranges = self._numeric_ranges(predicate)
+        if ranges is None:
+            # != / not in：非空行减去等于这些值的行
+            excluded = self._numeric_ranges(predicate.__class__(column, 'in', predicate.values))
+            return len(non_null) - sum(max(0, hi - lo) for lo, hi in excluded)
+        return sum(max(0, hi - lo) for lo, hi in ranges)
+
+    def _select(self, predicate):
+        """满足条件的行位置列表"""
+        column = predicate.field
+        if column in self._codes:
+            positions = self._positions_by_code(column)
+            selected = []
+            for code in self._matching_codes(predicate):
+                selected.extend(positions[code])
+            return selected
+        non_null, _ = self._sorted_values(column)
+        if predicate.op == 'isnull':
+            if column == 'id':
+                return []  # 主键不为空
+            nulls = self._nulls[column]
+            return [pos for pos in range(len(self._ids)) if nulls[pos]]
+        ranges = self._numeric_ranges(predicate)
+        if ranges is None:
+            return [pos for pos in non_null if predicate.test(self._value(column, pos))]
+        selected = []
+        for lo, hi in ranges:
+            selected.extend(non_null[lo:hi])
+        return selected
+
+    def filter_ids(self, predicates):
+        """
+        按结构化过滤条件筛选：命中行数最少的条件通过排序位置或字典编码直接取出候选行，
+        其余条件逐行校验
+
+        Returns:
+            tuple: (满足全部条件的 id 集合, QueryPlan)
+        """
+        with self._lock:
+            plan = plan_memory(predicates, self._count)
+            candidates = self._select(plan.driver)
+            for predicate in plan.predicates[1:]:
+                column = predicate.field
+                candidates = [pos for pos in candidates if predicate.test(self._value(column, pos))]
+            ids = self._ids
+            return {ids[pos] for pos in candidates}, plan
+
+    def get(self, row_id):
+        """按 id 获取一行，不存在返回 None"""
+        with self._lock:
+            pos = self._pos.get(row_id)
+            return None if pos is None else self._row(pos)
+
+    def get_many(self, row_ids):
+        """按给定 id 顺序获取多行，跳过不存在的 id"""
+        with self._lock:
+            return [self._row(self._pos[i]) for i in row_ids if i in self._pos]
+
+    def count(self, id_filter=None):
+        with self._lock:
+            if id_filter is None:
+                return len(self._ids)
+            return sum(1 for i in id_filter if i in self._pos)
+
+    def page(self, sort_by, sort_order, offset, limit, id_filter=None):
+        """
+        页码分页
+
+        Returns:
+            tuple: (当前页的行, 符合条件的总数)
+        """
+        with self._lock:
+            order = self._filtered(sort_by, id_filter)
+            total = len(order)
+            if sort_order == 'ASC':
+                row_ids = order[offset:offset + limit]
+            else:
+                start = max(total - offset - limit, 0)
+                end = max(total - offset, 0)
+                row_ids = order[start:end][::-1]
+            return [self._row(self._pos[row_id]) for row_id in row_ids], total
+
+    def seek(self, sort_by, scan_order, cursor_value, cursor_id, limit, id_filter=None):
+        """
+        游标分页：返回按 scan_order 排列、位于游标 (值, id) 之后的最多 limit 行；
+        cursor_id 为 None 时从头开始
+        """
+        with self._lock:
+            order = self._filtered(sort_by, id_filter)
+            if cursor_id is None:
+                start, end = 0, len(order)
+            else:
+                key_func = self._id_key_func(sort_by)
+                target = self._value_key(sort_by, cursor_value, cursor_id)
+                lo = _bisect_left(order, key_func, target)
+                if scan_order == 'ASC':
+                    # 跳过与游标相同的行
+                    if lo < len(order) and key_func(order[lo]) == target:
+                        lo += 1
+                    start, end = lo, len(order)
+                else:
+                    start, end = 0, lo
+
+            if scan_order == 'ASC':
+                row_ids = order[start:min(start + limit, end)]
+            else:
+                row_ids = order[max(end - limit, start):end][::-1]
+            return [self._row(self._pos[row_id]) for row_id in row_ids]
+
+    def match_ids(self, term, fields):
+        """
+        子串匹配搜索（搜索索引不可用时使用）：
+        每个字典值只比较一次，再按编码筛选行
+        """
+        query = normalize_text(term.strip())
+        with self._lock:
+            matched = set()
+            for column in fields:
+                if column not in self._codes:
+                    continue
+                codes_hit = {code for code, key in enumerate(self._dict_sort_key[column]) if query in key}
+                if not codes_hit:
+                    continue
+                codes = self._codes[column]
+                ids = self._ids
+                matched.update(ids[pos] for pos in range(len(ids)) if codes[pos] in codes_hit)
+            return matched
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready,
+                'rows': len(self._ids),
+                'dictionary_sizes': {c: len(v) for c, v in self._dict.items()},
+                'cached_orders': sorted(self._orders),
+            }
+
+
+# 是否启用列式快照（默认关闭，读请求直接查询 MySQL）
+COLUMNAR_ENGINE_ENABLED = os.getenv('COLUMNAR_ENGINE_ENABLED', '0') in ('1', 'true', 'True')
+
+# 全局列式快照实例
+columnar_store = ColumnarStore()
@@ -0,0 +1,77 @@
+"""
+并发限制模块
+为耗时较长的接口（如调用 Ollama 的 /qa/ask）单独划出并发名额，
+名额用完时立即返回 503，不再占用处理线程排队，保证 /data 等接口始终有空闲线程
+"""
+
+import os
+import threading
+from functools import wraps
+
+from flask import jsonify
+
+
+class ConcurrencyLimiter:
+    """线程安全的接口并发名额"""
+
+    def __init__(self, name, max_concurrency, queue_timeout=0.0):
+        """
+        Args:
+            name (str): 名称，用于统计和错误信息
+            max_concurrency (int): 同时处理的最大请求数
+            queue_timeout (float): 名额用完时最多等待的秒数，0 表示不等待
+        """
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._active = 0
+        self.rejected_count = 0
+
+    def __call__(self, view):
+        """接口装饰器"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if self.queue_timeout > 0:
+                acquired = self._semaphore.acquire(timeout=self.queue_timeout)
+            else:
+                acquired = self._semaphore.acquire(blocking=False)
+            if not acquired:
+                with self._lock:
+                    self.rejected_count += 1
+                response = jsonify({
+                    'success': False,
+                    'error': '服务繁忙',
+                    'message': f'{self.name} 同时处理的请求已达上限 ({self.max_concurrency})，请稍后重试'
+                })
+                response.status_code = 503
+                response.headers['Retry-After'] = '5'
+                return response
+            with self._lock:
+                self._active += 1
+            try:
+                return view(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                self._semaphore.release()
+
+        return wrapper
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'active': self._active,
+                'max_concurrency': self.max_concurrency,
+                'rejected_count': self.rejected_count,
+            }
+
+
+# 问答接口的并发名额（每个进程），serve.py 会按线程数设置默认值
+qa_limiter = ConcurrencyLimiter(
+    'qa',
+    int(os.getenv('QA_MAX_CONCURRENCY', 4)),
+    float(os.getenv('QA_QUEUE_TIMEOUT', 0)),
+)
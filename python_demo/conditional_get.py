@@ -0,0 +1,86 @@
+"""
+条件请求模块
+根据数据版本和规范化后的查询参数生成 ETag / Last-Modified，
+客户端携带的 If-None-Match / If-Modified-Since 仍然有效时直接返回 304，
+不执行查询，也不序列化 JSON。
+
+数据版本默认为本进程的变更通知计数（只在本进程内有意义，ETag 中带有进程标识）；
+main.py 在记录变更日志时通过 set_version_source 改用变更日志的版本号，多个 worker 返回一致的 ETag
+"""
+
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request
+
+import data_events
+
+# 数据版本的来源：返回 (版本标识, 最后修改时间戳)，返回 None 时本次响应不带校验头
+_version_source = None
+
+
+def set_version_source(source):
+    """
+    设置数据版本的来源
+
+    Args:
+        source (callable): source() 返回 (版本标识, 最后修改时间戳)；版本标识在所有进程中含义相同，
+            本进程的内存数据尚未同步到该版本时返回 None
+    """
+    global _version_source
+    _version_source = source
+
+
+def _current_version():
+    if _version_source is not None:
+        return _version_source()
+    version, modified_at = data_events.current_version()
+    return f'{data_events.BOOT_ID}.{os.getpid()}.{version}', modified_at
+
+
+def _etag(version):
+    """版本号 + 请求路径和查询参数的摘要"""
+    args = sorted((k, v) for k, v in request.args.items(multi=True) if v != '')
+    digest = hashlib.sha1(repr((request.path, args)).encode('utf-8')).hexdigest()[:16]
+    return f'{version}-{digest}'
+
+
+def conditional_get(view):
+    """
+    GET 接口装饰器：在执行查询之前比较缓存校验头
+
+    版本号在查询之前读取，查询期间发生的写入会使下一次请求得到新的 ETag。
+    只为 200 响应添加校验头，并设置 Cache-Control: no-cache 让浏览器每次都重新验证；
+    无法确定版本时既不返回 304，也不添加校验头。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        current = _current_version()
+        if current is None:
+            return view(*args, **kwargs)
+        version, modified_at = current
+        etag = _etag(version)
+        # HTTP 日期只精确到秒
+        last_modified = datetime.fromtimestamp(int(modified_at), tz=timezone.utc)
+
+        if request.if_none_match:
+            # If-None-Match 优先，存在时忽略 If-Modified-Since
+            matched = request.if_none_match.contains_weak(etag)
+        else:
+            matched = request.if_modified_since is not None and \
+                request.if_modified_since >= last_modified
+
+        if matched:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
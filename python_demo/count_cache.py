@@ -0,0 +1,93 @@
+"""
+总记录数缓存模块
+按规范化后的搜索词缓存 COUNT(*) 结果，写接口提交后整体失效
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_search(search):
+    """规范化搜索词：去首尾空白、合并连续空白、转小写（与 MySQL ci 排序规则一致）"""
+    return ' '.join((search or '').split()).lower()
+
+
+class CountCache:
+    """线程安全、有容量上限和过期时间的总数缓存"""
+
+    def __init__(self, max_entries=1024, ttl=300):
+        """
+        Args:
+            max_entries (int): 最多缓存的搜索词数量，超出时淘汰最久未使用的
+            ttl (float): 缓存过期秒数，兜底处理绕过本服务的写入；0 表示不过期
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (total, cached_at)
+        self._lock = threading.Lock()
+        # 每次失效递增，COUNT 开始前读取、写回时比对，丢弃期间发生写入的旧结果
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """返回缓存的总数，未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                total, cached_at = entry
+                if not self.ttl or time.monotonic() - cached_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return total
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, total, generation):
+        """
+        写入总数
+
+        Args:
+            key (str): 缓存键
+            total (int): COUNT(*) 结果
+            generation (int): 执行 COUNT 前读取的 generation()，期间缓存被失效过则不写入
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (total, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """清空缓存，在数据增删改后调用"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def apply_changes(self, upserted_rows, deleted_ids):
+        """数据变更监听函数：任何写入都可能改变各搜索词的总数，直接清空"""
+        self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# 全局总数缓存实例
+count_cache = CountCache(
+    max_entries=int(os.getenv('COUNT_CACHE_MAX_ENTRIES', 1024)),
+    ttl=float(os.getenv('COUNT_CACHE_TTL', 300)),
+)
@@ -0,0 +1,91 @@
+"""
+游标（keyset）分页模块
+把 (排序字段值, id) 编码为不透明游标，下一次请求用 WHERE 条件定位，
+替代 LIMIT ... OFFSET 的深分页扫描
+"""
+
+import base64
+import json
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析或与当前排序参数不匹配"""
+
+
+def encode_cursor(sort_by, sort_order, direction, row):
+    """
+    根据一行数据生成游标
+
+    Args:
+        sort_by (str): 排序字段
+        sort_order (str): ASC / DESC
+        direction (str): next（向后翻页）/ prev（向前翻页）
+        row (dict): 游标所在行，需包含 sort_by 和 id
+
+    Returns:
+        str: base64url 编码的游标
+    """
+    payload = {
+        's': sort_by,
+        'o': sort_order,
+        'd': direction,
+        'v': row.get(sort_by),
+        'i': row['id'],
+    }
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_by, sort_order):
+    """
+    解析游标
+
+    Returns:
+        tuple: (direction, value, id)
+
+    Raises:
+        InvalidCursorError: 游标格式错误，或排序字段/顺序与请求不一致
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        direction, value, row_id = payload['d'], payload['v'], int(payload['i'])
+    except Exception:
+        raise InvalidCursorError('游标格式错误')
+
+    if direction not in ('next', 'prev'):
+        raise InvalidCursorError('游标格式错误')
+    if payload.get('s') != sort_by or payload.get('o') != sort_order:
+        raise InvalidCursorError('游标与当前的 sortBy / sortOrder 不一致，请从第一页重新查询')
+    return direction, value, row_id
+
+
+def seek_condition(sort_by, scan_order, value, row_id):
+    """
+    构建"位于 (value, row_id) 之后"的 WHERE 条件
+
+    MySQL 中 NULL 在 ASC 时排最前、DESC 时排最后，条件需与
+    ORDER BY {sort_by} {scan_order}, id {scan_order} 的顺序完全一致
+
+    Args:
+        sort_by (str): 排序字段（必须是白名单字段）
+        scan_order (str): 本次扫描方向 ASC / DESC
+        value: 游标行的排序字段值
+        row_id (int): 游标行的 id
+
+    Returns:
+        tuple: (sql 片段, 参数列表)
+    """
+    if sort_by == 'id':
+        op = '>' if scan_order == 'ASC' else '<'
+        return f"id {op} %s", [row_id]
+
+    if scan_order == 'ASC':
+        if value is None:
+            return f"(({sort_by} IS NULL AND id > %s) OR {sort_by} IS NOT NULL)", [row_id]
+        return f"({sort_by} > %s OR ({sort_by} = %s AND id > %s))", [value, value, row_id]
+
+    if value is None:
+        return f"({sort_by} IS NULL AND id < %s)", [row_id]
+    return (f"({sort_by} < %s OR ({sort_by} = %s AND id < %s) OR {sort_by} IS NULL)",
+            [value, value, row_id])
@@ -0,0 +1,128 @@
+"""
+数据变更通知模块
+写接口提交成功后，把新增/更新后的整行数据和被删除的 id 通知给
+各个内存结构（缓存、索引等），使它们与数据库保持同步
+"""
+
+import threading
+import time
+
+_listeners = []
+_lock = threading.Lock()
+
+# 数据版本：每次通知变更后递增，用于生成 ETag
+_version = 0
+_modified_at = time.time()
+
+# 进程启动标识，重启后版本号从 0 开始，需要与之组合才能区分
+BOOT_ID = format(int(time.time() * 1000), 'x')
+
+
+def subscribe(listener):
+    """
+    注册变更监听函数
+
+    Args:
+        listener (callable): listener(upserted_rows, deleted_ids)，
+            upserted_rows 为新增/更新后的完整行（dict 列表），deleted_ids 为 id 列表
+    """
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+    return listener
+
+
+def current_version():
+    """
+    返回当前数据版本
+
+    Returns:
+        tuple: (版本号, 最后修改时间戳)
+    """
+    with _lock:
+        return _version, _modified_at
+
+
+def publish(upserted_rows=(), deleted_ids=()):
+    """
+    通知所有监听函数，单个监听函数出错不影响其他监听函数；
+    所有监听函数处理完成后再递增数据版本，读到新版本时缓存和索引已经同步
+    """
+    global _version, _modified_at
+    upserted_rows = list(upserted_rows)
+    deleted_ids = list(deleted_ids)
+    if not upserted_rows and not deleted_ids:
+        return
+    with _lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(upserted_rows, deleted_ids)
+        except Exception as e:
+            print(f"数据变更通知处理失败 ({getattr(listener, '__name__', listener)}): {e}")
+    with _lock:
+        _version += 1
+        _modified_at = time.time()
+
+
+class SyncedSnapshot:
+    """
+    从全表加载、随数据变更通知保持同步的内存结构基类
+
+    子类实现 _rebuild(rows) 和 _apply(upserted_rows, deleted_ids)，
+    两者都在持有 self._lock 时被调用；读取数据时同样需要持有 self._lock
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ready = False
+        self._loading = False
+        self._pending = []  # 加载期间收到的变更，加载完成后重放
+
+    def is_ready(self):
+        return self._ready
+
+    def ensure_loaded(self, loader):
+        """
+        首次使用时加载全表
+
+        Args:
+            loader (callable): 返回全部行（dict 列表）的函数
+
+        Returns:
+            bool: 是否可用，不可用时调用方应回退到数据库查询
+        """
+        if self._ready:
+            return True
+        with self._lock:
+            if self._ready or self._loading:
+                return self._ready
+            self._loading = True
+        try:
+            rows = loader()
+            with self._lock:
+                self._rebuild(rows)
+                for upserted_rows, deleted_ids in self._pending:
+                    self._apply(upserted_rows, deleted_ids)
+                self._pending.clear()
+                self._ready = True
+            return True
+        except Exception as e:
+            print(f"{type(self).__name__} 加载失败: {e}")
+            return False
+        finally:
+            self._loading = False
+
+    def apply_changes(self, upserted_rows, deleted_ids):
+        """数据变更监听函数"""
+        with self._lock:
+            if self._ready:
+                self._apply(upserted_rows, deleted_ids)
+            elif self._loading:
+                self._pending.append((upserted_rows, deleted_ids))
+
+    def _rebuild(self, rows):
+        raise NotImplementedError
+
+    def _apply(self, upserted_rows, deleted_ids):
+        raise NotImplementedError
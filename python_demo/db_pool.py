@@ -0,0 +1,386 @@
+"""
+数据库连接池模块
+为 main.py 和 qa_handler.py 提供共享的、有上限的 MySQL 连接池
+支持最小/最大连接数、借出时健康检查、连接最大存活时间和借出超时
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import pymysql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class PoolTimeoutError(Exception):
+    """在借出超时时间内没有可用连接"""
+
+
+# 查询观察者：observer(query, args, elapsed, cursor)，每次 execute/executemany 结束后调用，
+# cursor 为底层 pymysql 游标（在其连接上执行的语句不会再通知观察者）
+_query_observers = []
+
+
+def add_query_observer(observer):
+    """注册查询观察者（用于指标统计等），没有观察者时游标不做包装"""
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+
+
+def observe_cursor(cursor):
+    """注册了查询观察者时把游标包装为 ObservedCursor（其他存储后端的连接也通过它接入观察者）"""
+    return ObservedCursor(cursor) if _query_observers else cursor
+
+
+class ObservedCursor:
+    """
+    游标代理
+
+    execute/executemany 结束后把 SQL、参数、耗时和底层游标通知查询观察者，
+    其余属性和方法都转发给底层 pymysql 游标
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def _notify(self, query, args, started):
+        elapsed = time.perf_counter() - started
+        for observer in _query_observers:
+            try:
+                observer(query, args, elapsed, self._cursor)
+            except Exception as e:
+                print(f"查询观察者出错: {e}")
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            self._notify(query, args, started)
+
+    def executemany(self, query, args):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            self._notify(query, args, started)
+
+
+class PooledConnection:
+    """
+    连接池中的连接代理
+
+    除 close() 和 cursor() 外的所有属性和方法都转发给底层 pymysql 连接，
+    close() 不会真正关闭连接，而是把连接归还给连接池；
+    cursor() 在注册了查询观察者时返回 ObservedCursor
+    """
+
+    def __init__(self, pool, raw_conn, created_at):
+        self._pool = pool
+        self._raw = raw_conn
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, cursor=None):
+        raw_cursor = self._raw.cursor(cursor) if cursor else self._raw.cursor()
+        return observe_cursor(raw_cursor)
+
+    def close(self):
+        """归还连接到连接池（可重复调用）"""
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self._raw, self._created_at)
+
+
+class ConnectionPool:
+    """有上限的线程安全 MySQL 连接池"""
+
+    def __init__(self, db_config, min_size=1, max_size=10, max_lifetime=3600,
+                 borrow_timeout=5.0, health_check=True):
+        """
+        初始化连接池
+
+        Args:
+            db_config (dict): pymysql.connect 的参数
+            min_size (int): 保持的最小连接数（借出 + 空闲），不足时在后台线程补建
+            max_size (int): 最大连接数（借出 + 空闲）
+            max_lifetime (float): 连接最大存活秒数，超过后关闭重建
+            borrow_timeout (float): 借出连接时的最长等待秒数
+            health_check (bool): 借出前是否 ping 检查连接可用性
+        """
+        self.db_config = dict(db_config)
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_lifetime = max_lifetime
+        self.borrow_timeout = borrow_timeout
+        self.health_check = health_check
+
+        self._idle = deque()  # (raw_conn, created_at)
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._filling = 0      # 后台线程正在补建的连接数
+        self._fill_retry_at = 0.0  # 补建失败后，到该时间之前不再补建
+        self._reset_at = 0.0  # 早于该时间创建的连接在归还时关闭
+
+        # 统计信息
+        self._borrow_count = 0
+        self._wait_count = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeout_count = 0
+        self._created_count = 0
+        self._discarded_count = 0
+
+    def _create_raw(self):
+        """建立新连接（不持有 _cond 时调用，建连期间不阻塞其他线程借出和归还）"""
+        conn = pymysql.connect(**self.db_config)
+        with self._cond:
+            self._created_count += 1
+        return conn, time.monotonic()
+
+    def _discard(self, raw_conn):
+        with self._cond:
+            self._discarded_count += 1
+        try:
+            raw_conn.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, created_at):
+        if created_at <= self._reset_at:
+            return True
+        return bool(self.max_lifetime) and time.monotonic() - created_at > self.max_lifetime
+
+    def _top_up(self):
+        """连接总数低于 min_size 时启动后台线程补建空闲连接（调用方须持有 _cond）"""
+        missing = self.min_size - (len(self._idle) + self._in_use + self._filling)
+        if missing <= 0 or time.monotonic() < self._fill_retry_at:
+            return
+        self._filling += missing
+        threading.Thread(target=self._fill, args=(missing,), name='db-pool-fill', daemon=True).start()
+
+    def _fill(self, count):
+        """建立 count 个空闲连接，失败时停止，5 秒后的借出或归还再重新补建"""
+        while count:
+            try:
+                item = self._create_raw()
+            except Exception as e:
+                print(f"连接池补建连接失败: {e}")
+                with self._cond:
+                    self._filling -= count
+                    self._fill_retry_at = time.monotonic() + 5
+                return
+            count -= 1
+            with self._cond:
+                self._filling -= 1
+                self._idle.append(item)
+                self._cond.notify()
+
+    def get_connection(self):
+        """
+        从连接池借出一个连接
+
+        Returns:
+            PooledConnection: 连接代理，调用 close() 即归还
+
+        Raises:
+            PoolTimeoutError: 超过 borrow_timeout 仍无可用连接
+        """
+        start = time.monotonic()
+        deadline = start + self.borrow_timeout
+        waited = False
+
+        with self._cond:
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeout_count += 1
+                    raise PoolTimeoutError(
+                        f"等待数据库连接超时 ({self.borrow_timeout}s, 最大连接数 {self.max_size})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            # 先占位，建连和 ping 在锁外进行，避免阻塞其他线程归还连接
+            self._in_use += 1
+            item = self._idle.pop() if self._idle else None
+            self._top_up()
+
+        try:
+            if item is None:
+                raw_conn, created_at = self._create_raw()
+            else:
+                raw_conn, created_at = item
+                if self._is_expired(created_at):
+                    self._discard(raw_conn)
+                    raw_conn, created_at = self._create_raw()
+                elif self.health_check:
+                    try:
+                        raw_conn.ping(reconnect=False)
+                    except Exception:
+                        self._discard(raw_conn)
+                        raw_conn, created_at = self._create_raw()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._borrow_count += 1
+            if waited:
+                wait_time = time.monotonic() - start
+                self._wait_count += 1
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+        return PooledConnection(self, raw_conn, created_at)
+
+    def _release(self, raw_conn, created_at):
+        # 回滚未提交的事务，避免把事务状态和旧的读视图带给下一个借用者
+        reusable = raw_conn.open and not self._is_expired(created_at)
+        if reusable:
+            try:
+                raw_conn.rollback()
+            except Exception:
+                reusable = False
+
+        with self._cond:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append((raw_conn, created_at))
+            else:
+                self._discard(raw_conn)
+            self._cond.notify()
+            # 过期或失效的连接被关闭后，按 min_size 补建
+            self._top_up()
+
+    def stats(self):
+        """返回连接池统计信息，用于调整连接池大小"""
+        with self._cond:
+            return {
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'total': self._in_use + len(self._idle),
+                'min_size': self.min_size,
+                'filling': self._filling,
+                'max_size': self.max_size,
+                'borrow_count': self._borrow_count,
+                'wait_count': self._wait_count,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / self._wait_count, 3)
+                if self._wait_count else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'timeout_count': self._timeout_count,
+                'created_count': self._created_count,
+                'discarded_count': self._discarded_count,
+            }
+
+    def close_all(self):
+        """关闭所有空闲连接（借出中的连接在归还时关闭）"""
+        with self._cond:
+            while self._idle:
+                raw_conn, _ = self._idle.pop()
+                self._discard(raw_conn)
+            self._reset_at = time.monotonic()
+
+    def reset_after_fork(self):
+        """
+        在 fork 出的子进程中调用：丢弃从父进程继承的连接和锁状态
+
+        继承的连接只丢弃引用、不执行 close()，避免向父进程仍在使用的
+        MySQL 会话发送 COM_QUIT；子进程之后按需建立自己的连接
+        """
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._filling = 0
+        self._fill_retry_at = 0.0
+
+
+# 连接池参数，可通过环境变量调整
+POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+    'borrow_timeout': float(os.getenv('DB_POOL_BORROW_TIMEOUT', 5)),
+    'health_check': os.getenv('DB_POOL_HEALTH_CHECK', '1') not in ('0', 'false', 'False'),
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(db_config):
+    return (
+        db_config.get('host'),
+        db_config.get('port', 3306),
+        db_config.get('user'),
+        db_config.get('database'),
+    )
+
+
+def get_pool(db_config):
+    """
+    获取指定数据库配置的共享连接池
+
+    相同 host/port/user/database 的配置共享同一个连接池，
+    因此 main.py 和 QAHandler 使用的是同一组连接
+    """
+    key = _pool_key(db_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_config, **POOL_CONFIG)
+            _pools[key] = pool
+        return pool
+
+
+def reset_pools_after_fork():
+    """fork 之后在子进程中重置所有连接池（多进程部署时在每个 worker 启动时调用）"""
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    for pool in _pools.values():
+        pool.reset_after_fork()
+
+
+def close_all_pools():
+    """关闭所有连接池的空闲连接"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+def all_pool_stats():
+    """返回所有连接池的统计信息"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return [
+        dict(pool.stats(), host=key[0], port=key[1], database=key[3])
+        for key, pool in pools
+    ]
@@ -0,0 +1,333 @@
+"""
+结构化过滤模块
+解析 GET /data 的 filter 参数，例如:
+    capacity>=1000; status in (Operating, Construction); start1 between 2000 and 2010; regionLabel=China
+可编译为参数化 SQL 条件，也可由列式快照在内存中求值；
+查询规划器按估算的命中行数选择最有选择性的条件作为驱动条件
+"""
+
+import re
+import threading
+import time
+
+from row_codec import DOUBLE_COLUMNS, INT_COLUMNS, STRING_COLUMNS
+from search_index import normalize_text
+
+# 可过滤的字段（与可排序字段一致）
+FILTER_FIELDS = list(INT_COLUMNS) + list(DOUBLE_COLUMNS) + list(STRING_COLUMNS)
+
+# 单个请求最多的条件数
+MAX_PREDICATES = 20
+
+# IN 列表最多的值数
+MAX_IN_VALUES = 200
+
+# 驱动条件的估算命中比例低于该值时，SQL 查询强制使用该条件的索引
+FORCE_INDEX_SELECTIVITY = 0.2
+
+_FIELD = r'([A-Za-z][A-Za-z0-9]*)'
+_COMPARE_PATTERN = re.compile(_FIELD + r'\s*(>=|<=|!=|<>|=|>|<)\s*(.*)$', re.S)
+_IN_PATTERN = re.compile(_FIELD + r'\s+(not\s+)?in\s*\((.*)\)$', re.S | re.I)
+_BETWEEN_PATTERN = re.compile(_FIELD + r'\s+between\s+(.+?)\s+and\s+(.+)$', re.S | re.I)
+_NULL_PATTERN = re.compile(_FIELD + r'\s+is\s+(not\s+)?null$', re.S | re.I)
+
+
+class FilterError(ValueError):
+    """filter 参数格式错误"""
+
+
+def _split(text, separator):
+    """按分隔符拆分，忽略引号内的分隔符"""
+    parts, current, quote = [], [], None
+    for ch in text:
+        if quote:
+            current.append(ch)
+            if ch == quote:
+                quote = None
+        elif ch in ('"', "'"):
+            quote = ch
+            current.append(ch)
+        elif ch == separator:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    if quote:
+        raise FilterError('filter 中的引号没有闭合')
+    parts.append(''.join(current))
+    return parts
+
+
+def _parse_value(field, text):
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in ('"', "'"):
+        text = text[1:-1]
+        quoted = True
+    else:
+        quoted = False
+    if field in STRING_COLUMNS:
+        if not text and not quoted:
+            raise FilterError(f'{field} 缺少比较值')
+        return text
+    try:
+        number = float(text)
+    except ValueError:
+        raise FilterError(f'{field} 是数值字段，无法与 {text!r} 比较')
+    if field in INT_COLUMNS and number.is_integer():
+        return int(number)
+    return number
+
+
+class Predicate:
+    """
+    单个过滤条件
+
+    op 取值: = != > >= < <= in notin between isnull notnull
+    """
+
+    def __init__(self, field, op, values=()):
+        self.field = field
+        self.op = op
+        self.values = list(values)
+        # 字符串按不区分大小写/重音比较，与 MySQL 的排序规则一致
+        if field in STRING_COLUMNS:
+            self.keys = [normalize_text(v) for v in self.values]
+            self.key_set = set(self.keys)
+        else:
+            self.keys = self.values
+            self.key_set = set(self.values)
+
+    def sql(self):
+        """返回 (条件片段, 参数列表)"""
+        field = self.field
+        if self.op == 'isnull':
+            return f"{field} IS NULL", []
+        if self.op == 'notnull':
+            return f"{field} IS NOT NULL", []
+        if self.op == 'between':
+            return f"{field} BETWEEN %s AND %s", list(self.values)
+        if self.op in ('in', 'notin'):
+            keyword = 'IN' if self.op == 'in' else 'NOT IN'
+            return f"{field} {keyword} ({','.join(['%s'] * len(self.values))})", list(self.values)
+        op = '<>' if self.op == '!=' else self.op
+        return f"{field} {op} %s", list(self.values)
+
+    def test(self, value):
+        """在内存中判断一个值是否满足条件，NULL 的处理与 SQL 一致"""
+        if self.op == 'isnull':
+            return value is None
+        if value is None:
+            return False
+        if self.op == 'notnull':
+            return True
+        key = normalize_text(value) if self.field in STRING_COLUMNS else value
+        op, keys = self.op, self.keys
+        if op == '=':
+            return key == keys[0]
+        if op == '!=':
+            return key != keys[0]
+        if op == 'in':
+            return key in self.key_set
+        if op == 'notin':
+            return key not in self.key_set
+        if op == 'between':
+            return keys[0] <= key <= keys[1]
+        if op == '>':
+            return key > keys[0]
+        if op == '>=':
+            return key >= keys[0]
+        if op == '<':
+            return key < keys[0]
+        return key <= keys[0]
+
+    def describe(self):
+        """规范化的文本形式，用于缓存键和调试输出"""
+        if self.op == 'isnull':
+            return f'{self.field} is null'
+        if self.op == 'notnull':
+            return f'{self.field} is not null'
+        if self.op == 'between':
+            return f'{self.field} between {self.values[0]!r} and {self.values[1]!r}'
+        if self.op in ('in', 'notin'):
+            keyword = 'in' if self.op == 'in' else 'not in'
+            return f"{self.field} {keyword} ({', '.join(repr(v) for v in self.values)})"
+        return f'{self.field}{self.op}{self.values[0]!r}'
+
+
+def _check_field(field):
+    if field not in FILTER_FIELDS:
+        raise FilterError(f'不支持按 {field} 过滤，可选字段: {", ".join(FILTER_FIELDS)}')
+    return field
+
+
+def _parse_clause(clause):
+    """解析单个条件，返回 Predicate"""
+    match = _NULL_PATTERN.match(clause)
+    if match:
+        field, negate = match.groups()
+        return Predicate(_check_field(field), 'notnull' if negate else 'isnull')
+    match = _IN_PATTERN.match(clause)
+    if match:
+        field, negate, body = match.groups()
+        _check_field(field)
+        items = [v for v in _split(body, ',') if v.strip()]
+        if not items:
+            raise FilterError(f'{field} 的 in 列表不能为空')
+        if len(items) > MAX_IN_VALUES:
+            raise FilterError(f'in 列表最多 {MAX_IN_VALUES} 个值')
+        return Predicate(field, 'notin' if negate else 'in', [_parse_value(field, v) for v in items])
+    match = _BETWEEN_PATTERN.match(clause)
+    if match:
+        field, low, high = match.groups()
+        _check_field(field)
+        return Predicate(field, 'between', [_parse_value(field, low), _parse_value(field, high)])
+    match = _COMPARE_PATTERN.match(clause)
+    if match:
+        field, op, value = match.groups()
+        _check_field(field)
+        return Predicate(field, '!=' if op == '<>' else op, [_parse_value(field, value)])
+    raise FilterError(f'无法解析过滤条件: {clause}')
+
+
+def parse_filter(texts):
+    """
+    解析 filter 参数
+
+    Args:
+        texts (list): filter 参数值列表（可重复传入），每个值内的条件用分号分隔
+
+    Returns:
+        list: Predicate 列表，条件之间为 AND 关系
+    """
+    predicates = []
+    for text in texts:
+        for clause in _split(text or '', ';'):
+            clause = clause.strip()
+            if clause:
+                predicates.append(_parse_clause(clause))
+    if len(predicates) > MAX_PREDICATES:
+        raise FilterError(f'过滤条件最多 {MAX_PREDICATES} 个')
+    return predicates
+
+
+def cache_key(predicates):
+    """过滤条件的规范化键（与条件顺序无关）"""
+    return ';'.join(sorted(p.describe() for p in predicates))
+
+
+class QueryPlan:
+    """查询规划结果"""
+
+    def __init__(self, path, predicates, driver=None, estimated_rows=None, index=None):
+        self.path = path                  # memory / sql-index / sql-scan
+        self.predicates = predicates      # 按估算命中行数从少到多排列
+        self.driver = driver              # 驱动条件
+        self.estimated_rows = estimated_rows
+        self.index = index                # sql-index 时强制使用的索引名
+
+    def describe(self):
+        """用于 X-Query-Plan 调试响应头"""
+        parts = [f'path={self.path}']
+        if self.index:
+            parts.append(f'index={self.index}')
+        if self.driver is not None:
+            parts.append(f'driver={self.driver.describe()}')
+        if self.estimated_rows is not None:
+            parts.append(f'est_rows={self.estimated_rows}')
+        return '; '.join(parts)
+
+
+def plan_memory(predicates, estimate):
+    """
+    列式快照的规划：每个条件都能通过排序位置或字典编码估算精确的命中行数，
+    命中最少的条件作为驱动条件，其余条件逐行校验
+
+    Args:
+        estimate (callable): estimate(predicate) 返回命中行数
+    """
+    estimates = {id(p): estimate(p) for p in predicates}
+    ordered = sorted(predicates, key=lambda p: estimates[id(p)])
+    driver = ordered[0] if ordered else None
+    return QueryPlan('memory', ordered, driver, estimates[id(driver)] if driver else None)
+
+
+def _heuristic_selectivity(predicate, cardinality):
+    """没有精确统计时按索引基数和 MySQL 常用的经验比例估算命中比例"""
+    distinct = max(cardinality or 1, 1)
+    if predicate.op == '=':
+        return 1.0 / distinct
+    if predicate.op == 'in':
+        return min(1.0, len(predicate.values) / distinct)
+    if predicate.op == 'between':
+        return 0.1
+    if predicate.op in ('>', '>=', '<', '<='):
+        return 1.0 / 3
+    if predicate.op == 'isnull':
+        return 0.1
+    return 0.9
+
+
+def plan_sql(predicates, indexes, table_rows):
+    """
+    数据库查询的规划：在有索引的条件中选择估算命中比例最小的作为驱动条件，
+    足够有选择性时强制使用其索引；没有可用索引时为全表扫描
+
+    Args:
+        indexes (dict): {字段: (索引名, 基数)}，只包含以该字段开头的索引
+        table_rows (int): 表的估算行数
+    """
+    scored = []
+    for predicate in predicates:
+        index = indexes.get(predicate.field)
+        cardinality = index[1] if index else None
+        scored.append((_heuristic_selectivity(predicate, cardinality), predicate, index))
+    scored.sort(key=lambda item: item[0])
+    ordered = [predicate for _, predicate, _ in scored]
+
+    # isnull 之外的否定条件无法有效使用索引
+    candidates = [item for item in scored if item[2] and item[1].op not in ('!=', 'notin', 'notnull')]
+    if candidates:
+        selectivity, driver, (index_name, _) = candidates[0]
+        estimated = round(selectivity * table_rows)
+        if selectivity <= FORCE_INDEX_SELECTIVITY:
+            return QueryPlan('sql-index', ordered, driver, estimated, index_name)
+        return QueryPlan('sql-scan', ordered, driver, estimated)
+    return QueryPlan('sql-scan', ordered)
+
+
+class IndexCatalog:
+    """缓存 powerstation 表的索引信息（由存储后端提供），定期刷新"""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._indexes = {}
+        self._table_rows = 0
+
+    def get(self, cursor, storage):
+        """
+        Args:
+            cursor: 数据库游标
+            storage: 存储后端（见 storage.py），提供 index_statistics 和 table_rows
+
+        Returns:
+            tuple: ({字段: (索引名, 基数)}, 表的估算行数)
+        """
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._indexes, self._table_rows
+        indexes = storage.index_statistics(cursor, 'powerstation')
+        table_rows = storage.table_rows(cursor, 'powerstation')
+        with self._lock:
+            self._indexes, self._table_rows = indexes, table_rows
+            self._loaded_at = time.monotonic()
+        return indexes, table_rows
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+# 全局索引信息缓存
+index_catalog = IndexCatalog()
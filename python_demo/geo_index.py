@@ -0,0 +1,202 @@
+"""
+空间索引模块
+把每个电站的经纬度放入进程内的网格索引（按 CELL_SIZE 度划分），
+支持矩形范围、半径（haversine 距离）和 k 近邻查询，
+可与 status / type / coalType 过滤条件组合
+"""
+
+import math
+
+from data_events import SyncedSnapshot
+
+EARTH_RADIUS_KM = 6371.0088
+
+# 网格边长（度）
+CELL_SIZE = 1.0
+
+# 查询结果中返回的字段
+GEO_FIELDS = ['id', 'lng', 'lat', 'plant', 'country', 'status', 'type', 'coalType',
+              'capacity', 'annualCarbon']
+
+# 可用于过滤的字段
+FILTER_FIELDS = ['status', 'type', 'coalType']
+
+
+def haversine_km(lng1, lat1, lng2, lat2):
+    """两点间的大圆距离（公里）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _cell(lng, lat):
+    return int(math.floor(lng / CELL_SIZE)), int(math.floor(lat / CELL_SIZE))
+
+
+def _matches(point, filters):
+    if not filters:
+        return True
+    return all(point.get(field) in values for field, values in filters.items())
+
+
+def _by_distance(points):
+    """按精确距离排序后再把 distanceKm 保留三位小数"""
+    points.sort(key=lambda p: (p['distanceKm'], p['id']))
+    for point in points:
+        point['distanceKm'] = round(point['distanceKm'], 3)
+    return points
+
+
+class GeoIndex(SyncedSnapshot):
+    """线程安全的经纬度网格索引"""
+
+    def __init__(self):
+        super().__init__()
+        self._points = {}  # id -> 点（GEO_FIELDS 组成的 dict）
+        self._cells = {}   # (cx, cy) -> set(id)
+
+    def _rebuild(self, rows):
+        self._points.clear()
+        self._cells.clear()
+        for row in rows:
+            self._add(row)
+
+    def _add(self, row):
+        if row.get('lng') is None or row.get('lat') is None:
+            return
+        point = {field: row.get(field) for field in GEO_FIELDS}
+        point['lng'], point['lat'] = float(point['lng']), float(point['lat'])
+        self._points[point['id']] = point
+        self._cells.setdefault(_cell(point['lng'], point['lat']), set()).add(point['id'])
+
+    def _remove(self, row_id):
+        point = self._points.pop(row_id, None)
+        if point is None:
+            return
+        key = _cell(point['lng'], point['lat'])
+        cell = self._cells.get(key)
+        if cell is not None:
+            cell.discard(row_id)
+            if not cell:
+                del self._cells[key]
+
+    def _apply(self, upserted_rows, deleted_ids):
+        for row_id in deleted_ids:
+            self._remove(row_id)
+        for row in upserted_rows:
+            self._remove(row['id'])
+            self._add(row)
+
+    # ---------- 查询 ----------
+
+    def _candidates(self, min_lng, min_lat, max_lng, max_lat):
+        """返回落在经纬度矩形所覆盖网格内的点（未精确过滤）"""
+        min_cx, min_cy = _cell(min_lng, min_lat)
+        max_cx, max_cy = _cell(max_lng, max_lat)
+        cell_count = (max_cx - min_cx + 1) * (max_cy - min_cy + 1)
+        # 矩形覆盖的网格比点还多时，直接遍历所有点更快
+        if cell_count > len(self._cells):
+            return self._points.values()
+        points = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for row_id in self._cells.get((cx, cy), ()):
+                    points.append(self._points[row_id])
+        return points
+
+    def _in_bbox(self, min_lng, min_lat, max_lng, max_lat, filters):
+        results = []
+        for point in self._candidates(min_lng, min_lat, max_lng, max_lat):
+            if min_lng <= point['lng'] <= max_lng and min_lat <= point['lat'] <= max_lat \
+                    and _matches(point, filters):
+                results.append(point)
+        return results
+
+    def bbox(self, min_lng, min_lat, max_lng, max_lat, filters=None):
+        """
+        矩形范围查询，min_lng > max_lng 表示跨越 180 度经线
+
+        Returns:
+            list: 点列表（按 id 排序）
+        """
+        with self._lock:
+            if min_lng > max_lng:
+                results = self._in_bbox(min_lng, min_lat, 180.0, max_lat, filters) + \
+                    self._in_bbox(-180.0, min_lat, max_lng, max_lat, filters)
+            else:
+                results = self._in_bbox(min_lng, min_lat, max_lng, max_lat, filters)
+        return sorted((dict(p) for p in results), key=lambda p: p['id'])
+
+    def radius(self, lng, lat, radius_km, filters=None):
+        """
+        半径查询
+
+        Returns:
+            list: 点列表（含 distanceKm，按距离排序）
+        """
+        with self._lock:
+            results = self._within(lng, lat, radius_km, filters)
+        return _by_distance(results)
+
+    def _within(self, lng, lat, radius_km, filters):
+        angular = radius_km / EARTH_RADIUS_KM
+        min_lat = lat - math.degrees(angular)
+        max_lat = lat + math.degrees(angular)
+
+        # 计算能包含整个圆的经度范围，圆覆盖极点时取全部经度
+        if min_lat <= -90 or max_lat >= 90 or angular >= math.pi / 2:
+            ranges = [(-180.0, 180.0)]
+        else:
+            ratio = math.sin(angular) / math.cos(math.radians(lat))
+            if ratio >= 1:
+                ranges = [(-180.0, 180.0)]
+            else:
+                delta = math.degrees(math.asin(ratio))
+                min_lng, max_lng = lng - delta, lng + delta
+                if min_lng < -180:
+                    ranges = [(min_lng + 360, 180.0), (-180.0, max_lng)]
+                elif max_lng > 180:
+                    ranges = [(min_lng, 180.0), (-180.0, max_lng - 360)]
+                else:
+                    ranges = [(min_lng, max_lng)]
+        min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+
+        results = []
+        for range_min, range_max in ranges:
+            for point in self._in_bbox(range_min, min_lat, range_max, max_lat, filters):
+                distance = haversine_km(lng, lat, point['lng'], point['lat'])
+                if distance <= radius_km:
+                    results.append(dict(point, distanceKm=distance))
+        return results
+
+    def nearest(self, lng, lat, k, filters=None):
+        """
+        k 近邻查询：从较小的半径开始，找不到 k 个点时半径翻倍
+
+        Returns:
+            list: 最近的 k 个点（含 distanceKm，按距离排序）
+        """
+        radius_km = 50.0
+        max_radius = math.pi * EARTH_RADIUS_KM
+        with self._lock:
+            while True:
+                results = self._within(lng, lat, radius_km, filters)
+                if len(results) >= k or radius_km >= max_radius:
+                    break
+                radius_km = min(radius_km * 2, max_radius)
+        return _by_distance(results)[:k]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready,
+                'points': len(self._points),
+                'cells': len(self._cells),
+                'cell_size_deg': CELL_SIZE,
+            }
+
+
+# 全局空间索引实例
+geo_index = GeoIndex()
@@ -0,0 +1,64 @@
+"""
+ID 分配模块
+通过 id_sequences 序列表原子地预留连续的 id 区间，
+避免 SELECT MAX(id) + 1 在并发插入时分配到相同的 id
+"""
+
+import threading
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def _ensure_sequence(connection, table):
+    """首次使用时创建序列表和对应的序列行"""
+    if table in _initialized:
+        return
+    with _init_lock:
+        if table in _initialized:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS id_sequences (
+                    name VARCHAR(64) NOT NULL PRIMARY KEY,
+                    next_id BIGINT NOT NULL
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """)
+            cursor.execute(
+                "INSERT IGNORE INTO id_sequences (name, next_id) VALUES (%s, 1)", (table,)
+            )
+        connection.commit()
+        _initialized.add(table)
+
+
+def reserve_ids(connection, table, count):
+    """
+    原子地预留 count 个连续 id
+
+    序列行的行锁保证并发请求拿到互不重叠的区间；序列值始终不小于
+    表中 MAX(id) + 1，因此与手工插入或导入的数据也不会冲突。
+    预留后立即提交，插入失败时被预留的 id 会留下空洞。
+
+    Args:
+        connection: 数据库连接（调用时不应有未提交的事务）
+        table (str): 表名，同时作为序列名
+        count (int): 预留数量
+
+    Returns:
+        int: 区间中的第一个 id
+    """
+    if count < 1:
+        raise ValueError('预留的 id 数量必须大于 0')
+    _ensure_sequence(connection, table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE id_sequences
+            SET next_id = LAST_INSERT_ID(
+                GREATEST(next_id, (SELECT COALESCE(MAX(id), 0) + 1 FROM {table})) + %s
+            )
+            WHERE name = %s
+        """, (count, table))
+        cursor.execute("SELECT LAST_INSERT_ID() as next_id")
+        next_id = int(cursor.fetchone()['next_id'])
+    connection.commit()
+    return next_id - count
@@ -1,88 +1,642 @@
-import subprocess
+"""
+数据库初始化脚本
+直接用 PyMySQL 流式解析 powerstation.sql，把逐行的 INSERT 合并为批量插入后导入，
+不再依赖 mysql 命令行工具。
+
+导入后记录 SQL 文件的校验和以及每一行的哈希：
+- 文件未变化时直接跳过（只需一次查询）
+- 文件变化但表结构相同时，只新增/更新/删除有差异的行（增量导入）
+- 表不存在、表结构变化或指定 --force 时完整导入：先写入临时表，
+  数据插入完成后再建二级索引，最后原子地替换原表
+
+用法:
+    python init_database.py [--force] [--batch-size 1000]
+"""
+
+import argparse
+import hashlib
+import json
 import os
+import re
+import time
+
+import pymysql
 from dotenv import load_dotenv
+
+import change_log
+
 load_dotenv()
 # 数据库配置
 DB_CONFIG = {
     'host': 'localhost',
     'user': 'root',
     'password': os.getenv("mysql_password"),  # 请修改为你的MySQL密码
-    'database': 'quanzhan_demo'
+    'database': 'quanzhan_demo',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
 }
 
-def table_has_data():
-    """检查 powerstation 表是否存在且有数据"""
-    try:
-        # 查询表中的数据行数
-        if DB_CONFIG['password']:
-            cmd = f"mysql -h {DB_CONFIG['host']} -u {DB_CONFIG['user']} -p{DB_CONFIG['password']} {DB_CONFIG['database']} -e \"SELECT COUNT(*) FROM powerstation;\""
-        else:
-            cmd = f"mysql -h {DB_CONFIG['host']} -u {DB_CONFIG['user']} {DB_CONFIG['database']} -e \"SELECT COUNT(*) FROM powerstation;\""
-        
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        # 如果执行出错（比如表不存在），returncode != 0
-        if result.returncode != 0:
-            return False
-        
-        # 解析返回结果
-        if result.stdout:
-            lines = result.stdout.strip().split('\n')
-            if len(lines) >= 2:
-                try:
-                    count = int(lines[1].strip())
-                    return count > 0
-                except:
-                    return False
-        return False
-    except Exception as e:
-        print(f"检查表数据时出错: {e}")
-        return False
+SQL_FILE_PATH = os.path.join(os.path.dirname(__file__), 'powerstation.sql')
 
-def init_database_from_sql():
-    """通过 mysql 命令行执行 SQL 文件初始化数据库"""
-    try:
-        # 检查表是否存在且有数据
-        if table_has_data():
-            print(f"✓ 表 'powerstation' 已存在且有数据，跳过导入")
-            return True
-        
-        # 获取 SQL 文件路径
-        sql_file_path = os.path.join(os.path.dirname(__file__), 'powerstation.sql')
-        
-        if not os.path.exists(sql_file_path):
-            print(f"错误: SQL 文件不存在: {sql_file_path}")
-            return False
-        
-        print("表不存在或无数据，正在导入...")
-        
-        # 构建 mysql 命令
-        # mysql -u 用户名 -p 数据库名 < /path/to/file.sql
-        if DB_CONFIG['password']:
-            cmd = f"mysql -h {DB_CONFIG['host']} -u {DB_CONFIG['user']} -p{DB_CONFIG['password']} {DB_CONFIG['database']} < {sql_file_path}"
+# 记录每个表最近一次导入的 SQL 文件校验和与表结构校验和
+STATE_TABLE = 'data_load_state'
+
+# 记录最近一次导入的每一行的哈希，用于计算增量
+ROWS_TABLE = 'data_load_rows'
+
+# 每条批量 INSERT 的行数
+DEFAULT_BATCH_SIZE = 1000
+
+# 完整导入时使用的临时表后缀
+STAGING_SUFFIX = '__load'
+
+_CREATE_PATTERN = re.compile(r'CREATE TABLE\s+`?(\w+)`?\s*\((.*)\)([^()]*)$', re.S | re.I)
+_COLUMN_PATTERN = re.compile(r'^\s*`(\w+)`\s+(\w+)', re.M)
+_PRIMARY_KEY_PATTERN = re.compile(r'PRIMARY KEY\s*\(\s*`?(\w+)`?\s*\)', re.I)
+_INSERT_PATTERN = re.compile(r'INSERT INTO\s+`?(\w+)`?\s*\((.*?)\)\s*VALUES\s*(.*);\s*$', re.S | re.I)
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'", re.S)
+_VALUE_TOKEN = re.compile(r"""\s*(?:
+    (?P<open>\() | (?P<close>\)) | (?P<comma>,) |
+    (?P<string>'(?:[^'\\]|\\.|'')*') |
+    (?P<null>NULL\b) |
+    (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+)""", re.S | re.X | re.I)
+_ESCAPES = {'0': '\0', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a', 'b': '\b'}
+
+_INT_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint')
+_FLOAT_TYPES = ('float', 'double', 'real', 'decimal', 'numeric')
+
+
+class DumpTable:
+    """SQL 文件中一个表的结构"""
+
+    def __init__(self, create_sql):
+        match = _CREATE_PATTERN.match(create_sql.strip().rstrip(';'))
+        if not match:
+            raise ValueError(f'无法解析建表语句: {create_sql[:80]}')
+        self.name = match.group(1)
+        self.create_sql = create_sql.strip().rstrip(';')
+        body = match.group(2)
+        self.columns = []
+        self.types = {}
+        for column, column_type in _COLUMN_PATTERN.findall(body):
+            self.columns.append(column)
+            self.types[column] = column_type.lower()
+        primary_key = _PRIMARY_KEY_PATTERN.search(body)
+        if not primary_key:
+            raise ValueError(f'表 {self.name} 没有单列主键，无法计算增量')
+        self.key = primary_key.group(1)
+        # 去掉空白差异后的建表语句校验和，结构变化时需要完整导入
+        self.schema_checksum = hashlib.sha1(' '.join(self.create_sql.split()).encode('utf-8')).hexdigest()
+
+    def staging_sql(self):
+        """创建临时表的语句（与原表结构相同，只有主键索引）"""
+        return _CREATE_PATTERN.sub(
+            lambda m: f'CREATE TABLE `{self.name}{STAGING_SUFFIX}` ({m.group(2)}){m.group(3)}',
+            self.create_sql, count=1,
+        )
+
+    def coerce(self, column, value):
+        """按列类型转换值，使 SQL 文件中的值与数据库读出的值可以直接比较"""
+        if value is None:
+            return None
+        column_type = self.types.get(column, '')
+        if column_type in _INT_TYPES:
+            return value if isinstance(value, int) else int(float(value))
+        if column_type in _FLOAT_TYPES:
+            return float(value)
+        return str(value)
+
+
+def row_hash(values):
+    """一行（按列顺序的值）的哈希"""
+    text = json.dumps(values, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def file_checksum(path):
+    """
+    计算 SQL 文件的校验和，同时找出其中创建的表
+
+    Returns:
+        tuple: (sha256 十六进制字符串, 表名列表)
+    """
+    digest = hashlib.sha256()
+    tables = []
+    with open(path, 'rb') as f:
+        for line in f:
+            digest.update(line)
+            if line[:12].upper() == b'CREATE TABLE':
+                match = re.match(rb'CREATE TABLE\s+`?(\w+)`?', line, re.I)
+                if match:
+                    tables.append(match.group(1).decode('ascii'))
+    return digest.hexdigest(), tables
+
+
+def iter_statements(path):
+    """流式读取 SQL 文件，逐条返回语句（去掉注释，保留末尾分号）"""
+    buffer = []
+    in_comment = False
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not buffer:
+                stripped = line.strip()
+                if in_comment:
+                    in_comment = '*/' not in stripped
+                    continue
+                if stripped.startswith('/*') and '*/' not in stripped:
+                    in_comment = True
+                    continue
+                if not stripped or stripped.startswith('--') or stripped.startswith('/*'):
+                    continue
+            buffer.append(line)
+            if line.rstrip().endswith(';'):
+                statement = ''.join(buffer)
+                # 分号位于未闭合的字符串中时继续读取下一行
+                if "'" not in _STRING_LITERAL.sub('', statement):
+                    buffer = []
+                    yield statement.strip()
+    if buffer and ''.join(buffer).strip():
+        yield ''.join(buffer).strip()
+
+
+def _unescape(literal):
+    text = literal[1:-1].replace("''", "'")
+    if '\\' not in text:
+        return text
+    return re.sub(r'\\(.)', lambda m: _ESCAPES.get(m.group(1), m.group(1)), text, flags=re.S)
+
+
+def parse_values(text):
+    """
+    解析 VALUES 之后的值列表，支持一条语句插入多行
+
+    Returns:
+        list: 每行一个元组
+    """
+    rows, current, position = [], None, 0
+    while position < len(text):
+        match = _VALUE_TOKEN.match(text, position)
+        if not match:
+            if text[position:].strip() == '':
+                break
+            raise ValueError(f'无法解析的值: {text[position:position + 40]}')
+        position = match.end()
+        kind = match.lastgroup
+        if kind == 'open':
+            current = []
+        elif kind == 'close':
+            rows.append(tuple(current))
+            current = None
+        elif kind == 'comma':
+            continue
+        elif current is None:
+            raise ValueError(f'值不在括号内: {text[match.start():match.start() + 40]}')
+        elif kind == 'string':
+            current.append(_unescape(match.group('string')))
+        elif kind == 'null':
+            current.append(None)
         else:
-            cmd = f"mysql -h {DB_CONFIG['host']} -u {DB_CONFIG['user']} {DB_CONFIG['database']} < {sql_file_path}"
-        
-        # 执行命令
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print("✓ 数据库初始化成功！")
-            print(f"✓ 数据库: {DB_CONFIG['database']}")
-            print(f"✓ 表 'powerstation' 创建成功！")
-            return True
+            number = match.group('number')
+            current.append(int(number) if re.fullmatch(r'[-+]?\d+', number) else float(number))
+    return rows
+
+
+def iter_dump(path):
+    """
+    解析 SQL 文件
+
+    Yields:
+        tuple: ('table', DumpTable) 或 ('rows', 表名, 列名列表, 行元组列表)；
+        其他语句（SET、DROP TABLE、BEGIN/COMMIT 等）由导入流程自行处理，忽略
+    """
+    for statement in iter_statements(path):
+        head = statement[:12].upper()
+        if head == 'CREATE TABLE':
+            yield ('table', DumpTable(statement))
+        elif head.startswith('INSERT'):
+            match = _INSERT_PATTERN.match(statement)
+            if not match:
+                raise ValueError(f'无法解析插入语句: {statement[:80]}')
+            table, columns, values = match.groups()
+            columns = [c.strip().strip('`') for c in columns.split(',')]
+            yield ('rows', table, columns, parse_values(values))
+
+
+class BulkLoader:
+    """把 SQL 文件导入 MySQL，支持跳过未变化的数据和增量导入"""
+
+    def __init__(self, connection, path, batch_size=DEFAULT_BATCH_SIZE, force=False):
+        """
+        Args:
+            connection: pymysql 连接（DictCursor）
+            path (str): SQL 文件路径
+            batch_size (int): 每条批量 INSERT 的行数
+            force (bool): 忽略已记录的校验和，完整导入
+        """
+        self.connection = connection
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.force = force
+
+    def _execute(self, sql, args=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, args)
+            return cursor.fetchall()
+
+    def _ensure_state_tables(self):
+        self._execute(f"""
+            CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+                table_name VARCHAR(64) NOT NULL PRIMARY KEY,
+                source_checksum CHAR(64) NOT NULL,
+                schema_checksum CHAR(40) NOT NULL,
+                row_count INT NOT NULL,
+                loaded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+        self._execute(f"""
+            CREATE TABLE IF NOT EXISTS {ROWS_TABLE} (
+                table_name VARCHAR(64) NOT NULL,
+                row_id BIGINT NOT NULL,
+                row_hash CHAR(40) NOT NULL,
+                PRIMARY KEY (table_name, row_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+
+    def _table_exists(self, table):
+        return bool(self._execute("""
+            SELECT 1 FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,)))
+
+    def _table_columns(self, table):
+        rows = self._execute("""
+            SELECT COLUMN_NAME as column_name FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            ORDER BY ORDINAL_POSITION
+        """, (table,))
+        return [row['column_name'] for row in rows]
+
+    def _state(self, table):
+        rows = self._execute(f"SELECT * FROM {STATE_TABLE} WHERE table_name = %s", (table,))
+        return rows[0] if rows else None
+
+    def _secondary_indexes(self, table):
+        """读取表上除主键外的索引定义，完整导入后在新表上重建"""
+        rows = self._execute("""
+            SELECT INDEX_NAME as index_name, NON_UNIQUE as non_unique, COLUMN_NAME as column_name,
+                   SUB_PART as sub_part
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME <> 'PRIMARY'
+            ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """, (table,))
+        indexes = {}
+        for row in rows:
+            column = f"`{row['column_name']}`"
+            if row['sub_part']:
+                column += f"({row['sub_part']})"
+            indexes.setdefault(row['index_name'], (not int(row['non_unique']), []))[1].append(column)
+        return indexes
+
+    def run(self):
+        """
+        执行导入
+
+        Returns:
+            dict: 每个表的导入结果 {表名: {'mode': skip/full/incremental, ...}}
+        """
+        checksum, tables = file_checksum(self.path)
+        self._ensure_state_tables()
+        self.connection.commit()
+
+        if not self.force and tables and all(
+            self._table_exists(t) and (self._state(t) or {}).get('source_checksum') == checksum
+            for t in tables
+        ):
+            return {t: {'mode': 'skip'} for t in tables}
+
+        results = {}
+        loader = None
+        for item in iter_dump(self.path):
+            if item[0] == 'table':
+                if loader:
+                    results[loader.table.name] = loader.finish()
+                loader = self._table_loader(item[1], checksum)
+            else:
+                _, table, columns, rows = item
+                if loader is None or loader.table.name != table:
+                    raise ValueError(f'表 {table} 的插入语句出现在建表语句之前')
+                loader.add(columns, rows)
+        if loader:
+            results[loader.table.name] = loader.finish()
+        return results
+
+    def _table_loader(self, table, checksum):
+        """根据已记录的状态选择完整导入或增量导入"""
+        if self.force or not self._table_exists(table.name):
+            return _FullLoad(self, table, checksum)
+        state = self._state(table.name)
+        if state is not None:
+            if state['schema_checksum'] != table.schema_checksum:
+                return _FullLoad(self, table, checksum)
+            baseline = {row['row_id']: row['row_hash'] for row in self._execute(
+                f"SELECT row_id, row_hash FROM {ROWS_TABLE} WHERE table_name = %s", (table.name,)
+            )}
         else:
-            print(f"✗ 执行 SQL 文件出错: {result.stderr}")
+            # 之前用 mysql 命令行导入、没有记录状态：与表中当前的数据比较
+            if self._table_columns(table.name) != table.columns:
+                return _FullLoad(self, table, checksum)
+            columns = ', '.join(f'`{c}`' for c in table.columns)
+            baseline = {}
+            for row in self._execute(f"SELECT {columns} FROM `{table.name}`"):
+                values = [table.coerce(c, row[c]) for c in table.columns]
+                baseline[row[table.key]] = row_hash(values)
+        return _IncrementalLoad(self, table, checksum, baseline)
+
+
+class _TableLoad:
+    """单个表的导入过程"""
+
+    def __init__(self, loader, table, checksum):
+        self.loader = loader
+        self.table = table
+        self.checksum = checksum
+        self.hashes = {}  # 主键 -> 行哈希
+        self.started_at = time.perf_counter()
+        self.key_index = table.columns.index(table.key)
+        self._reorder = None
+
+    def _values(self, columns, row):
+        """把插入语句中的一行转换为按建表列顺序排列、类型统一的值列表"""
+        if columns != self.table.columns:
+            if self._reorder is None or self._reorder[0] != columns:
+                self._reorder = (columns, [columns.index(c) if c in columns else None
+                                           for c in self.table.columns])
+            row = [row[i] if i is not None else None for i in self._reorder[1]]
+        return [self.table.coerce(c, v) for c, v in zip(self.table.columns, row)]
+
+    def _insert_sql(self, table_name, upsert=False):
+        columns = ', '.join(f'`{c}`' for c in self.table.columns)
+        sql = (f"INSERT INTO `{table_name}` ({columns}) "
+               f"VALUES ({', '.join(['%s'] * len(self.table.columns))})")
+        if upsert:
+            sql += ' ON DUPLICATE KEY UPDATE ' + ', '.join(
+                f'`{c}` = VALUES(`{c}`)' for c in self.table.columns if c != self.table.key
+            )
+        return sql
+
+    def _write_batch(self, sql, rows):
+        # PyMySQL 的 executemany 会把单行 INSERT 改写为多行 INSERT 一次发送
+        with self.loader.connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def _save_state(self, cursor, changed_hashes, removed_ids, replace_all=False):
+        name = self.table.name
+        if replace_all:
+            cursor.execute(f"DELETE FROM {ROWS_TABLE} WHERE table_name = %s", (name,))
+        elif removed_ids:
+            cursor.executemany(
+                f"DELETE FROM {ROWS_TABLE} WHERE table_name = %s AND row_id = %s",
+                [(name, i) for i in removed_ids],
+            )
+        items = [(name, key, value) for key, value in changed_hashes.items()]
+        for start in range(0, len(items), self.loader.batch_size):
+            cursor.executemany(
+                f"INSERT INTO {ROWS_TABLE} (table_name, row_id, row_hash) VALUES (%s, %s, %s) "
+                f"ON DUPLICATE KEY UPDATE row_hash = VALUES(row_hash)",
+                items[start:start + self.loader.batch_size],
+            )
+        cursor.execute(f"""
+            INSERT INTO {STATE_TABLE} (table_name, source_checksum, schema_checksum, row_count)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE source_checksum = VALUES(source_checksum),
+                schema_checksum = VALUES(schema_checksum), row_count = VALUES(row_count),
+                loaded_at = CURRENT_TIMESTAMP
+        """, (name, self.checksum, self.table.schema_checksum, len(self.hashes)))
+
+    def _logs_changes(self):
+        """是否通过变更日志通知正在运行的服务（多进程部署时由 ChangeFollower 同步）"""
+        return change_log.CHANGE_LOG_ENABLED and self.table.name == 'powerstation'
+
+    def _record_changes(self, upserted_ids, deleted_ids):
+        """完整导入替换原表之后单独记录变更（RENAME TABLE 会隐式提交，无法与导入放在同一个事务中）"""
+        if not self._logs_changes():
+            return
+        connection = self.loader.connection
+        try:
+            change_log.ensure_table(connection)
+            change_log.record(connection, upserted_ids, deleted_ids)
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            print(f"记录变更日志失败: {e}")
+
+    def _elapsed(self):
+        return time.perf_counter() - self.started_at
+
+
+class _FullLoad(_TableLoad):
+    """完整导入：写入临时表，插入完成后建二级索引，再原子替换原表"""
+
+    def __init__(self, loader, table, checksum):
+        super().__init__(loader, table, checksum)
+        self.staging = table.name + STAGING_SUFFIX
+        self.existed = loader._table_exists(table.name)
+        self.indexes = loader._secondary_indexes(table.name) if self.existed else {}
+        loader._execute(f"DROP TABLE IF EXISTS `{self.staging}`")
+        loader._execute(table.staging_sql())
+        # 唯一性由主键保证，导入期间关闭额外检查
+        loader._execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        self.sql = self._insert_sql(self.staging)
+        self.pending = []
+
+    def add(self, columns, rows):
+        for row in rows:
+            values = self._values(columns, row)
+            self.hashes[values[self.key_index]] = row_hash(values)
+            self.pending.append(values)
+            if len(self.pending) >= self.loader.batch_size:
+                self._write_batch(self.sql, self.pending)
+                self.pending = []
+
+    def finish(self):
+        loader = self.loader
+        connection = loader.connection
+        try:
+            if self.pending:
+                self._write_batch(self.sql, self.pending)
+                self.pending = []
+            # 所有行在同一个事务中插入
+            connection.commit()
+            insert_seconds = self._elapsed()
+
+            if self.indexes:
+                # 数据插入完成后一次性建立全部二级索引
+                clauses = [
+                    f"ADD {'UNIQUE ' if unique else ''}INDEX `{name}` ({', '.join(columns)})"
+                    for name, (unique, columns) in self.indexes.items()
+                ]
+                loader._execute(f"ALTER TABLE `{self.staging}` {', '.join(clauses)}")
+
+            old_ids = []
+            if self.existed:
+                old_ids = [row[self.table.key] for row in loader._execute(
+                    f"SELECT `{self.table.key}` FROM `{self.table.name}`"
+                )]
+                backup = self.table.name + '__old'
+                loader._execute(f"DROP TABLE IF EXISTS `{backup}`")
+                loader._execute(
+                    f"RENAME TABLE `{self.table.name}` TO `{backup}`, `{self.staging}` TO `{self.table.name}`"
+                )
+                loader._execute(f"DROP TABLE `{backup}`")
+            else:
+                loader._execute(f"RENAME TABLE `{self.staging}` TO `{self.table.name}`")
+
+            with connection.cursor() as cursor:
+                self._save_state(cursor, self.hashes, (), replace_all=True)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            loader._execute(f"DROP TABLE IF EXISTS `{self.staging}`")
+            raise
+        finally:
+            loader._execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+
+        if self.existed:
+            self._record_changes(sorted(self.hashes), sorted(set(old_ids) - set(self.hashes)))
+        return {
+            'mode': 'full',
+            'rows': len(self.hashes),
+            'indexes': len(self.indexes),
+            'insert_seconds': insert_seconds,
+            'seconds': self._elapsed(),
+        }
+
+
+class _IncrementalLoad(_TableLoad):
+    """增量导入：只写入与上次导入相比有变化的行，删除 SQL 文件中已不存在的行"""
+
+    def __init__(self, loader, table, checksum, baseline):
+        super().__init__(loader, table, checksum)
+        self.baseline = baseline
+        self.sql = self._insert_sql(table.name, upsert=True)
+        self.pending = []
+        self.changed = {}  # 主键 -> 新的行哈希
+        if self._logs_changes():
+            # 变更记录与导入在同一个事务中提交，建表语句会隐式提交，须在写入之前执行
+            change_log.ensure_table(loader.connection)
+
+    def add(self, columns, rows):
+        for row in rows:
+            values = self._values(columns, row)
+            key = values[self.key_index]
+            digest = row_hash(values)
+            self.hashes[key] = digest
+            if self.baseline.get(key) != digest:
+                self.changed[key] = digest
+                self.pending.append(values)
+                if len(self.pending) >= self.loader.batch_size:
+                    self._write_batch(self.sql, self.pending)
+                    self.pending = []
+
+    def finish(self):
+        connection = self.loader.connection
+        removed = sorted(set(self.baseline) - set(self.hashes))
+        try:
+            if self.pending:
+                self._write_batch(self.sql, self.pending)
+            with connection.cursor() as cursor:
+                for start in range(0, len(removed), self.loader.batch_size):
+                    batch = removed[start:start + self.loader.batch_size]
+                    cursor.execute(
+                        f"DELETE FROM `{self.table.name}` WHERE `{self.table.key}` IN "
+                        f"({', '.join(['%s'] * len(batch))})", batch,
+                    )
+                self._save_state(cursor, self.changed, removed)
+            if self._logs_changes() and (self.changed or removed):
+                change_log.record(connection, sorted(self.changed), removed)
+            # 变更的行、删除、导入状态和变更日志在同一个事务中提交
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+        return {
+            'mode': 'incremental',
+            'rows': len(self.hashes),
+            'changed': len(self.changed),
+            'deleted': len(removed),
+            'seconds': self._elapsed(),
+        }
+
+
+def create_database_if_missing():
+    """数据库不存在时创建"""
+    config = {k: v for k, v in DB_CONFIG.items() if k != 'database'}
+    connection = pymysql.connect(**config)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE DATABASE IF NOT EXISTS `{DB_CONFIG['database']}` "
+                f"DEFAULT CHARACTER SET utf8mb4"
+            )
+    finally:
+        connection.close()
+
+
+def _print_result(table, result):
+    mode = result['mode']
+    if mode == 'skip':
+        print(f"✓ 表 '{table}' 的数据与 SQL 文件一致，跳过导入")
+    elif mode == 'full':
+        rate = result['rows'] / result['insert_seconds'] if result['insert_seconds'] else 0
+        print(f"✓ 表 '{table}' 完整导入 {result['rows']} 行，插入用时 {result['insert_seconds']:.2f} 秒"
+              f"（{rate:,.0f} 行/秒），总用时 {result['seconds']:.2f} 秒")
+        if result['indexes']:
+            print(f"✓ 已重建 {result['indexes']} 个二级索引")
+    else:
+        print(f"✓ 表 '{table}' 增量导入：共 {result['rows']} 行，更新 {result['changed']} 行，"
+              f"删除 {result['deleted']} 行，用时 {result['seconds']:.2f} 秒")
+
+
+def init_database_from_sql(force=False, batch_size=DEFAULT_BATCH_SIZE):
+    """用 SQL 文件初始化或更新数据库"""
+    try:
+        if not os.path.exists(SQL_FILE_PATH):
+            print(f"错误: SQL 文件不存在: {SQL_FILE_PATH}")
             return False
-            
+
+        create_database_if_missing()
+        connection = pymysql.connect(**DB_CONFIG)
+        try:
+            results = BulkLoader(connection, SQL_FILE_PATH, batch_size=batch_size, force=force).run()
+        finally:
+            connection.close()
+
+        for table, result in results.items():
+            _print_result(table, result)
+        print(f"✓ 数据库: {DB_CONFIG['database']}")
+        return True
+
     except Exception as e:
         print(f"初始化数据库时出错: {e}")
         return False
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='用 powerstation.sql 初始化数据库')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略已记录的校验和，完整重新导入')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'每条批量 INSERT 的行数 (默认: {DEFAULT_BATCH_SIZE})')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
+    args = parse_args()
     print("开始初始化数据库...")
-    success = init_database_from_sql()
+    success = init_database_from_sql(force=args.force, batch_size=args.batch_size)
     if success:
         print("数据库初始化完成！")
     else:
-        print("数据库初始化失败！")
\ No newline at end of file
+        print("数据库初始化失败！")
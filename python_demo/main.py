@@ -1,16 +1,51 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, g
 import pymysql
 import pymysql.cursors
 from flask_cors import CORS
 from datetime import datetime
 import os
+import io
+import csv
+import json
+import math
+import time
+import threading
+import hmac
+from collections import namedtuple
 from dotenv import load_dotenv
 from qa_handler import qa_handler
+from db_pool import all_pool_stats, add_query_observer
+from cursor_pagination import encode_cursor, decode_cursor, seek_condition, InvalidCursorError
+from count_cache import count_cache, normalize_search
+from search_index import search_index, parse_search_fields, normalize_text, SEARCH_INDEX_ENABLED
+from columnar_store import columnar_store, COLUMNAR_ENGINE_ENABLED
+from row_codec import TypedDictCursor, TypedSSDictCursor, normalize_rows, DOUBLE_COLUMNS, INT_COLUMNS
+from geo_index import geo_index, FILTER_FIELDS as GEO_FILTER_FIELDS
+from cluster_index import cluster_index, MAX_ZOOM as CLUSTER_MAX_ZOOM
+from stats_index import stats_index, parse_group_by, parse_metrics
+from conditional_get import conditional_get, set_version_source
+from filter_query import parse_filter, plan_sql, cache_key as filter_cache_key, index_catalog, QueryPlan
+import change_log
+from change_log import ChangeFollower, CHANGE_LOG_ENABLED
+from change_feed import ChangeFeed, ChangesExpired, CHANGES_DEFAULT_LIMIT, CHANGES_MAX_LIMIT
+from concurrency_limit import qa_limiter
+from query_usage import QueryShape, QueryUsageRecorder, QUERY_USAGE_ENABLED, QUERY_USAGE_FLUSH_INTERVAL
+from row_json_cache import (row_json_cache, splice_json, negotiate_encoding, compress,
+                            ROW_JSON_CACHE_ENABLED, RESPONSE_COMPRESSION_ENABLED, COMPRESS_MIN_SIZE)
+from result_cache import result_cache, RESULT_CACHE_ENABLED
+import data_events
+import metrics
+from storage import get_storage, get_replica_storages
+from replica_router import ReplicaRouter
+from slow_query_log import slow_query_log, SLOW_QUERY_LOG_ENABLED, ADMIN_TOKEN
 
 load_dotenv()
 password = os.getenv("mysql_password")
 app = Flask(__name__)
-CORS(app)  # 允许跨域请求
+CORS(app, expose_headers=['X-Query-Plan', 'X-Read-Token', 'X-DB-Node'])  # 允许跨域请求，前端可读取查询规划调试头和读写分离的响应头
+metrics.init_app(app)  # 请求耗时、查询次数等指标，导出在 GET /metrics
+if SLOW_QUERY_LOG_ENABLED:
+    add_query_observer(slow_query_log.observe)  # 超过阈值的语句记录到慢查询日志，见 GET /admin/slow-queries
 print("PASSWORD",password)
 # 数据库配置
 DB_CONFIG = {
@@ -22,15 +57,451 @@ DB_CONFIG = {
     'cursorclass': pymysql.cursors.DictCursor
 }
 
+# 存储后端（STORAGE_BACKEND=mysql/sqlite，与 QAHandler 共享同一组连接）
+storage = get_storage(DB_CONFIG)
+
 def get_db_connection():
-    """获取数据库连接"""
+    """从存储后端获取数据库连接，close() 时归还连接池"""
+    try:
+        with metrics.phase('db_connect'):
+            connection = storage.connection()
+    except Exception as e:
+        print(f"数据库连接失败: {e}")
+        return None
+    if CHANGE_LOG_ENABLED:
+        # 变更日志在写事务中记录，而 MySQL 的建表语句会隐式提交事务，因此在开始事务之前建表
+        try:
+            change_log.ensure_table(connection)
+        except Exception as e:
+            print(f"创建变更日志表失败: {e}")
+    return connection
+
+# 只读副本（DB_REPLICAS 为空时不做读写分离，所有查询使用主库）
+replica_router = ReplicaRouter(storage, get_replica_storages(DB_CONFIG))
+
+def read_token():
+    """请求头 X-Read-Token 中的版本号，没有时为 0，无法解析时为 None"""
     try:
-        connection = pymysql.connect(**DB_CONFIG)
+        return int(request.headers.get('X-Read-Token') or 0)
+    except ValueError:
+        return None
+
+def read_token_ahead():
+    """读写分离时，请求要求的版本是否新于本进程已同步的版本（此时进程内缓存的结果还不包含那次写入）"""
+    if not replica_router.enabled:
+        return False
+    token = read_token()
+    return token is None or token > max(replica_router.watermark, change_follower.position or 0)
+
+def get_read_connection():
+    """
+    读接口使用的数据库连接：配置了只读副本时按路由策略选择副本，
+    副本须已复制到请求头 X-Read-Token 的版本和本进程已同步的版本，否则使用主库
+    """
+    if not replica_router.enabled:
+        return get_db_connection()
+    token = read_token()
+    # 无法解析的令牌按尚未复制处理
+    min_version = None if token is None else max(token, change_follower.position or 0)
+    try:
+        with metrics.phase('db_connect'):
+            connection, g.db_node = replica_router.connection(min_version)
         return connection
     except Exception as e:
         print(f"数据库连接失败: {e}")
         return None
 
+@app.after_request
+def add_replica_headers(response):
+    """读写分离时返回读请求使用的节点，以及写入后供读己之写使用的令牌"""
+    if replica_router.enabled:
+        if 'db_node' in g:
+            response.headers['X-DB-Node'] = g.db_node
+        if 'read_token' in g:
+            response.headers['X-Read-Token'] = str(g.read_token)
+    return response
+
+# 允许排序的字段
+ALLOWED_SORT_FIELDS = ['id', 'lng', 'lat', 'annualCarbon', 'capacity', 'coalType',
+                       'country', 'plant', 'status', 'type', 'retire1', 'retire2',
+                       'retire3', 'start1', 'start2', 'year1', 'year2',
+                       'startLabel', 'regionLabel']
+
+# 列表查询返回的字段
+SELECT_COLUMNS = ', '.join(ALLOWED_SORT_FIELDS)
+
+# 允许写入的字段（id 由服务端分配）
+ALLOWED_FIELDS = [field for field in ALLOWED_SORT_FIELDS if field != 'id']
+
+def coerce_field(field, value):
+    """
+    按列类型校验并转换写入的值：数值字段接受数字或数字字符串（空字符串视为 null），
+    整数字段必须是整数。非法值在写入前拒绝，两种存储后端都返回 400
+
+    Raises:
+        ValueError: 值与字段类型不符
+    """
+    if value is None or (field not in INT_COLUMNS and field not in DOUBLE_COLUMNS):
+        return value
+    if value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f'{field} 必须是数字')
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f'{field} 必须是数字')
+    if not math.isfinite(number):
+        raise ValueError(f'{field} 必须是数字')
+    if field in INT_COLUMNS:
+        if not number.is_integer():
+            raise ValueError(f'{field} 必须是整数')
+        return value if isinstance(value, int) else int(number)
+    return value if isinstance(value, (int, float)) else number
+
+# 批量插入单次请求的最大记录数和每个事务的行数
+BULK_MAX_RECORDS = 10000
+BULK_CHUNK_SIZE = 500
+
+# 批量更新遇到死锁或锁等待超时时整批执行的最多次数
+BATCH_UPDATE_ATTEMPTS = int(os.getenv('BATCH_UPDATE_ATTEMPTS', 3))
+
+# 估算总数时抽样的行数
+ESTIMATE_SAMPLE_SIZE = 1000
+
+def load_all_rows():
+    """读取 powerstation 全表，用于构建内存索引"""
+    connection = get_db_connection()
+    if not connection:
+        raise RuntimeError('数据库连接失败')
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {SELECT_COLUMNS} FROM powerstation")
+            return cursor.fetchall()
+    finally:
+        connection.close()
+
+def fetch_rows_by_ids(cursor, ids):
+    """按 id 分批读取完整行"""
+    rows = []
+    for batch in id_batches(ids):
+        placeholders = ','.join(['%s'] * len(batch))
+        cursor.execute(f"SELECT {SELECT_COLUMNS} FROM powerstation WHERE id IN ({placeholders})", batch)
+        rows.extend(cursor.fetchall())
+    return rows
+
+# 本进程已记录变更日志、但尚未通知缓存和索引的请求数，不为 0 时条件请求不使用变更日志的版本号
+_publishing = 0
+_publishing_lock = threading.Lock()
+
+def _begin_publishing():
+    global _publishing
+    if not g.get('publishing'):
+        g.publishing = True
+        with _publishing_lock:
+            _publishing += 1
+
+@app.teardown_request
+def _end_publishing(exc=None):
+    """请求结束（或通知完成）时清除标记；记录了变更日志但随后回滚的请求同样在这里清除"""
+    global _publishing
+    if g.get('publishing'):
+        g.publishing = False
+        with _publishing_lock:
+            _publishing -= 1
+
+def log_changes(cursor, upserted_ids=(), deleted_ids=(), inserted=False):
+    """
+    在写事务中、提交之前记录变更日志（inserted 表示 upserted_ids 是新增的行），
+    变更记录与数据修改一起提交或回滚；失败时抛出异常，调用方不应提交
+    """
+    if not CHANGE_LOG_ENABLED:
+        return
+    # 提交之后、通知缓存之前，其他请求已经能读到新的版本号
+    _begin_publishing()
+    change_log.record(cursor.connection, upserted_ids, [int(i) for i in deleted_ids], inserted)
+
+def publish_changes(cursor, upserted_ids=(), deleted_ids=()):
+    """写操作提交后（变更日志已由 log_changes 在同一事务中记录），读取变更后的整行并通知缓存和索引"""
+    deleted_ids = [int(i) for i in deleted_ids]
+    try:
+        if CHANGE_LOG_ENABLED:
+            try:
+                version = change_log.latest_version(cursor.connection)
+                _note_written_version(version)
+                if replica_router.enabled:
+                    # 读己之写：客户端带上该版本号读取时，只使用已复制到该版本的副本
+                    g.read_token = version
+                    replica_router.note_version(version)
+            except Exception as e:
+                print(f"读取变更日志版本失败: {e}")
+        rows = []
+        try:
+            rows = fetch_rows_by_ids(cursor, upserted_ids)
+        except Exception as e:
+            print(f"读取变更数据失败: {e}")
+        data_events.publish(rows, deleted_ids)
+    finally:
+        _end_publishing()
+
+# 多进程部署时同步其他 worker 写入的变更（由 serve.py 在每个 worker 中启动）
+change_follower = ChangeFollower(get_db_connection, fetch_rows_by_ids)
+
+# 本进程写入后读到的变更日志最大版本号，ChangeFollower 跟随到该版本之前 ETag 不使用其位置
+_written_version = 0
+
+def _note_written_version(version):
+    global _written_version
+    with _publishing_lock:
+        _written_version = max(_written_version, version)
+
+def etag_version():
+    """
+    条件请求使用的数据版本：本进程已同步到的变更日志版本号，所有 worker 含义相同。
+    ChangeFollower 运行时直接使用它已连续处理到的位置，不访问数据库；
+    本进程的写入正在通知缓存、或尚未被 ChangeFollower 跟随到时返回 None，
+    此时响应不带校验头，避免把旧内容标记为新版本。
+    ChangeFollower 未运行（单进程直接启动）时读取变更日志的最大版本号
+    """
+    # 先取版本号再检查写入标记：写接口在提交之前就已设置标记
+    if change_follower.running:
+        version, created_at = change_follower.head
+        if version is None:
+            return None
+    else:
+        connection = get_db_connection()
+        if not connection:
+            return None
+        try:
+            version, created_at = change_log.latest_change(connection)
+        except Exception as e:
+            print(f"读取变更日志版本失败: {e}")
+            return None
+        finally:
+            connection.close()
+    with _publishing_lock:
+        if _publishing or version < _written_version:
+            return None
+    if created_at is None:
+        return 'v0', data_events.current_version()[1]
+    # 最后修改时间同样取自变更日志；记录时间也用于区分重建数据库后从头开始的版本号
+    modified_at = created_at.timestamp()
+    return f"v{version}.{format(int(modified_at * 1000), 'x')}", modified_at
+
+if CHANGE_LOG_ENABLED:
+    set_version_source(etag_version)
+
+# GET /data/changes 的增量变更和 SSE 推送
+change_feed = ChangeFeed(get_db_connection, fetch_rows_by_ids)
+
+# 记录 GET /data 使用的排序/过滤组合及耗时，供 manage_indexes.py 推荐索引
+query_usage = QueryUsageRecorder(get_db_connection, QUERY_USAGE_FLUSH_INTERVAL)
+
+# 索引推荐只支持 MySQL，其他存储后端不记录查询用法
+RECORD_QUERY_USAGE = QUERY_USAGE_ENABLED and storage.name == 'mysql'
+
+# 数据变更后需要同步的内存结构
+data_events.subscribe(count_cache.apply_changes)
+data_events.subscribe(search_index.apply_changes)
+data_events.subscribe(columnar_store.apply_changes)
+data_events.subscribe(geo_index.apply_changes)
+data_events.subscribe(cluster_index.apply_changes)
+data_events.subscribe(stats_index.apply_changes)
+data_events.subscribe(row_json_cache.apply_changes)
+data_events.subscribe(result_cache.apply_changes)
+data_events.subscribe(change_feed.apply_changes)
+
+def warm_up():
+    """启动时预先加载内存索引，避免第一个请求承担加载耗时"""
+    rows = []
+
+    # 各索引共用同一次全表查询的结果
+    def shared_rows():
+        if not rows:
+            rows.extend(load_all_rows())
+        return rows
+
+    if SEARCH_INDEX_ENABLED:
+        search_index.ensure_loaded(shared_rows)
+    if COLUMNAR_ENGINE_ENABLED:
+        columnar_store.ensure_loaded(shared_rows)
+    geo_index.ensure_loaded(shared_rows)
+    cluster_index.ensure_loaded(shared_rows)
+    stats_index.ensure_loaded(shared_rows)
+
+# 搜索索引命中的 id 每批绑定到 IN 条件的个数：SQL 语句长度和绑定参数个数不随命中行数增长
+# （SQLite 限制单条语句的变量个数，MySQL 受 max_allowed_packet 限制）
+ID_BATCH_SIZE = int(os.getenv('ID_BATCH_SIZE', 500))
+
+def id_batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_BATCH_SIZE):
+        yield ids[start:start + ID_BATCH_SIZE]
+
+def match_sort_key(sort_by, value, row_id):
+    """
+    与 ORDER BY {sort_by}, id 顺序一致的排序键：
+    NULL 最小，字符串按不区分大小写/重音比较（与排序规则和列式快照一致），相同值按 id 排序
+    """
+    if sort_by == 'id':
+        return row_id
+    if value is None:
+        return (0, '', row_id)
+    if isinstance(value, str):
+        return (1, normalize_text(value), row_id)
+    return (1, value, row_id)
+
+def order_matches(cursor, matched_ids, sort_by, filters=None):
+    """
+    按 sort_by 升序排列搜索索引命中的 id，有过滤条件时同时剔除不满足条件的行
+
+    候选 id 分批绑定到 IN 条件、只读取 id 和排序字段，排序在内存中完成
+
+    Returns:
+        list: [(排序键, id)]，按升序排列
+    """
+    filter_sql = [predicate.sql() for predicate in filters or []]
+    if sort_by == 'id' and not filter_sql:
+        return [(row_id, row_id) for row_id in sorted(matched_ids)]
+
+    columns = 'id' if sort_by == 'id' else f'id, {sort_by}'
+    where_filter = ''.join(f" AND {sql}" for sql, _ in filter_sql)
+    filter_params = [v for _, values in filter_sql for v in values]
+    keys = []
+    for batch in id_batches(matched_ids):
+        placeholders = ','.join(['%s'] * len(batch))
+        cursor.execute(
+            f"SELECT {columns} FROM powerstation WHERE id IN ({placeholders}){where_filter}",
+            batch + filter_params
+        )
+        for row in cursor.fetchall():
+            keys.append((match_sort_key(sort_by, row.get(sort_by), row['id']), row['id']))
+    keys.sort()
+    return keys
+
+def fetch_rows_in_order(cursor, row_ids, columns=SELECT_COLUMNS):
+    """按 id 分批读取行，按 row_ids 的顺序返回（已被删除的行跳过）"""
+    rows = {}
+    for batch in id_batches(row_ids):
+        placeholders = ','.join(['%s'] * len(batch))
+        cursor.execute(f"SELECT {columns} FROM powerstation WHERE id IN ({placeholders})", batch)
+        for row in cursor.fetchall():
+            rows[row['id']] = row
+    return [rows[row_id] for row_id in row_ids if row_id in rows]
+
+def read_columns(cursor, row_ids, columns, lock=False):
+    """按 id 分批读取指定字段，返回 {id: 字段值元组}；lock 为 True 时加锁读"""
+    found = {}
+    for batch in id_batches(row_ids):
+        placeholders = ','.join(['%s'] * len(batch))
+        sql = f"SELECT id, {', '.join(columns)} FROM powerstation WHERE id IN ({placeholders})"
+        cursor.execute(storage.locking_read(sql) if lock else sql, batch)
+        for row in cursor.fetchall():
+            found[row['id']] = tuple(row[column] for column in columns)
+    return found
+
+def apply_patch_groups(cursor, groups, results, atomic):
+    """
+    在当前事务中执行批量更新，把每条更新的匹配数/修改数写入 results
+
+    先加锁读出记录的当前值，UPDATE 之后再读一次，逐条比较得到匹配数和修改数，
+    不依赖驱动返回的受影响行数（MySQL 的 OK 包与 SQLite 的 rowcount 含义不同）。
+    非原子模式下单条语句失败只跳过该条；死锁、锁等待超时会使整个事务失效，直接抛出
+
+    Returns:
+        list: 实际被修改的 id
+    """
+    changed_ids = []
+    for columns, items in groups.items():
+        sql = f"""
+        UPDATE powerstation
+        SET {', '.join(f'{column} = %s' for column in columns)}
+        WHERE id = %s
+        """
+        # 同一 id 出现多次时拆成多轮，每轮的修改前后的值各读一次
+        runs, run, seen = [], [], set()
+        for item in items:
+            if item[1] in seen:
+                runs.append(run)
+                run, seen = [], set()
+            run.append(item)
+            seen.add(item[1])
+        runs.append(run)
+
+        for run in runs:
+            before = read_columns(cursor, [row_id for _, row_id, _ in run], columns, lock=True)
+            updated = []
+            for index, row_id, values in run:
+                if row_id not in before:
+                    results[index] = {'id': row_id, 'matched': 0, 'changed': 0}
+                    continue
+                try:
+                    cursor.execute(sql, values + [row_id])
+                except Exception as e:
+                    if atomic or storage.aborts_transaction(e):
+                        raise
+                    # 单条语句失败只回滚该语句，事务继续
+                    results[index] = {'id': row_id, 'matched': 0, 'changed': 0, 'error': str(e)}
+                    continue
+                updated.append((index, row_id))
+            after = read_columns(cursor, [row_id for _, row_id in updated], columns)
+            for index, row_id in updated:
+                changed = int(after.get(row_id) != before[row_id])
+                results[index] = {'id': row_id, 'matched': 1, 'changed': changed}
+                if changed:
+                    changed_ids.append(row_id)
+    return changed_ids
+
+def count_total(cursor, cache_key, conditions, params, count_mode):
+    """
+    获取符合条件的总记录数
+
+    Args:
+        cursor: 数据库游标
+        cache_key (str): 缓存键（规范化后的搜索条件）
+        conditions (list): WHERE 条件片段
+        params (list): 条件参数
+        count_mode (str): exact 精确计数 / estimate 估算 / none 不计数
+
+    Returns:
+        tuple: (total, estimated)，count_mode 为 none 时 total 为 None
+    """
+    if count_mode == 'none':
+        return None, False
+
+    generation = count_cache.generation()
+    total = count_cache.get(cache_key)
+    if total is not None:
+        return total, False
+
+    if count_mode == 'estimate':
+        return estimate_total(cursor, conditions, params), True
+
+    where_condition = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f"SELECT COUNT(*) as total FROM powerstation {where_condition}", params)
+    total_result = cursor.fetchone()
+    total = total_result['total'] if total_result else 0
+    count_cache.set(cache_key, total, generation)
+    return total, False
+
+def estimate_total(cursor, conditions, params):
+    """用表统计信息估算总数，有过滤条件时按抽样命中率折算"""
+    table_rows = storage.table_rows(cursor, 'powerstation')
+    if not conditions:
+        return table_rows
+
+    cursor.execute(f"""
+        SELECT COUNT(*) as sampled,
+               COALESCE(SUM(CASE WHEN {' AND '.join(conditions)} THEN 1 ELSE 0 END), 0) as matched
+        FROM (SELECT {SELECT_COLUMNS} FROM powerstation LIMIT %s) AS sample
+    """, params + [ESTIMATE_SAMPLE_SIZE])
+    sample = cursor.fetchone()
+    sampled, matched = int(sample['sampled']), int(sample['matched'])
+    if sampled < ESTIMATE_SAMPLE_SIZE:
+        # 表比抽样规模小，抽样结果就是精确值
+        return matched
+    return round(matched * max(table_rows, sampled) / sampled)
+
 @app.route('/')
 def index():
     return jsonify({
@@ -39,134 +510,856 @@ def index():
         'version': '1.0.0'
     })
 
+def cached_fragments(cursor, page_ids, generation):
+    """按 id 顺序取出行的 JSON 片段，缓存中没有的行从数据库读取后写入缓存"""
+    fragments = row_json_cache.get_many(page_ids)
+    missing = [row_id for row_id in page_ids if row_id not in fragments]
+    if missing:
+        placeholders = ','.join(['%s'] * len(missing))
+        cursor.execute(f"SELECT {SELECT_COLUMNS} FROM powerstation WHERE id IN ({placeholders})", missing)
+        for row in cursor.fetchall():
+            fragments[row['id']] = row_json_cache.put(row, generation)
+    return [fragments[row_id] for row_id in page_ids if row_id in fragments]
+
+def jsonify_matches_fragments():
+    """
+    jsonify 的输出格式是否与行片段一致（紧凑、ASCII 转义、键排序）：
+    判断规则与 Flask 的 DefaultJSONProvider 相同，debug 模式下 compact 未设置时缩进输出
+    """
+    provider = app.json
+    compact = getattr(provider, 'compact', None)
+    if compact is False or (compact is None and app.debug):
+        return False
+    return getattr(provider, 'ensure_ascii', True) and getattr(provider, 'sort_keys', True)
+
+def spliced_response(envelope, fragments):
+    """把行片段拼接进响应外层；jsonify 的格式与片段不同时（如 debug 模式）改用 jsonify 输出，两条路径的字节保持一致"""
+    with metrics.phase('serialize'):
+        if not jsonify_matches_fragments():
+            return jsonify(dict(envelope, data=[json.loads(fragment) for fragment in fragments]))
+        body = splice_json(envelope, 'data', fragments)
+    return Response(body, mimetype='application/json')
+
+def compress_response(response):
+    """按 Accept-Encoding 压缩成功响应（结果缓存中保存的是未压缩的响应体，每个请求各自协商）"""
+    response = app.make_response(response)
+    if not RESPONSE_COMPRESSION_ENABLED or response.status_code != 200:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    body = response.get_data()
+    if encoding and len(body) >= COMPRESS_MIN_SIZE:
+        with metrics.phase('compress'):
+            response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# 结果缓存中保存的响应头
+CACHED_HEADERS = ('Content-Type', 'X-Query-Plan')
+
+def freeze_response(rv):
+    """
+    把视图的返回值转换为可在多个请求间共用的 (状态码, 响应体, 响应头)
+
+    Returns:
+        tuple: (冻结的响应, 字节数)，非 200 响应的字节数为 None（不写入缓存）
+    """
+    response = app.make_response(rv)
+    body = response.get_data()
+    headers = [(name, value) for name, value in response.headers if name in CACHED_HEADERS]
+    return (response.status_code, body, headers), len(body) if response.status_code == 200 else None
+
+def thaw_response(frozen):
+    status, body, headers = frozen
+    return Response(body, status=status, headers=headers)
+
+def build_cursor_page(data, direction, has_cursor, page_size, sort_by, sort_order):
+    """
+    整理游标分页结果（data 按扫描方向排列，且多取了一行）
+
+    Returns:
+        tuple: (当前页数据, nextCursor, prevCursor)
+    """
+    has_more = len(data) > page_size
+    data = data[:page_size]
+
+    if direction == 'next':
+        has_next, has_prev = has_more, has_cursor
+    else:
+        data.reverse()
+        has_next, has_prev = True, has_more
+
+    next_cursor = encode_cursor(sort_by, sort_order, 'next', data[-1]) \
+        if data and has_next else None
+    prev_cursor = encode_cursor(sort_by, sort_order, 'prev', data[0]) \
+        if data and has_prev else None
+    return data, next_cursor, prev_cursor
+
 @app.route('/data', methods=['GET'])
+@conditional_get
 def get_data():
     """
     分页查询数据接口
     参数:
     - page: 页码 (默认: 1)
     - pageSize: 每页数量 (默认: 10)
-    - search: 搜索关键词 (可选，搜索plant和country字段)
-    - sortBy: 排序字段 (可选)
+    - search: 搜索关键词 (可选，默认搜索plant和country字段)
+    - searchFields: 搜索字段，逗号分隔，可选 plant/country/regionLabel/status (可选)
+    - sortBy: 排序字段 (可选，有搜索词时支持 relevance 按相关度排序)
     - sortOrder: 排序顺序 asc/desc (默认: desc)
+    - pagination: 分页模式 offset/cursor (默认: offset)
+    - cursor: 游标分页时上一次响应返回的 nextCursor 或 prevCursor (可选)
+    - countMode: 总数计算方式 exact/estimate/none (默认: exact)
+    - filter: 结构化过滤条件，分号分隔，如 capacity>=1000; status in (Operating, Construction) (可选，可重复)
+
+    相同的规范化参数命中结果缓存时直接返回，并发的相同查询只执行一次（见 result_cache.py）
+    """
+    try:
+        query = parse_data_query(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': '参数错误',
+            'message': str(e)
+        }), 400
+
+    if not RESULT_CACHE_ENABLED or read_token_ahead():
+        return compress_response(query_data(query))
+    frozen, source = result_cache.get_or_compute(query.cache_key(), lambda: freeze_response(query_data(query)))
+    response = thaw_response(frozen)
+    response.headers['X-Result-Cache'] = source
+    return compress_response(response)
+
+class DataQuery(namedtuple('DataQuery', ['page', 'page_size', 'search', 'sort_by', 'sort_order', 'cursor_token',
+                                           'use_cursor', 'count_mode', 'search_fields', 'filter_key', 'filters'])):
+    """GET /data 规范化后的查询参数"""
+
+    __slots__ = ()
+
+    def cache_key(self):
+        """结果缓存的键（过滤条件以规范化后的文本 filter_key 代替条件对象）"""
+        return self[:-1]
+
+def parse_data_query(args):
+    """解析 GET /data 的参数，缺省值补齐、超出范围的值按接口约定回退，写法不同但含义相同的请求得到相同的结果"""
+    page = int(args.get('page', 1))
+    page_size = int(args.get('pageSize', 10))
+    search = args.get('search', '').strip()
+    sort_by = args.get('sortBy', 'id')
+    sort_order = args.get('sortOrder', 'desc').upper()
+    cursor_token = args.get('cursor', '').strip()
+    use_cursor = args.get('pagination', 'offset') == 'cursor' or bool(cursor_token)
+    count_mode = args.get('countMode', 'exact').lower()
+    search_fields = tuple(parse_search_fields(args.get('searchFields', '')))
+    filters = tuple(parse_filter(args.getlist('filter')))
+
+    # 参数验证
+    if page < 1:
+        page = 1
+    if page_size < 1 or page_size > 100:
+        page_size = 10
+    if sort_order not in ['ASC', 'DESC']:
+        sort_order = 'DESC'
+    if count_mode not in ['exact', 'estimate', 'none']:
+        count_mode = 'exact'
+
+    if sort_by not in ALLOWED_SORT_FIELDS and sort_by != 'relevance':
+        sort_by = 'id'
+
+    # 游标分页时页码不影响结果
+    if use_cursor:
+        page = 1
+    return DataQuery(page, page_size, search, sort_by, sort_order, cursor_token, use_cursor, count_mode,
+                     search_fields, filter_cache_key(filters) if filters else '', filters)
+
+def query_data(query):
+    """执行一次 GET /data 查询，返回响应（未压缩）"""
+    started = time.perf_counter()
+    try:
+        (page, page_size, search, sort_by, sort_order, cursor_token,
+         use_cursor, count_mode, search_fields, _, filters) = query
+
+        # 有搜索词时优先使用内存搜索索引，索引不可用时回退到 LIKE 查询
+        search_scores = None
+        if search and SEARCH_INDEX_ENABLED and search_index.ensure_loaded(load_all_rows):
+            search_scores = search_index.search(search, search_fields)
+        if sort_by == 'relevance':
+            if search_scores is None:
+                sort_by = 'id'
+            elif use_cursor:
+                return jsonify({
+                    'success': False,
+                    'error': '参数错误',
+                    'message': '按相关度排序不支持游标分页'
+                }), 400
+        
+        # 计算偏移量
+        offset = (page - 1) * page_size
+
+        # 解析游标（在获取连接前完成校验）
+        direction, cursor_value, cursor_id = 'next', None, None
+        if cursor_token:
+            try:
+                direction, cursor_value, cursor_id = decode_cursor(cursor_token, sort_by, sort_order)
+            except InvalidCursorError as e:
+                return jsonify({
+                    'success': False,
+                    'error': '参数错误',
+                    'message': str(e)
+                }), 400
+
+        # 向前翻页时反向扫描，取到后再翻转
+        if direction == 'next':
+            scan_order = sort_order
+        else:
+            scan_order = 'ASC' if sort_order == 'DESC' else 'DESC'
+
+        next_cursor = prev_cursor = None
+        has_more = False
+        total_estimated = False
+        rows_typed = False  # 数据是否已由 TypedDictCursor 完成类型转换
+        fragments = None    # 直接从行 JSON 缓存取得的行片段（此时 data 为 None）
+        generation = row_json_cache.generation()
+        query_plan = None   # 有结构化过滤条件时的查询规划，通过 X-Query-Plan 响应头返回
+        data_source = 'db'
+
+        if COLUMNAR_ENGINE_ENABLED and columnar_store.ensure_loaded(load_all_rows):
+            data_source = 'memory'
+            # 列式快照：过滤、排序、分页全部在内存中完成
+            id_filter = None
+            if search:
+                id_filter = set(search_scores) if search_scores is not None \
+                    else columnar_store.match_ids(search, search_fields)
+            if filters:
+                filter_ids, query_plan = columnar_store.filter_ids(filters)
+                if search_scores is not None:
+                    search_scores = {i: s for i, s in search_scores.items() if i in filter_ids}
+                id_filter = filter_ids if id_filter is None else id_filter & filter_ids
+
+            if sort_by == 'relevance':
+                ranked = sorted(search_scores, key=lambda i: (-search_scores[i], i),
+                                reverse=(sort_order == 'ASC'))
+                data = columnar_store.get_many(ranked[offset:offset + page_size])
+                total = len(ranked)
+                has_more = offset + page_size < total
+            elif use_cursor:
+                data = columnar_store.seek(sort_by, scan_order, cursor_value, cursor_id,
+                                           page_size + 1, id_filter)
+                data, next_cursor, prev_cursor = build_cursor_page(
+                    data, direction, bool(cursor_token), page_size, sort_by, sort_order)
+                total = columnar_store.count(id_filter) if count_mode != 'none' else None
+            else:
+                data, total = columnar_store.page(sort_by, sort_order, offset, page_size, id_filter)
+                has_more = offset + page_size < total
+            # 内存中的总数总是精确值：estimate 时返回精确总数（totalEstimated 为 false），none 时不返回总数
+            if count_mode == 'none':
+                total = None
+        else:
+            connection = get_read_connection()
+            if not connection:
+                return jsonify({
+                    'error': '数据库连接失败',
+                    'data': [],
+                    'total': 0
+                }), 500
+            
+            try:
+                # 游标分页需要用原始值（区分 NULL 与空字符串）生成游标，取数后再转换
+                cursor_class = pymysql.cursors.DictCursor if use_cursor else TypedDictCursor
+                rows_typed = not use_cursor
+                with connection.cursor(cursor_class) as cursor:
+                    if search_scores is not None:
+                        # 搜索索引已给出全部匹配 id（总数无需再查）：排序和分页在内存中完成，
+                        # 只按 id 读取当前页，绑定参数的个数与匹配行数无关
+                        if sort_by == 'relevance':
+                            if filters and search_scores:
+                                kept = {row_id for _, row_id in order_matches(cursor, search_scores, 'id', filters)}
+                                search_scores = {i: s for i, s in search_scores.items() if i in kept}
+                            ranked = sorted(search_scores, key=lambda i: (-search_scores[i], i),
+                                            reverse=(sort_order == 'ASC'))
+                            total = len(ranked)
+                        else:
+                            ordered = order_matches(cursor, search_scores, sort_by, filters)
+                            total = len(ordered)
+                            if scan_order == 'DESC':
+                                ordered.reverse()
+                            if cursor_token:
+                                bound = match_sort_key(sort_by, cursor_value, cursor_id)
+                                ordered = [(key, row_id) for key, row_id in ordered
+                                           if (key > bound if scan_order == 'ASC' else key < bound)]
+                            ranked = [row_id for _, row_id in ordered]
+                        if filters:
+                            query_plan = QueryPlan('sql-index', filters, None, total, 'PRIMARY')
+
+                        if use_cursor:
+                            # 多取一行用于判断是否还有更多数据
+                            data, next_cursor, prev_cursor = build_cursor_page(
+                                fetch_rows_in_order(cursor, ranked[:page_size + 1]), direction,
+                                bool(cursor_token), page_size, sort_by, sort_order)
+                        else:
+                            page_ids = ranked[offset:offset + page_size]
+                            has_more = offset + page_size < total
+                            if ROW_JSON_CACHE_ENABLED:
+                                data = None
+                                fragments = cached_fragments(cursor, page_ids, generation)
+                            else:
+                                data = fetch_rows_in_order(cursor, page_ids)
+                    else:
+                        # 构建WHERE条件
+                        conditions = []
+                        params = []
+
+                        if filters:
+                            try:
+                                indexes, table_rows = index_catalog.get(cursor, storage)
+                            except Exception as e:
+                                print(f"读取索引信息失败: {e}")
+                                indexes, table_rows = {}, 0
+                            query_plan = plan_sql(filters, indexes, table_rows)
+                            # 驱动条件排在最前面
+                            for predicate in query_plan.predicates:
+                                sql, values = predicate.sql()
+                                conditions.append(sql)
+                                params.extend(values)
+
+                        if search:
+                            conditions.append(
+                                "(" + " OR ".join(f"{field} LIKE %s" for field in search_fields) + ")"
+                            )
+                            params.extend([f"%{search}%"] * len(search_fields))
+
+                        # 获取总记录数（优先使用缓存）
+                        cache_key = f"{','.join(search_fields)}|{normalize_search(search)}" if search else ''
+                        if filters:
+                            cache_key += f"|filter:{filter_cache_key(filters)}"
+                        total, total_estimated = count_total(cursor, cache_key, conditions, params, count_mode)
+
+                        where_condition = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+                        table = 'powerstation'
+                        if query_plan is not None and query_plan.path == 'sql-index' and query_plan.index != 'PRIMARY':
+                            table = storage.force_index('powerstation', query_plan.index)
+
+                        if use_cursor:
+                            seek_params = []
+                            if cursor_token:
+                                seek_sql, seek_params = seek_condition(sort_by, scan_order, cursor_value, cursor_id)
+                                conditions.append(seek_sql)
+                            seek_where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+                            # 多取一行用于判断是否还有更多数据
+                            data_sql = f"""
+                            SELECT {SELECT_COLUMNS}
+                            FROM {table}
+                            {seek_where}
+                            ORDER BY {sort_by} {scan_order}, id {scan_order}
+                            LIMIT %s
+                            """
+                            cursor.execute(data_sql, params + seek_params + [page_size + 1])
+                            data, next_cursor, prev_cursor = build_cursor_page(
+                                list(cursor.fetchall()), direction, bool(cursor_token),
+                                page_size, sort_by, sort_order)
+                        elif ROW_JSON_CACHE_ENABLED:
+                            # 只查询当前页的 id（可走覆盖索引），行内容从 JSON 缓存中取
+                            id_sql = f"""
+                            SELECT id
+                            FROM {table}
+                            {where_condition}
+                            ORDER BY {sort_by} {sort_order}, id {sort_order}
+                            LIMIT %s OFFSET %s
+                            """
+                            limit = page_size + 1 if total is None else page_size
+                            cursor.execute(id_sql, params + [limit, offset])
+                            page_ids = [row['id'] for row in cursor.fetchall()]
+                            has_more = len(page_ids) > page_size
+                            data = None
+                            fragments = cached_fragments(cursor, page_ids[:page_size], generation)
+                        else:
+                            # 获取分页数据
+                            data_sql = f"""
+                            SELECT {SELECT_COLUMNS}
+                            FROM {table}
+                            {where_condition}
+                            ORDER BY {sort_by} {sort_order}, id {sort_order}
+                            LIMIT %s OFFSET %s
+                            """
+
+                            # 不计数时多取一行用于判断是否还有下一页
+                            limit = page_size + 1 if total is None else page_size
+                            query_params = params + [limit, offset]
+                            cursor.execute(data_sql, query_params)
+                            data = list(cursor.fetchall())
+                            has_more = len(data) > page_size
+                            data = data[:page_size]
+
+            finally:
+                connection.close()
+                
+        # 处理数据格式
+        if data is not None and not rows_typed:
+            with metrics.phase('process'):
+                normalize_rows(data)
+
+        total_pages = (total + page_size - 1) // page_size if total is not None else None
+        if use_cursor:
+            result = {
+                'success': True,
+                'data': data,
+                'total': total,
+                'pageSize': page_size,
+                'totalPages': total_pages,
+                'nextCursor': next_cursor,
+                'prevCursor': prev_cursor
+            }
+        else:
+            result = {
+                'success': True,
+                'data': data,
+                'total': total,
+                'page': page,
+                'pageSize': page_size,
+                'totalPages': total_pages
+            }
+            if total is None:
+                result['hasMore'] = has_more
+        if count_mode != 'exact':
+            result['totalEstimated'] = total_estimated
+
+        if ROW_JSON_CACHE_ENABLED:
+            if fragments is None:
+                with metrics.phase('serialize'):
+                    fragments = row_json_cache.fragments(data, generation)
+            del result['data']
+            response = spliced_response(result, fragments)
+        else:
+            response = jsonify(result)
+        if query_plan is not None:
+            response.headers['X-Query-Plan'] = query_plan.describe()
+        if RECORD_QUERY_USAGE:
+            search_kind = ('index' if search_scores is not None else 'like') if search else ''
+            query_usage.record(
+                QueryShape(data_source, 'cursor' if use_cursor else 'offset',
+                           sort_by, sort_order, filters, search_kind),
+                (time.perf_counter() - started) * 1000,
+            )
+        return response
+
+    except Exception as e:
+        # 参数已在 parse_data_query 和上面的校验中处理，这里的 ValueError 来自数据本身（如行解码失败），按服务器错误返回
+        print(f"查询数据时出错: {e}")
+        return jsonify({
+            'success': False,
+            'error': '服务器内部错误',
+            'message': str(e)
+        }), 500
+
+# 流式导出时每批写出的行数
+EXPORT_BATCH_SIZE = 500
+
+@app.route('/data/export', methods=['GET'])
+def export_data():
+    """
+    流式导出数据接口（使用不缓冲的服务端游标，内存占用与数据量无关）
+    参数:
+    - format: 导出格式 ndjson/csv (默认: ndjson)
+    - columns: 导出字段，逗号分隔 (可选，默认全部字段)
+    - search / searchFields / sortBy / sortOrder / filter: 与 GET /data 相同
     """
     try:
-        # 获取分页参数
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('pageSize', 10))
+        export_format = request.args.get('format', 'ndjson').lower()
         search = request.args.get('search', '').strip()
+        search_fields = parse_search_fields(request.args.get('searchFields', ''))
         sort_by = request.args.get('sortBy', 'id')
         sort_order = request.args.get('sortOrder', 'desc').upper()
-        
-        # 参数验证
-        if page < 1:
-            page = 1
-        if page_size < 1 or page_size > 100:
-            page_size = 10
+        columns_param = request.args.get('columns', '').strip()
+
+        if export_format not in ['ndjson', 'csv']:
+            raise ValueError('format 只支持 ndjson 或 csv')
         if sort_order not in ['ASC', 'DESC']:
             sort_order = 'DESC'
-        
-        # 允许排序的字段
-        allowed_sort_fields = ['id', 'lng', 'lat', 'annualCarbon', 'capacity', 'coalType',
-                              'country', 'plant', 'status', 'type', 'retire1', 'retire2',
-                              'retire3', 'start1', 'start2', 'year1', 'year2',
-                              'startLabel', 'regionLabel']
-        if sort_by not in allowed_sort_fields:
+        if sort_by not in ALLOWED_SORT_FIELDS:
             sort_by = 'id'
-        
-        # 计算偏移量
-        offset = (page - 1) * page_size
-        
-        connection = get_db_connection()
+
+        columns = ALLOWED_SORT_FIELDS
+        if columns_param:
+            columns = [c.strip() for c in columns_param.split(',') if c.strip()]
+            invalid = [c for c in columns if c not in ALLOWED_SORT_FIELDS]
+            if invalid or not columns:
+                raise ValueError(f"不支持的导出字段: {', '.join(invalid)}")
+
+        filters = parse_filter(request.args.getlist('filter'))
+        # 有搜索词时优先使用搜索索引：命中的 id 在内存中排好序后分批读取，索引不可用时回退到 LIKE 查询
+        matched_ids = None
+        if search and SEARCH_INDEX_ENABLED and search_index.ensure_loaded(load_all_rows):
+            matched_ids = search_index.search(search, search_fields)
+
+        conditions, params = [], []
+        if search and matched_ids is None:
+            conditions.append("(" + " OR ".join(f"{field} LIKE %s" for field in search_fields) + ")")
+            params.extend([f"%{search}%"] * len(search_fields))
+        for predicate in filters:
+            sql, values = predicate.sql()
+            conditions.append(sql)
+            params.extend(values)
+        where_condition = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        connection = get_read_connection()
         if not connection:
             return jsonify({
-                'error': '数据库连接失败',
-                'data': [],
-                'total': 0
+                'success': False,
+                'error': '数据库连接失败'
             }), 500
-        
+
         try:
-            with connection.cursor() as cursor:
-                # 构建WHERE条件
-                where_condition = ""
-                params = []
-                
-                if search:
-                    where_condition = "WHERE (plant LIKE %s OR country LIKE %s)"
-                    search_param = f"%{search}%"
-                    params = [search_param, search_param]
-                
-                # 获取总记录数
-                count_sql = f"SELECT COUNT(*) as total FROM powerstation {where_condition}"
-                cursor.execute(count_sql, params)
-                total_result = cursor.fetchone()
-                total = total_result['total'] if total_result else 0
-                
-                # 获取分页数据
-                data_sql = f"""
-                SELECT 
-                    id,
-                    lng,
-                    lat,
-                    annualCarbon,
-                    capacity,
-                    coalType,
-                    country,
-                    plant,
-                    status,
-                    type,
-                    retire1,
-                    retire2,
-                    retire3,
-                    start1,
-                    start2,
-                    year1,
-                    year2,
-                    startLabel,
-                    regionLabel
-                FROM powerstation 
-                {where_condition}
-                ORDER BY {sort_by} {sort_order}
-                LIMIT %s OFFSET %s
-                """
-                
-                query_params = params + [page_size, offset]
-                cursor.execute(data_sql, query_params)
-                data = cursor.fetchall()
-                
-                # 处理数据格式
-                for item in data:
-                    for field in ['id', 'lng', 'lat', 'annualCarbon', 'capacity', 'retire1', 'retire2', 'retire3', 'start1', 'start2', 'year1', 'year2']:
-                        if field in item and item[field] is not None:
-                            try:
-                                item[field] = float(item[field]) if '.' in str(item[field]) else int(item[field])
-                            except:
-                                pass
-                    for field in ['coalType', 'country', 'plant', 'status', 'type', 'startLabel', 'regionLabel']:
-                        if field in item and item[field] is None:
-                            item[field] = ''
-                
+            if matched_ids is None:
+                cursor = connection.cursor(TypedSSDictCursor)
+                cursor.execute(f"""
+                    SELECT {', '.join(columns)}
+                    FROM powerstation
+                    {where_condition}
+                    ORDER BY {sort_by} {sort_order}, id {sort_order}
+                """, params)
+                rows = cursor.fetchall_unbuffered()
+            else:
+                cursor = connection.cursor(TypedDictCursor)
+                ordered = order_matches(cursor, matched_ids, sort_by, filters)
+                if sort_order == 'DESC':
+                    ordered.reverse()
+                row_ids = [row_id for _, row_id in ordered]
+                rows = ({c: row[c] for c in columns}
+                        for batch in id_batches(row_ids)
+                        for row in fetch_rows_in_order(cursor, batch))
+        except Exception:
+            connection.close()
+            raise
+
+        def cleanup():
+            # 客户端中途断开时也会调用，可重复执行
+            try:
+                cursor.close()
+            finally:
+                connection.close()
+
+        def generate():
+            try:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer) if export_format == 'csv' else None
+                if writer:
+                    writer.writerow(columns)
+                count = 0
+                for row in rows:
+                    if writer:
+                        writer.writerow([row[c] for c in columns])
+                    else:
+                        buffer.write(json.dumps(row, ensure_ascii=False))
+                        buffer.write('\n')
+                    count += 1
+                    if count % EXPORT_BATCH_SIZE == 0:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                if buffer.tell():
+                    yield buffer.getvalue()
+            finally:
+                cleanup()
+
+        if export_format == 'csv':
+            mimetype, filename = 'text/csv', 'powerstation.csv'
+        else:
+            mimetype, filename = 'application/x-ndjson', 'powerstation.ndjson'
+        response = Response(generate(), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        response.call_on_close(cleanup)
+        return response
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': '参数错误',
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        print(f"导出数据时出错: {e}")
+        return jsonify({
+            'success': False,
+            'error': '服务器内部错误',
+            'message': str(e)
+        }), 500
+
+# 空间查询默认和最大返回条数
+GEO_DEFAULT_LIMIT = 5000
+GEO_MAX_LIMIT = 20000
+
+@app.route('/data/geo', methods=['GET'])
+def geo_query():
+    """
+    空间查询接口（基于进程内网格索引，不访问数据库）
+    参数（三选一）:
+    - bbox: 矩形范围 minLng,minLat,maxLng,maxLat（minLng > maxLng 表示跨越 180 度经线）
+    - lng, lat, radius: 圆心和半径（公里）
+    - lng, lat, k: 最近的 k 个电站
+    可选参数:
+    - status / type / coalType: 过滤条件，多个值用逗号分隔
+    - limit: 矩形和半径查询的最大返回条数 (默认: 5000)
+    """
+    try:
+        filters = {}
+        for field in GEO_FILTER_FIELDS:
+            value = request.args.get(field, '').strip()
+            if value:
+                filters[field] = {v.strip() for v in value.split(',') if v.strip()}
+
+        limit = int(request.args.get('limit', GEO_DEFAULT_LIMIT))
+        if limit < 1 or limit > GEO_MAX_LIMIT:
+            limit = GEO_DEFAULT_LIMIT
+
+        bbox = request.args.get('bbox', '').strip()
+        if bbox:
+            parts = [float(v) for v in bbox.split(',')]
+            if len(parts) != 4:
+                raise ValueError('bbox 格式应为 minLng,minLat,maxLng,maxLat')
+            min_lng, min_lat, max_lng, max_lat = parts
+            if min_lat > max_lat:
+                raise ValueError('bbox 的 minLat 不能大于 maxLat')
+            mode = 'bbox'
+        else:
+            if 'lng' not in request.args or 'lat' not in request.args:
+                raise ValueError('请提供 bbox，或 lng、lat 和 radius / k')
+            lng = float(request.args['lng'])
+            lat = float(request.args['lat'])
+            if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+                raise ValueError('经纬度超出范围')
+            if 'radius' in request.args:
+                radius_km = float(request.args['radius'])
+                if radius_km <= 0:
+                    raise ValueError('radius 必须大于 0')
+                mode = 'radius'
+            elif 'k' in request.args:
+                k = int(request.args['k'])
+                if k < 1 or k > GEO_MAX_LIMIT:
+                    raise ValueError(f'k 的范围为 1-{GEO_MAX_LIMIT}')
+                mode = 'knn'
+            else:
+                raise ValueError('请提供 radius 或 k')
+
+        if not geo_index.ensure_loaded(load_all_rows):
+            return jsonify({
+                'success': False,
+                'error': '空间索引不可用',
+                'message': '加载空间索引失败，请检查数据库连接'
+            }), 500
+
+        if mode == 'bbox':
+            data = geo_index.bbox(min_lng, min_lat, max_lng, max_lat, filters)
+        elif mode == 'radius':
+            data = geo_index.radius(lng, lat, radius_km, filters)
+        else:
+            data = geo_index.nearest(lng, lat, k, filters)
+
+        total = len(data)
+        data = normalize_rows(data[:limit])
+        return jsonify({
+            'success': True,
+            'mode': mode,
+            'data': data,
+            'total': total,
+            'truncated': total > len(data)
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': '参数错误',
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        print(f"空间查询时出错: {e}")
+        return jsonify({
+            'success': False,
+            'error': '服务器内部错误',
+            'message': str(e)
+        }), 500
+
+@app.route('/data/clusters', methods=['GET'])
+def get_clusters():
+    """
+    地图聚合接口（基于预计算的网格金字塔，不访问数据库）
+    参数:
+    - zoom: 地图缩放级别 (默认: 0)
+    - bbox: 可视范围 minLng,minLat,maxLng,maxLat (默认: 全球，minLng > maxLng 表示跨越 180 度经线)
+    """
+    try:
+        zoom = int(request.args.get('zoom', 0))
+        if zoom < 0:
+            raise ValueError('zoom 不能小于 0')
+
+        bbox = request.args.get('bbox', '').strip()
+        if bbox:
+            parts = [float(v) for v in bbox.split(',')]
+            if len(parts) != 4:
+                raise ValueError('bbox 格式应为 minLng,minLat,maxLng,maxLat')
+            if parts[1] > parts[3]:
+                raise ValueError('bbox 的 minLat 不能大于 maxLat')
+        else:
+            parts = [-180.0, -90.0, 180.0, 90.0]
+
+        if not cluster_index.ensure_loaded(load_all_rows):
+            return jsonify({
+                'success': False,
+                'error': '聚合索引不可用',
+                'message': '加载聚合索引失败，请检查数据库连接'
+            }), 500
+
+        clusters = cluster_index.clusters(zoom, *parts)
+        return jsonify({
+            'success': True,
+            'zoom': min(zoom, CLUSTER_MAX_ZOOM),
+            'data': clusters,
+            'total': sum(c['count'] for c in clusters)
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': '参数错误',
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        print(f"获取地图聚合时出错: {e}")
+        return jsonify({
+            'success': False,
+            'error': '服务器内部错误',
+            'message': str(e)
+        }), 500
+
+@app.route('/data/stats', methods=['GET'])
+def get_stats():
+    """
+    分组统计接口（基于按差量维护的物化聚合表，不访问数据库）
+    参数:
+    - groupBy: 分组字段，逗号分隔，如 country,status (默认: 不分组)
+    - metrics: 统计指标，逗号分隔，支持 count、sum(字段)、avg(字段) (默认: count)
+    - limit: 最多返回的分组数 (默认: 全部)
+    """
+    try:
+        group_by = parse_group_by(request.args.get('groupBy', ''))
+        metric_specs = parse_metrics(request.args.get('metrics', ''))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit else None
+        if limit is not None and limit < 1:
+            raise ValueError('limit 必须大于 0')
+
+        if not stats_index.ensure_loaded(load_all_rows):
+            return jsonify({
+                'success': False,
+                'error': '统计数据不可用',
+                'message': '加载统计数据失败，请检查数据库连接'
+            }), 500
+
+        data = stats_index.query(group_by, metric_specs)
+        total = len(data)
+        if limit is not None:
+            data = data[:limit]
+        return jsonify({
+            'success': True,
+            'groupBy': group_by,
+            'metrics': [name for name, _, _ in metric_specs],
+            'data': data,
+            'total': total
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': '参数错误',
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        print(f"获取统计数据时出错: {e}")
+        return jsonify({
+            'success': False,
+            'error': '服务器内部错误',
+            'message': str(e)
+        }), 500
+
+@app.route('/data/changes', methods=['GET'])
+def get_changes():
+    """
+    增量变更接口（基于变更日志，客户端据此修补本地数据，不必重新加载整页）
+    参数:
+    - since: 上次同步到的版本号 (可选，不传时只返回当前版本号)
+    - limit: 最多读取的变更记录数 (默认: 500，最大: 5000)
+    - stream: 为 1 时以 Server-Sent Events 持续推送 (可选，请求头 Accept: text/event-stream 同样有效)
+
+    SSE 断线重连时浏览器发送的 Last-Event-ID 优先于 since
+    """
+    if not CHANGE_LOG_ENABLED:
+        return jsonify({
+            'success': False,
+            'error': '变更日志未启用',
+            'message': '设置 CHANGE_LOG_ENABLED=1 后可用'
+        }), 503
+
+    try:
+        since = request.headers.get('Last-Event-ID') or request.args.get('since', '')
+        since = int(since) if since != '' else None
+        if since is not None and since < 0:
+            raise ValueError('since 不能为负数')
+        limit = int(request.args.get('limit', CHANGES_DEFAULT_LIMIT))
+        if limit < 1 or limit > CHANGES_MAX_LIMIT:
+            raise ValueError(f'limit 必须在 1 到 {CHANGES_MAX_LIMIT} 之间')
+        stream = request.args.get('stream') in ('1', 'true') or \
+            'text/event-stream' in request.headers.get('Accept', '')
+
+        if since is None:
+            since = change_feed.latest_version()
+            if not stream:
                 return jsonify({
                     'success': True,
-                    'data': data,
-                    'total': total,
-                    'page': page,
-                    'pageSize': page_size,
-                    'totalPages': (total + page_size - 1) // page_size
+                    'since': None,
+                    'version': since,
+                    'hasMore': False,
+                    'changes': []
                 })
-                
-        finally:
-            connection.close()
-            
+
+        if stream:
+            events, release = change_feed.open_stream(since)
+            if events is None:
+                response = jsonify({
+                    'success': False,
+                    'error': '服务繁忙',
+                    'message': f'变更推送连接数已达上限 ({change_feed.max_streams})，请改用轮询 GET /data/changes'
+                })
+                response.status_code = 503
+                response.headers['Retry-After'] = '5'
+                return response
+            response = Response(events, mimetype='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'  # 关闭 nginx 的响应缓冲
+            response.call_on_close(release)
+            return response
+
+        return jsonify(dict(change_feed.read(since, limit), success=True))
+
+    except ChangesExpired as e:
+        return jsonify({
+            'success': False,
+            'error': '变更已过期',
+            'message': f'{e}，请重新加载数据后从当前版本开始同步'
+        }), 410
+
     except ValueError as e:
         return jsonify({
             'success': False,
             'error': '参数错误',
             'message': str(e)
         }), 400
-        
+
     except Exception as e:
-        print(f"查询数据时出错: {e}")
+        print(f"读取变更时出错: {e}")
         return jsonify({
             'success': False,
             'error': '服务器内部错误',
@@ -174,10 +1367,24 @@ def get_data():
         }), 500
 
 @app.route('/data/<int:id>', methods=['GET'])
+@conditional_get
 def get_data_by_id(id):
     """获取单条数据"""
     try:
-        connection = get_db_connection()
+        if COLUMNAR_ENGINE_ENABLED and columnar_store.ensure_loaded(load_all_rows):
+            data = columnar_store.get(id)
+            if not data:
+                return jsonify({
+                    'success': False,
+                    'error': '记录不存在',
+                    'message': f'ID为 {id} 的记录不存在'
+                }), 404
+            return jsonify({
+                'success': True,
+                'data': normalize_rows([data])[0]
+            })
+
+        connection = get_read_connection()
         if not connection:
             return jsonify({
                 'success': False,
@@ -185,7 +1392,7 @@ def get_data_by_id(id):
             }), 500
         
         try:
-            with connection.cursor() as cursor:
+            with connection.cursor(TypedDictCursor) as cursor:
                 cursor.execute("""
                     SELECT * FROM powerstation WHERE id = %s
                 """, (id,))
@@ -215,7 +1422,7 @@ def get_data_by_id(id):
 
 @app.route('/data', methods=['POST'])
 def add_data():
-    """添加新数据 - ID自动设置为最大ID+1"""
+    """添加新数据 - ID由序列表原子分配（不小于最大ID+1）"""
     try:
         data = request.get_json()
 
@@ -226,6 +1433,15 @@ def add_data():
                 'message': '请求体不能为空'
             }), 400
 
+        try:
+            record = {field: coerce_field(field, data[field]) for field in ALLOWED_FIELDS if field in data}
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': str(e)
+            }), 400
+
         connection = get_db_connection()
         if not connection:
             return jsonify({
@@ -235,26 +1451,15 @@ def add_data():
 
         try:
             with connection.cursor() as cursor:
-                # 查询当前最大ID
-                cursor.execute("SELECT COALESCE(MAX(id), 0) as max_id FROM powerstation")
-                result = cursor.fetchone()
-                new_id = result['max_id'] + 1
-
                 # 构建字段列表和值列表
                 fields = ['id']  # ID字段必须包含
-                values = [new_id]
+                values = [None]
                 placeholders = ['%s']
 
-                # 允许的字段
-                allowed_fields = ['lng', 'lat', 'annualCarbon', 'capacity', 'coalType',
-                                 'country', 'plant', 'status', 'type', 'retire1', 'retire2',
-                                 'retire3', 'start1', 'start2', 'year1', 'year2',
-                                 'startLabel', 'regionLabel']
-
-                for field in allowed_fields:
-                    if field in data and data[field] is not None and data[field] != '':
+                for field in ALLOWED_FIELDS:
+                    if field in record and record[field] is not None and record[field] != '':
                         fields.append(field)
-                        values.append(data[field])
+                        values.append(record[field])
                         placeholders.append('%s')
 
                 if len(fields) == 1:  # 只有ID字段
@@ -264,12 +1469,18 @@ def add_data():
                         'message': '没有提供有效的数据字段'
                     }), 400
 
+                # 原子分配新ID，并发插入不会冲突
+                new_id = storage.reserve_ids(connection, 'powerstation', 1)
+                values[0] = new_id
+
                 sql = f"""
                 INSERT INTO powerstation ({', '.join(fields)})
                 VALUES ({', '.join(placeholders)})
                 """
                 cursor.execute(sql, values)
+                log_changes(cursor, upserted_ids=[new_id], inserted=True)
                 connection.commit()
+                publish_changes(cursor, upserted_ids=[new_id])
 
                 return jsonify({
                     'success': True,
@@ -288,6 +1499,152 @@ def add_data():
             'message': str(e)
         }), 500
 
+@app.route('/data/bulk', methods=['POST'])
+def bulk_add_data():
+    """
+    批量添加数据
+
+    请求体: 记录数组，或 {"records": [...], "atomic": false}
+    - atomic 为 false（默认）时逐条报告错误，有效记录照常插入
+    - atomic 为 true 时任何一条出错都不插入
+
+    有效记录一次性预留连续的 id 区间，按 BULK_CHUNK_SIZE 行一个事务，
+    用 executemany 生成多行 INSERT 写入
+    """
+    try:
+        data = request.get_json()
+        atomic = False
+        if isinstance(data, dict):
+            atomic = bool(data.get('atomic', False))
+            records = data.get('records')
+        else:
+            records = data
+
+        if not records or not isinstance(records, list):
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': 'records必须是非空数组'
+            }), 400
+        if len(records) > BULK_MAX_RECORDS:
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': f'单次最多插入 {BULK_MAX_RECORDS} 条记录'
+            }), 400
+
+        # 校验规则与单条添加相同：只接受允许的字段，至少有一个非空字段
+        errors = []
+        valid = []  # (原始下标, 值列表)
+        for index, record in enumerate(records):
+            if not isinstance(record, dict):
+                errors.append({'index': index, 'message': '记录必须是对象'})
+                continue
+            try:
+                values = [coerce_field(field, record.get(field)) if record.get(field) != '' else None
+                          for field in ALLOWED_FIELDS]
+            except ValueError as e:
+                errors.append({'index': index, 'message': str(e)})
+                continue
+            if all(value is None for value in values):
+                errors.append({'index': index, 'message': '没有提供有效的数据字段'})
+                continue
+            valid.append((index, values))
+
+        if atomic and errors:
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': '存在无效记录，未插入任何数据',
+                'errors': errors
+            }), 400
+
+        if not valid:
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': '没有有效的记录',
+                'errors': errors
+            }), 400
+
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({
+                'success': False,
+                'error': '数据库连接失败'
+            }), 500
+
+        try:
+            # 一次性预留连续的 id 区间
+            first_id = storage.reserve_ids(connection, 'powerstation', len(valid))
+            rows = [(index, [first_id + i] + values) for i, (index, values) in enumerate(valid)]
+
+            sql = f"""
+            INSERT INTO powerstation (id, {', '.join(ALLOWED_FIELDS)})
+            VALUES ({', '.join(['%s'] * (len(ALLOWED_FIELDS) + 1))})
+            """
+            inserted_ids = []
+
+            with connection.cursor() as cursor:
+                if atomic:
+                    try:
+                        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+                            cursor.executemany(sql, [row for _, row in rows[start:start + BULK_CHUNK_SIZE]])
+                        log_changes(cursor, upserted_ids=[row[0] for _, row in rows], inserted=True)
+                        connection.commit()
+                    except Exception as e:
+                        connection.rollback()
+                        return jsonify({
+                            'success': False,
+                            'error': '数据插入失败',
+                            'message': f'已回滚，未插入任何数据: {e}'
+                        }), 400
+                    inserted_ids = [row[0] for _, row in rows]
+                else:
+                    for start in range(0, len(rows), BULK_CHUNK_SIZE):
+                        chunk = rows[start:start + BULK_CHUNK_SIZE]
+                        try:
+                            cursor.executemany(sql, [row for _, row in chunk])
+                            log_changes(cursor, upserted_ids=[row[0] for _, row in chunk], inserted=True)
+                            connection.commit()
+                            inserted_ids.extend(row[0] for _, row in chunk)
+                        except Exception:
+                            # 整块失败时逐行重试，定位出错的记录
+                            connection.rollback()
+                            for index, row in chunk:
+                                try:
+                                    cursor.execute(sql, row)
+                                    log_changes(cursor, upserted_ids=[row[0]], inserted=True)
+                                    connection.commit()
+                                    inserted_ids.append(row[0])
+                                except Exception as e:
+                                    connection.rollback()
+                                    errors.append({'index': index, 'message': str(e)})
+
+                if inserted_ids:
+                    publish_changes(cursor, upserted_ids=inserted_ids)
+
+            errors.sort(key=lambda error: error['index'])
+            return jsonify({
+                'success': bool(inserted_ids),
+                'message': f'成功添加 {len(inserted_ids)} 条记录',
+                'inserted_count': len(inserted_ids),
+                'failed_count': len(errors),
+                'ids': inserted_ids,
+                'errors': errors
+            })
+
+        finally:
+            connection.close()
+
+    except Exception as e:
+        print(f"批量添加数据时出错: {e}")
+        return jsonify({
+            'success': False,
+            'error': '服务器内部错误',
+            'message': str(e)
+        }), 500
+
 @app.route('/data/<int:id>', methods=['PUT'])
 def update_data(id):
     """更新数据"""
@@ -300,6 +1657,15 @@ def update_data(id):
                 'error': '参数错误',
                 'message': '请求体不能为空'
             }), 400
+
+        try:
+            record = {field: coerce_field(field, data[field]) for field in ALLOWED_FIELDS if field in data}
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': str(e)
+            }), 400
         
         connection = get_db_connection()
         if not connection:
@@ -323,15 +1689,10 @@ def update_data(id):
                 set_clauses = []
                 values = []
                 
-                allowed_fields = ['lng', 'lat', 'annualCarbon', 'capacity', 'coalType', 
-                                 'country', 'plant', 'status', 'type', 'retire1', 'retire2', 
-                                 'retire3', 'start1', 'start2', 'year1', 'year2', 
-                                 'startLabel', 'regionLabel']
-                
-                for field in allowed_fields:
-                    if field in data:
+                for field in ALLOWED_FIELDS:
+                    if field in record:
                         set_clauses.append(f"{field} = %s")
-                        values.append(data[field])
+                        values.append(record[field])
                 
                 if not set_clauses:
                     return jsonify({
@@ -348,7 +1709,9 @@ def update_data(id):
                 WHERE id = %s
                 """
                 cursor.execute(sql, values)
+                log_changes(cursor, upserted_ids=[id])
                 connection.commit()
+                publish_changes(cursor, upserted_ids=[id])
                 
                 return jsonify({
                     'success': True,
@@ -389,7 +1752,16 @@ def delete_data(id):
                     }), 404
                 
                 cursor.execute("DELETE FROM powerstation WHERE id = %s", (id,))
+                if cursor.rowcount == 0:
+                    # 检查之后已被并发请求删除
+                    return jsonify({
+                        'success': False,
+                        'error': '记录不存在',
+                        'message': f'ID为 {id} 的记录不存在'
+                    }), 404
+                log_changes(cursor, deleted_ids=[id])
                 connection.commit()
+                publish_changes(cursor, deleted_ids=[id])
                 
                 return jsonify({
                     'success': True,
@@ -433,11 +1805,18 @@ def batch_delete_data():
             with connection.cursor() as cursor:
                 # 构建IN子句
                 placeholders = ','.join(['%s'] * len(ids))
-                sql = f"DELETE FROM powerstation WHERE id IN ({placeholders})"
-                cursor.execute(sql, ids)
+                # 先加锁读出实际存在的 id，变更日志只记录真正删除的行
+                cursor.execute(storage.locking_read(f"SELECT id FROM powerstation WHERE id IN ({placeholders})"), ids)
+                existing_ids = sorted(row['id'] for row in cursor.fetchall())
+                deleted_count = 0
+                if existing_ids:
+                    placeholders = ','.join(['%s'] * len(existing_ids))
+                    cursor.execute(f"DELETE FROM powerstation WHERE id IN ({placeholders})", existing_ids)
+                    deleted_count = cursor.rowcount
+                    log_changes(cursor, deleted_ids=existing_ids)
                 connection.commit()
-                
-                deleted_count = cursor.rowcount
+                if existing_ids:
+                    publish_changes(cursor, deleted_ids=existing_ids)
                 
                 return jsonify({
                     'success': True,
@@ -456,16 +1835,134 @@ def batch_delete_data():
             'message': str(e)
         }), 500
 
+@app.route('/data/batch', methods=['PATCH'])
+def batch_update_data():
+    """
+    批量部分更新数据
+
+    请求体: {"patches": [{"id": 1, "fields": {"status": "Retired"}}, ...], "atomic": false}
+    - 更新字段相同的记录共用同一条 UPDATE 语句，全部在一个事务中执行、只提交一次
+    - 每条记录的匹配数/修改数由更新前后分批读取的字段值比较得出
+    - atomic 为 true 时任何一条出错都回滚全部更新；死锁或锁等待超时时整批回滚后重试
+    """
+    try:
+        data = request.get_json()
+        patches = data.get('patches') if isinstance(data, dict) else data
+        atomic = bool(data.get('atomic', False)) if isinstance(data, dict) else False
+
+        if not patches or not isinstance(patches, list):
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': 'patches必须是非空数组'
+            }), 400
+        if len(patches) > BULK_MAX_RECORDS:
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': f'单次最多更新 {BULK_MAX_RECORDS} 条记录'
+            }), 400
+
+        # 按字段集合分组，字段顺序与 ALLOWED_FIELDS 一致
+        results = [None] * len(patches)
+        groups = {}
+        for index, patch in enumerate(patches):
+            row_id = patch.get('id') if isinstance(patch, dict) else None
+            fields = patch.get('fields') if isinstance(patch, dict) else None
+            if not isinstance(row_id, int) or isinstance(row_id, bool) or not isinstance(fields, dict):
+                results[index] = {'id': row_id, 'matched': 0, 'changed': 0,
+                                  'error': '每条更新必须包含整数 id 和 fields 对象'}
+                continue
+            columns = tuple(field for field in ALLOWED_FIELDS if field in fields)
+            if not columns:
+                results[index] = {'id': row_id, 'matched': 0, 'changed': 0,
+                                  'error': '没有提供有效的更新字段'}
+                continue
+            try:
+                values = [coerce_field(c, fields[c]) for c in columns]
+            except ValueError as e:
+                results[index] = {'id': row_id, 'matched': 0, 'changed': 0, 'error': str(e)}
+                continue
+            groups.setdefault(columns, []).append((index, row_id, values))
+
+        if atomic and any(results):
+            return jsonify({
+                'success': False,
+                'error': '参数错误',
+                'message': '存在无效的更新，未执行任何更新',
+                'results': [r for r in results if r]
+            }), 400
+
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({
+                'success': False,
+                'error': '数据库连接失败'
+            }), 500
+
+        try:
+            for attempt in range(1, BATCH_UPDATE_ATTEMPTS + 1):
+                attempt_results = list(results)
+                with connection.cursor() as cursor:
+                    try:
+                        # 显式开始事务：修改前的值与之后的 UPDATE 在同一个事务中读取
+                        connection.begin()
+                        changed_ids = apply_patch_groups(cursor, groups, attempt_results, atomic)
+                        if changed_ids:
+                            log_changes(cursor, upserted_ids=sorted(set(changed_ids)))
+                        connection.commit()
+                    except Exception as e:
+                        connection.rollback()
+                        conflict = storage.aborts_transaction(e)
+                        if conflict and attempt < BATCH_UPDATE_ATTEMPTS:
+                            # 死锁或锁等待超时：整个事务已失效，回滚后整批重试
+                            print(f"批量更新与其他事务冲突，第 {attempt} 次重试: {e}")
+                            continue
+                        return jsonify({
+                            'success': False,
+                            'error': '数据更新冲突' if conflict else '数据更新失败',
+                            'message': f'已回滚，未执行任何更新: {e}'
+                        }), 409 if conflict else 400
+
+                    if changed_ids:
+                        publish_changes(cursor, upserted_ids=sorted(set(changed_ids)))
+                    break
+            results = attempt_results
+
+            matched_count = sum(r['matched'] for r in results)
+            changed_count = sum(r['changed'] for r in results)
+            return jsonify({
+                'success': True,
+                'message': f'匹配 {matched_count} 条记录，修改 {changed_count} 条记录',
+                'matched_count': matched_count,
+                'changed_count': changed_count,
+                'failed_count': sum(1 for r in results if 'error' in r),
+                'results': results
+            })
+
+        finally:
+            connection.close()
+
+    except Exception as e:
+        print(f"批量更新数据时出错: {e}")
+        return jsonify({
+            'success': False,
+            'error': '服务器内部错误',
+            'message': str(e)
+        }), 500
+
 @app.route('/test-connection', methods=['GET'])
 def test_connection():
     """测试数据库连接"""
     try:
-        connection = get_db_connection()
+        connection = get_read_connection()
         if connection:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT COUNT(*) as count FROM powerstation")
-                result = cursor.fetchone()
-            connection.close()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) as count FROM powerstation")
+                    result = cursor.fetchone()
+            finally:
+                connection.close()
             return jsonify({
                 'success': True,
                 'status': 'success',
@@ -485,7 +1982,87 @@ def test_connection():
             'message': f'连接测试失败: {str(e)}'
         }), 500
 
+@app.route('/pool-stats', methods=['GET'])
+def pool_stats():
+    """查看数据库连接池统计信息（借出数、空闲数、等待时间）"""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'pools': all_pool_stats(),
+        'limits': [qa_limiter.stats()],
+        'changeFollower': change_follower.stats(),
+        'queryUsage': query_usage.stats(),
+        'storage': storage.stats(),
+        'replicas': replica_router.stats(),
+        'resultCache': result_cache.stats(),
+        'changeFeed': change_feed.stats()
+    })
+
+def admin_forbidden():
+    """校验 X-Admin-Token 请求头，不通过时返回 403 响应；未设置 ADMIN_TOKEN 时管理接口不可用"""
+    if not ADMIN_TOKEN:
+        return jsonify({
+            'success': False,
+            'error': 'Forbidden',
+            'message': '未设置 ADMIN_TOKEN，管理接口已禁用'
+        }), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({
+            'success': False,
+            'error': 'Forbidden',
+            'message': '缺少或错误的 X-Admin-Token'
+        }), 403
+    return None
+
+@app.route('/admin/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """
+    查看本进程的慢查询日志（按指纹汇总，含参数形状、扫描/返回行数和 EXPLAIN）
+    查询参数:
+    - limit: 返回的指纹数和最近记录数 (默认: 50，最大 500)
+    - sort: 指纹排序方式 total / max / count / recent (默认: total)
+    """
+    forbidden = admin_forbidden()
+    if forbidden:
+        return forbidden
+    try:
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid parameter',
+            'message': 'limit 必须是整数'
+        }), 400
+    limit = max(1, min(limit, 500))
+    sort = request.args.get('sort', 'total')
+    if sort not in ('total', 'max', 'count', 'recent'):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid parameter',
+            'message': 'sort 只支持 total、max、count、recent'
+        }), 400
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'enabled': SLOW_QUERY_LOG_ENABLED,
+        **slow_query_log.snapshot(limit, sort)
+    })
+
+@app.route('/admin/slow-queries', methods=['DELETE'])
+def clear_slow_queries():
+    """清空本进程的慢查询日志"""
+    forbidden = admin_forbidden()
+    if forbidden:
+        return forbidden
+    slow_query_log.clear()
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'message': '慢查询日志已清空'
+    })
+
 @app.route('/qa/ask', methods=['POST'])
+@qa_limiter
 def ask_question():
     """
     问答接口
@@ -591,6 +2168,7 @@ def clear_qa_history():
         }), 500
 
 @app.route('/qa/test-ollama', methods=['GET'])
+@qa_limiter
 def test_ollama():
     """
     测试Ollama连接
@@ -624,10 +2202,17 @@ if __name__ == '__main__':
     print("  数据管理:")
     print("    GET  /data - 分页查询数据 (支持search, sortBy, sortOrder)")
     print("    GET  /data/<id> - 获取单条数据")
+    print("    GET  /data/export - 流式导出数据 (NDJSON/CSV)")
+    print("    GET  /data/geo - 空间查询 (bbox / 半径 / k近邻)")
+    print("    GET  /data/clusters - 地图聚合 (按缩放级别的网格金字塔)")
+    print("    GET  /data/stats - 分组统计 (groupBy, metrics)")
+    print("    GET  /data/changes - 增量变更 (since, stream=1 时 SSE 推送)")
     print("    POST /data - 添加新数据")
+    print("    POST /data/bulk - 批量添加数据")
     print("    PUT  /data/<id> - 更新数据")
     print("    DELETE /data/<id> - 删除单条数据")
     print("    POST /data/batch - 批量删除数据")
+    print("    PATCH /data/batch - 批量部分更新数据")
     print("  问答功能:")
     print("    POST /qa/ask - 提问接口 (Ollama DeepSeek-R1:32b)")
     print("    GET  /qa/history - 获取对话历史")
@@ -635,5 +2220,13 @@ if __name__ == '__main__':
     print("    GET  /qa/test-ollama - 测试Ollama连接")
     print("  系统:")
     print("    GET  /test-connection - 测试数据库连接")
+    print("    GET  /pool-stats - 查看连接池统计")
+    print("    GET  /metrics - Prometheus 指标")
+    print("    GET  /admin/slow-queries - 查看慢查询日志")
+    print("    DELETE /admin/slow-queries - 清空慢查询日志")
     print("=" * 60)
+    print("开发服务器仅用于本地调试，生产环境请使用: python serve.py")
+    # debug 模式下重载器的父进程不处理请求，只在实际提供服务的子进程中预加载
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_up()
     app.run(host='127.0.0.1', port=8899, debug=True)
\ No newline at end of file
@@ -0,0 +1,533 @@
+"""
+索引管理命令
+根据 query_usage 表中记录的查询用法（见 query_usage.py），为 powerstation 表推荐、
+创建和删除二级索引。索引变更以带版本号的迁移文件 migrations/NNNN_名称.sql 保存，
+执行或回滚迁移时输出代表性查询在变更前后的 EXPLAIN
+
+用法:
+    python manage_indexes.py usage                 # 查看记录的查询用法
+    python manage_indexes.py recommend             # 查看推荐的索引变更
+    python manage_indexes.py make                  # 把推荐的变更写成迁移文件
+    python manage_indexes.py migrate [--dry-run]   # 执行尚未执行的迁移
+    python manage_indexes.py rollback [--steps 1]  # 回滚最近执行的迁移
+    python manage_indexes.py status                # 查看迁移状态和现有索引
+"""
+
+import argparse
+import hashlib
+import os
+import re
+
+import pymysql
+
+from init_database import DB_CONFIG
+from query_usage import USAGE_TABLE
+
+TABLE = 'powerstation'
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+# 记录已执行的迁移
+MIGRATIONS_TABLE = 'schema_migrations'
+
+# 由本命令管理的索引名前缀，只有这些索引会被推荐删除
+MANAGED_PREFIX = 'idx_auto_'
+
+# 每个迁移文件中最多附带的 EXPLAIN 查询数
+MAX_EXPLAIN_QUERIES = 3
+
+_MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+_ADD_INDEX = re.compile(r'ADD (?:UNIQUE )?INDEX `(\w+)` \(([^)]*)\)', re.I)
+_DROP_INDEX = re.compile(r'DROP INDEX `(\w+)`', re.I)
+
+
+def _columns(text):
+    return [c.strip().strip('`') for c in text.split(',') if c.strip()]
+
+
+def index_name(columns):
+    name = MANAGED_PREFIX + '_'.join(columns)
+    if len(name) > 64:
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+        name = name[:55] + '_' + digest
+    return name
+
+
+def existing_indexes(cursor):
+    """
+    Returns:
+        dict: {索引名: 列名列表}，包含 PRIMARY
+    """
+    cursor.execute("""
+        SELECT INDEX_NAME as index_name, COLUMN_NAME as column_name
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (TABLE,))
+    indexes = {}
+    for row in cursor.fetchall():
+        indexes.setdefault(row['index_name'], []).append(row['column_name'])
+    return indexes
+
+
+def is_covered(columns, index_columns):
+    """
+    index_columns 的索引能否满足 columns 的需要
+    （InnoDB 二级索引末尾隐含主键 id，因此 (capacity) 等同于 (capacity, id)）
+    """
+    effective = list(index_columns)
+    if 'id' not in effective:
+        effective.append('id')
+    return effective[:len(columns)] == list(columns)
+
+
+def load_usage(cursor, days, include_memory=False):
+    """读取最近 days 天内记录过的查询用法"""
+    cursor.execute(f"""
+        SELECT path, pagination, sort_field, sort_order, equality_fields, range_fields, search,
+               calls, total_ms, max_ms, last_seen
+        FROM {USAGE_TABLE}
+        WHERE last_seen >= NOW() - INTERVAL %s DAY
+        ORDER BY total_ms DESC
+    """, (days,))
+    usage = []
+    for row in cursor.fetchall():
+        if row['path'] != 'db' and not include_memory:
+            continue
+        row['equality_fields'] = _columns(row['equality_fields'])
+        row['range_fields'] = _columns(row['range_fields'])
+        usage.append(row)
+    return usage
+
+
+def distinct_counts(cursor, fields):
+    """各字段的不同值个数，用于排列等值条件列的顺序"""
+    fields = sorted(set(fields))
+    if not fields:
+        return {}
+    cursor.execute("SELECT " + ', '.join(f"COUNT(DISTINCT `{f}`) as `{f}`" for f in fields)
+                   + f" FROM {TABLE}")
+    row = cursor.fetchone()
+    return {f: int(row[f] or 0) for f in fields}
+
+
+def candidate_columns(shape, distinct):
+    """
+    为一种查询形状设计索引列：等值条件列在前（不同值多的在前），然后是排序列；
+    按 id 排序时改为选择性最好的范围条件列。排序列之后补上 id，与
+    ORDER BY 排序列, id 一致。只需要主键时返回 None
+    """
+    if shape['search'] == 'index':
+        # 搜索索引已给出候选 id，按主键读取
+        return None
+    columns = sorted(shape['equality_fields'], key=lambda f: (-distinct.get(f, 0), f))
+    sort_field = shape['sort_field']
+    if sort_field not in ('id', 'relevance'):
+        if sort_field not in columns:
+            columns.append(sort_field)
+        columns.append('id')
+    elif shape['range_fields']:
+        columns.append(max(shape['range_fields'], key=lambda f: (distinct.get(f, 0), f)))
+    if not columns or columns == ['id']:
+        return None
+    return columns
+
+
+def serves(index_columns, shape):
+    """索引的首列是否用于该查询形状的过滤或排序"""
+    first = index_columns[0]
+    return (first in shape['equality_fields'] or first in shape['range_fields']
+            or first == shape['sort_field'])
+
+
+def recommend(usage, indexes, distinct, min_calls=20, min_avg_ms=5.0, max_new=5):
+    """
+    根据查询用法推荐索引变更
+
+    Args:
+        usage (list): load_usage 的结果
+        indexes (dict): {索引名: 列名列表}，现有索引（含尚未执行的迁移）
+        distinct (dict): 各字段的不同值个数
+        min_calls (int): 推荐新索引所需的最少调用次数
+        min_avg_ms (float): 推荐新索引所需的最低平均耗时（毫秒）
+        max_new (int): 最多推荐的新索引数
+
+    Returns:
+        tuple: (新建列表, 删除列表)，每项为 dict
+    """
+    candidates = {}
+    for shape in usage:
+        columns = candidate_columns(shape, distinct)
+        if columns is None or any(is_covered(columns, c) for c in indexes.values()):
+            continue
+        entry = candidates.setdefault(tuple(columns), {'calls': 0, 'total_ms': 0.0, 'shapes': []})
+        entry['calls'] += shape['calls']
+        entry['total_ms'] += shape['total_ms']
+        entry['shapes'].append(shape)
+
+    # 一个候选是另一个候选的前缀时，较长的索引可以同时满足两者
+    for columns in sorted(candidates, key=len):
+        longer = [c for c in candidates if len(c) > len(columns) and is_covered(columns, c)]
+        if longer:
+            target = max(longer, key=lambda c: candidates[c]['total_ms'])
+            merged = candidates.pop(columns)
+            candidates[target]['calls'] += merged['calls']
+            candidates[target]['total_ms'] += merged['total_ms']
+            candidates[target]['shapes'].extend(merged['shapes'])
+
+    creates = []
+    for columns, entry in sorted(candidates.items(), key=lambda item: -item[1]['total_ms']):
+        if entry['calls'] < min_calls or entry['total_ms'] / entry['calls'] < min_avg_ms:
+            continue
+        entry['shapes'].sort(key=lambda s: -s['total_ms'])
+        creates.append(dict(entry, columns=list(columns), name=index_name(columns)))
+        if len(creates) >= max_new:
+            break
+
+    drops = []
+    for name, columns in sorted(indexes.items() if usage else ()):
+        if not name.startswith(MANAGED_PREFIX):
+            continue
+        redundant = [other for other, other_columns in indexes.items()
+                     if other != name and len(other_columns) > len(columns)
+                     and is_covered(columns, other_columns)]
+        if redundant:
+            drops.append({'name': name, 'columns': columns, 'reason': f'被索引 {redundant[0]} 覆盖'})
+        elif not any(serves(columns, shape) for shape in usage):
+            drops.append({'name': name, 'columns': columns, 'reason': '统计期内没有查询使用'})
+    return creates, drops
+
+
+def _sample_value(cursor, field, operator):
+    """为 EXPLAIN 查询选取有代表性的值：等值取最常见的值，范围取 90 分位"""
+    if operator == '=':
+        cursor.execute(f"""
+            SELECT `{field}` as v FROM {TABLE} WHERE `{field}` IS NOT NULL
+            GROUP BY `{field}` ORDER BY COUNT(*) DESC LIMIT 1
+        """)
+    else:
+        cursor.execute(f"SELECT COUNT(*) as c FROM {TABLE} WHERE `{field}` IS NOT NULL")
+        offset = int(cursor.fetchone()['c'] * 0.9)
+        cursor.execute(f"""
+            SELECT `{field}` as v FROM {TABLE} WHERE `{field}` IS NOT NULL
+            ORDER BY `{field}` LIMIT 1 OFFSET %s
+        """, (offset,))
+    row = cursor.fetchone()
+    return row['v'] if row else None
+
+
+def explain_query(cursor, shape):
+    """按 GET /data 数据库路径的写法生成该查询形状的代表性 SQL（值已内联）"""
+    conditions, params = [], []
+    for field in shape['equality_fields']:
+        conditions.append(f"`{field}` = %s")
+        params.append(_sample_value(cursor, field, '='))
+    for field in shape['range_fields']:
+        conditions.append(f"`{field}` >= %s")
+        params.append(_sample_value(cursor, field, '>='))
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    sort_field = shape['sort_field'] if shape['sort_field'] != 'relevance' else 'id'
+    order = shape['sort_order']
+    if shape['pagination'] == 'cursor':
+        sql = f"SELECT * FROM {TABLE}{where} ORDER BY `{sort_field}` {order}, id {order} LIMIT 11"
+    else:
+        sql = f"SELECT id FROM {TABLE}{where} ORDER BY `{sort_field}` {order}, id {order} LIMIT 10 OFFSET 0"
+    return cursor.mogrify(sql, params)
+
+
+def explain(cursor, sql):
+    cursor.execute('EXPLAIN ' + sql)
+    return cursor.fetchall()
+
+
+def format_explain(rows):
+    return [
+        f"    type={row.get('type')} key={row.get('key')} rows={row.get('rows')} "
+        f"filtered={row.get('filtered')} extra={row.get('Extra') or ''}"
+        for row in rows
+    ]
+
+
+class Migration:
+    """一个迁移文件：-- up / -- down 两段 SQL，以及 -- explain: 开头的代表性查询"""
+
+    def __init__(self, path):
+        self.path = path
+        match = _MIGRATION_FILE.match(os.path.basename(path))
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        with open(path, 'r', encoding='utf-8') as f:
+            self.text = f.read()
+        self.checksum = hashlib.sha1(self.text.encode('utf-8')).hexdigest()
+        self.explain = []
+        sections = {'up': [], 'down': []}
+        current = None
+        for line in self.text.splitlines():
+            stripped = line.strip()
+            if stripped.lower() == '-- up':
+                current = 'up'
+            elif stripped.lower() == '-- down':
+                current = 'down'
+            elif stripped.startswith('-- explain:'):
+                self.explain.append(stripped[len('-- explain:'):].strip())
+            elif stripped.startswith('--') or not stripped:
+                continue
+            elif current:
+                sections[current].append(line)
+        self.up = self._statements(sections['up'])
+        self.down = self._statements(sections['down'])
+
+    @staticmethod
+    def _statements(lines):
+        return [s.strip() for s in '\n'.join(lines).split(';') if s.strip()]
+
+
+def list_migrations():
+    if not os.path.isdir(MIGRATIONS_DIR):
+        return []
+    return [Migration(os.path.join(MIGRATIONS_DIR, name))
+            for name in sorted(os.listdir(MIGRATIONS_DIR)) if _MIGRATION_FILE.match(name)]
+
+
+def ensure_migrations_table(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+                version INT NOT NULL PRIMARY KEY,
+                name VARCHAR(128) NOT NULL,
+                checksum CHAR(40) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """)
+    connection.commit()
+
+
+def applied_migrations(connection):
+    ensure_migrations_table(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT version, name, checksum, applied_at FROM {MIGRATIONS_TABLE} ORDER BY version")
+        return {row['version']: row for row in cursor.fetchall()}
+
+
+def planned_indexes(connection):
+    """现有索引加上尚未执行的迁移之后的索引"""
+    with connection.cursor() as cursor:
+        indexes = existing_indexes(cursor)
+    applied = applied_migrations(connection)
+    for migration in list_migrations():
+        if migration.version in applied:
+            continue
+        for statement in migration.up:
+            for name, columns in _ADD_INDEX.findall(statement):
+                indexes[name] = _columns(columns)
+            for name in _DROP_INDEX.findall(statement):
+                indexes.pop(name, None)
+    return indexes
+
+
+def write_migration(name, description, explain_sqls, up, down):
+    """写入下一个版本号的迁移文件，返回文件路径"""
+    os.makedirs(MIGRATIONS_DIR, exist_ok=True)
+    versions = [m.version for m in list_migrations()]
+    version = max(versions, default=0) + 1
+    path = os.path.join(MIGRATIONS_DIR, f'{version:04d}_{name}.sql')
+    lines = [f'-- {line}' for line in description]
+    lines += [f'-- explain: {sql}' for sql in explain_sqls]
+    lines += ['', '-- up', up + ';', '', '-- down', down + ';', '']
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    return path
+
+
+def apply_migration(connection, migration, direction, dry_run=False):
+    """执行迁移的 up 或 down，并输出代表性查询在执行前后的 EXPLAIN"""
+    statements = migration.up if direction == 'up' else migration.down
+    print(f"[{migration.version:04d}] {migration.name} ({direction})")
+    with connection.cursor() as cursor:
+        before = {sql: explain(cursor, sql) for sql in migration.explain}
+        for statement in statements:
+            print(f"  {statement}")
+        if dry_run:
+            return
+        for statement in statements:
+            cursor.execute(statement)
+        if direction == 'up':
+            cursor.execute(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum),
+            )
+        else:
+            cursor.execute(f"DELETE FROM {MIGRATIONS_TABLE} WHERE version = %s", (migration.version,))
+        connection.commit()
+        # 更新索引基数统计，查询规划（filter_query.IndexCatalog）在下次刷新时读到新索引
+        cursor.execute(f"ANALYZE TABLE {TABLE}")
+        cursor.fetchall()
+        for sql in migration.explain:
+            print(f"  EXPLAIN {sql}")
+            print("   之前:")
+            print('\n'.join(format_explain(before[sql])))
+            print("   之后:")
+            print('\n'.join(format_explain(explain(cursor, sql))))
+
+
+def _connect():
+    return pymysql.connect(**DB_CONFIG)
+
+
+def cmd_usage(args, connection):
+    with connection.cursor() as cursor:
+        usage = load_usage(cursor, args.days, include_memory=True)
+    if not usage:
+        print("没有记录到查询用法（服务运行一段时间后再查看，写入间隔见 QUERY_USAGE_FLUSH_INTERVAL）")
+        return
+    print(f"{'path':<7}{'分页':<8}{'排序':<22}{'等值条件':<24}{'范围条件':<24}{'搜索':<7}"
+          f"{'调用':>8}{'平均ms':>10}{'最大ms':>10}")
+    for row in usage[:args.limit]:
+        print(f"{row['path']:<7}{row['pagination']:<8}"
+              f"{row['sort_field'] + ' ' + row['sort_order']:<22}"
+              f"{','.join(row['equality_fields']) or '-':<24}{','.join(row['range_fields']) or '-':<24}"
+              f"{row['search'] or '-':<7}{row['calls']:>8}{row['total_ms'] / row['calls']:>10.1f}"
+              f"{row['max_ms']:>10.1f}")
+
+
+def _recommendations(args, connection):
+    indexes = planned_indexes(connection)
+    with connection.cursor() as cursor:
+        usage = load_usage(cursor, args.days, args.include_memory)
+        fields = [f for s in usage for f in s['equality_fields'] + s['range_fields']]
+        distinct = distinct_counts(cursor, fields)
+    return recommend(usage, indexes, distinct, args.min_calls, args.min_avg_ms, args.max_new)
+
+
+def _describe_create(entry):
+    avg = entry['total_ms'] / entry['calls']
+    return (f"新建 {entry['name']} ({', '.join(entry['columns'])}): "
+            f"{len(entry['shapes'])} 种查询，共 {entry['calls']} 次，平均 {avg:.1f} ms")
+
+
+def cmd_recommend(args, connection):
+    creates, drops = _recommendations(args, connection)
+    if not creates and not drops:
+        print("没有推荐的索引变更")
+    for entry in creates:
+        print(_describe_create(entry))
+    for entry in drops:
+        print(f"删除 {entry['name']} ({', '.join(entry['columns'])}): {entry['reason']}")
+
+
+def cmd_make(args, connection):
+    creates, drops = _recommendations(args, connection)
+    if not creates and not drops:
+        print("没有推荐的索引变更，未生成迁移文件")
+        return
+    with connection.cursor() as cursor:
+        for entry in creates:
+            columns = ', '.join(f'`{c}`' for c in entry['columns'])
+            explain_sqls = [explain_query(cursor, s) for s in entry['shapes'][:MAX_EXPLAIN_QUERIES]]
+            path = write_migration(
+                f"create_{entry['name']}", [_describe_create(entry)], explain_sqls,
+                f"ALTER TABLE {TABLE} ADD INDEX `{entry['name']}` ({columns}), ALGORITHM=INPLACE, LOCK=NONE",
+                f"ALTER TABLE {TABLE} DROP INDEX `{entry['name']}`",
+            )
+            print(f"已生成 {os.path.relpath(path)}")
+    for entry in drops:
+        columns = ', '.join(f'`{c}`' for c in entry['columns'])
+        path = write_migration(
+            f"drop_{entry['name']}",
+            [f"删除 {entry['name']} ({', '.join(entry['columns'])}): {entry['reason']}"], [],
+            f"ALTER TABLE {TABLE} DROP INDEX `{entry['name']}`",
+            f"ALTER TABLE {TABLE} ADD INDEX `{entry['name']}` ({columns}), ALGORITHM=INPLACE, LOCK=NONE",
+        )
+        print(f"已生成 {os.path.relpath(path)}")
+
+
+def cmd_migrate(args, connection):
+    applied = applied_migrations(connection)
+    pending = [m for m in list_migrations() if m.version not in applied]
+    if not pending:
+        print("没有需要执行的迁移")
+    for migration in pending:
+        apply_migration(connection, migration, 'up', args.dry_run)
+
+
+def cmd_rollback(args, connection):
+    applied = applied_migrations(connection)
+    migrations = {m.version: m for m in list_migrations()}
+    for version in sorted(applied, reverse=True)[:args.steps]:
+        if version not in migrations:
+            raise SystemExit(f"找不到已执行的迁移 {version:04d} 的文件，无法回滚")
+        apply_migration(connection, migrations[version], 'down', args.dry_run)
+
+
+def cmd_status(args, connection):
+    applied = applied_migrations(connection)
+    migrations = list_migrations()
+    for migration in migrations:
+        row = applied.get(migration.version)
+        if row is None:
+            state = '未执行'
+        elif row['checksum'] != migration.checksum:
+            state = f"已执行 {row['applied_at']}（文件在执行后被修改）"
+        else:
+            state = f"已执行 {row['applied_at']}"
+        print(f"[{migration.version:04d}] {migration.name}: {state}")
+    if not migrations:
+        print("没有迁移文件")
+    with connection.cursor() as cursor:
+        indexes = existing_indexes(cursor)
+    print(f"{TABLE} 表的索引:")
+    for name, columns in sorted(indexes.items()):
+        print(f"  {name} ({', '.join(columns)})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='根据查询用法管理 powerstation 表的二级索引')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    usage = subparsers.add_parser('usage', help='查看记录的查询用法')
+    usage.add_argument('--limit', type=int, default=30, help='最多显示的条数 (默认: 30)')
+
+    for name, help_text in (('recommend', '查看推荐的索引变更'), ('make', '把推荐的变更写成迁移文件')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--min-calls', type=int, default=20,
+                         help='推荐新索引所需的最少调用次数 (默认: 20)')
+        sub.add_argument('--min-avg-ms', type=float, default=5.0,
+                         help='推荐新索引所需的最低平均耗时毫秒数 (默认: 5)')
+        sub.add_argument('--max-new', type=int, default=5, help='最多推荐的新索引数 (默认: 5)')
+        sub.add_argument('--include-memory', action='store_true',
+                         help='同时考虑列式快照处理的查询（关闭列式引擎前评估用）')
+
+    for name, help_text in (('migrate', '执行尚未执行的迁移'), ('rollback', '回滚最近执行的迁移')):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--dry-run', action='store_true', help='只输出将执行的语句')
+        if name == 'rollback':
+            sub.add_argument('--steps', type=int, default=1, help='回滚的迁移数 (默认: 1)')
+
+    subparsers.add_parser('status', help='查看迁移状态和现有索引')
+
+    for sub in subparsers.choices.values():
+        sub.add_argument('--days', type=int, default=7, help='统计最近多少天的查询用法 (默认: 7)')
+    return parser.parse_args()
+
+
+COMMANDS = {
+    'usage': cmd_usage,
+    'recommend': cmd_recommend,
+    'make': cmd_make,
+    'migrate': cmd_migrate,
+    'rollback': cmd_rollback,
+    'status': cmd_status,
+}
+
+
+def main():
+    args = parse_args()
+    connection = _connect()
+    try:
+        COMMANDS[args.command](args, connection)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
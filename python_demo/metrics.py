@@ -0,0 +1,417 @@
+"""
+指标模块
+进程内的计数器、直方图和瞬时值，按 Prometheus 文本格式在 /metrics 导出：
+- 每个路由的请求耗时、请求/响应大小、每个请求的数据库查询次数
+- 请求内各阶段的耗时：借出连接、执行查询、行处理、JSON 序列化、压缩、调用 Ollama
+- Ollama 的首个 token 时间（TTFT）、总耗时和请求/响应大小
+
+记录一次观测只需一次二分查找和一次加锁累加，可以在生产环境中常开。
+多进程部署时设置 METRICS_DIR（serve.py 会自动设置），各 worker 定期把快照写入该目录，
+/metrics 返回所有 worker 合并后的结果
+"""
+
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request, Response
+from flask.json.provider import DefaultJSONProvider
+
+import db_pool
+
+# 耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 大小直方图的桶（字节）
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# 每个请求查询次数的桶
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}  # 标签值元组 -> 数值
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def state(self):
+        with self._lock:
+            return {json.dumps(labels): value for labels, value in self._series.items()}
+
+    @staticmethod
+    def merge(target, value):
+        return (target or 0) + value
+
+    def render(self, series):
+        lines = []
+        for key, value in sorted(series.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, json.loads(key))} {_format_number(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    """瞬时值，导出时由 collect 函数计算"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), collect=None):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+
+    def state(self):
+        if self.collect is not None:
+            with self._lock:
+                self._series = dict(self.collect())
+        return super().state()
+
+
+class Histogram:
+    """累计分桶直方图"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # 标签值元组 -> [各桶计数（非累计，末尾为 +Inf）, 总和]
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def state(self):
+        with self._lock:
+            return {json.dumps(labels): [list(counts), total] for labels, (counts, total) in self._series.items()}
+
+    @staticmethod
+    def merge(target, value):
+        if target is None:
+            return [list(value[0]), value[1]]
+        return [[a + b for a, b in zip(target[0], value[0])], target[1] + value[1]]
+
+    def render(self, series):
+        lines = []
+        for key, (counts, total) in sorted(series.items()):
+            labels = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_number(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_number(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """指标注册表，负责快照、多进程合并和文本格式输出"""
+
+    def __init__(self, directory=None, snapshot_interval=5.0):
+        """
+        Args:
+            directory (str): 多进程快照目录，None 表示只导出本进程
+            snapshot_interval (float): 写入快照的间隔秒数
+        """
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self._metrics = []
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), collect=None):
+        return self._add(Gauge(name, help_text, labelnames, collect))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def state(self):
+        return {metric.name: metric.state() for metric in self._metrics}
+
+    def _snapshot_path(self, pid=None):
+        return os.path.join(self.directory, f'{pid or os.getpid()}.json')
+
+    def write_snapshot(self):
+        """把本进程的指标写入快照目录（先写临时文件再替换，读取方不会读到半个文件）"""
+        path = self._snapshot_path()
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state(), f)
+        os.replace(temp_path, path)
+
+    def ensure_snapshots(self):
+        """多进程模式下启动定期写入快照的后台线程（在 worker 中首次处理请求时调用）"""
+        if self.directory is None or self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='metrics-snapshot', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                print(f"写入指标快照失败: {e}")
+            time.sleep(self.snapshot_interval)
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+
+    def _merged_state(self):
+        if self.directory is None:
+            return self.state()
+        self.write_snapshot()
+        merged = {}
+        kinds = {metric.name: metric for metric in self._metrics}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+                pid = int(os.path.basename(path).split('.')[0])
+            except (OSError, ValueError):
+                continue
+            alive = self._alive(pid)
+            for name, series in snapshot.items():
+                metric = kinds.get(name)
+                # 已退出的 worker 保留计数器和直方图（保持单调递增），不保留瞬时值
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                target = merged.setdefault(name, {})
+                for key, value in series.items():
+                    target[key] = metric.merge(target.get(key), value)
+        return merged
+
+    def render(self):
+        """Prometheus 文本格式"""
+        state = self._merged_state()
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render(state.get(metric.name, {})))
+        return '\n'.join(lines) + '\n'
+
+
+# 是否启用指标统计
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') not in ('0', 'false', 'False')
+
+# 全局指标注册表
+registry = Registry(os.getenv('METRICS_DIR') or None, float(os.getenv('METRICS_SNAPSHOT_INTERVAL', 5)))
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', '请求处理耗时（流式响应只包含生成响应头之前的部分）',
+    ('route', 'method', 'status'))
+request_phase_duration = registry.histogram(
+    'http_request_phase_seconds', '请求内各阶段的耗时（同一请求内同一阶段的耗时累加后记录一次）',
+    ('route', 'phase'))
+request_size = registry.histogram(
+    'http_request_size_bytes', '请求体大小', ('route',), SIZE_BUCKETS)
+response_size = registry.histogram(
+    'http_response_size_bytes', '响应体大小（压缩后，流式响应不统计）', ('route',), SIZE_BUCKETS)
+request_db_queries = registry.histogram(
+    'http_request_db_queries', '每个请求执行的数据库查询次数', ('route',), COUNT_BUCKETS)
+background_db_queries = registry.counter(
+    'db_background_queries_total', '请求之外（后台线程、预热）执行的数据库查询次数')
+ollama_duration = registry.histogram(
+    'ollama_request_duration_seconds', '调用 Ollama 的总耗时', ('endpoint', 'status'))
+ollama_ttft = registry.histogram(
+    'ollama_time_to_first_token_seconds', 'Ollama 生成首个 token 的时间（模型加载 + 提示词处理，由 Ollama 报告）',
+    ('model',))
+ollama_request_size = registry.histogram(
+    'ollama_request_size_bytes', '发送给 Ollama 的请求体大小', ('endpoint',), SIZE_BUCKETS)
+ollama_response_size = registry.histogram(
+    'ollama_response_size_bytes', 'Ollama 返回的响应体大小', ('endpoint',), SIZE_BUCKETS)
+ollama_tokens = registry.counter(
+    'ollama_tokens_total', 'Ollama 处理的 token 数', ('model', 'kind'))
+
+
+def _collect_pool_connections():
+    for stats in db_pool.all_pool_stats():
+        yield (stats.get('database') or '', 'in_use'), stats['in_use']
+        yield (stats.get('database') or '', 'idle'), stats['idle']
+
+
+registry.gauge('db_pool_connections', '连接池中的连接数', ('database', 'state'), _collect_pool_connections)
+
+
+class _RequestMetrics:
+    """一个请求内累计的阶段耗时和查询次数"""
+
+    __slots__ = ('route', 'started', 'phases', 'queries')
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.queries = 0
+
+
+def _current():
+    if not has_request_context():
+        return None
+    return g.get('_request_metrics')
+
+
+def record_phase(name, elapsed):
+    """把一段耗时累加到当前请求的某个阶段（不在请求中时忽略）"""
+    current = _current()
+    if current is not None:
+        current.phases[name] = current.phases.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def phase(name):
+    """统计代码块的耗时，计入当前请求的某个阶段"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+
+def _on_query(query, args, elapsed, cursor):
+    current = _current()
+    if current is None:
+        background_db_queries.inc()
+        return
+    current.queries += 1
+    current.phases['db_query'] = current.phases.get('db_query', 0.0) + elapsed
+
+
+def observe_ollama(endpoint, status, elapsed, request_bytes, response_bytes, result=None, model=''):
+    """
+    记录一次 Ollama 调用
+
+    Args:
+        endpoint (str): 接口路径，如 /api/chat
+        status (str): HTTP 状态码或错误类型
+        result (dict): 非流式响应的 JSON，包含 Ollama 报告的各阶段耗时（纳秒）和 token 数
+    """
+    if not METRICS_ENABLED:
+        return
+    ollama_duration.observe((endpoint, str(status)), elapsed)
+    ollama_request_size.observe((endpoint,), request_bytes)
+    if response_bytes is not None:
+        ollama_response_size.observe((endpoint,), response_bytes)
+    record_phase('ollama', elapsed)
+    if result:
+        ttft_ns = (result.get('load_duration') or 0) + (result.get('prompt_eval_duration') or 0)
+        if ttft_ns:
+            ollama_ttft.observe((model,), ttft_ns / 1e9)
+        if result.get('prompt_eval_count'):
+            ollama_tokens.inc((model, 'prompt'), result['prompt_eval_count'])
+        if result.get('eval_count'):
+            ollama_tokens.inc((model, 'completion'), result['eval_count'])
+
+
+class _TimedJSONProvider(DefaultJSONProvider):
+    """jsonify 的耗时计入 serialize 阶段"""
+
+    def response(self, *args, **kwargs):
+        with phase('serialize'):
+            return super().response(*args, **kwargs)
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    registry.ensure_snapshots()
+    g._request_metrics = _RequestMetrics(_route())
+
+
+def _after_request(response):
+    current = g.pop('_request_metrics', None)
+    if current is None:
+        return response
+    route = current.route
+    request_duration.observe((route, request.method, str(response.status_code)),
+                             time.perf_counter() - current.started)
+    for name, elapsed in current.phases.items():
+        request_phase_duration.observe((route, name), elapsed)
+    request_db_queries.observe((route,), current.queries)
+    if request.content_length:
+        request_size.observe((route,), request.content_length)
+    if not response.is_streamed:
+        response_size.observe((route,), response.content_length or 0)
+    return response
+
+
+def metrics_view():
+    """GET /metrics：Prometheus 文本格式"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    """为 Flask 应用注册请求钩子、查询观察者和 /metrics 接口"""
+    if not METRICS_ENABLED:
+        return
+    json_provider = _TimedJSONProvider(app)
+    json_provider.ensure_ascii = app.json.ensure_ascii
+    json_provider.sort_keys = app.json.sort_keys
+    json_provider.compact = app.json.compact
+    app.json = json_provider
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    db_pool.add_query_observer(_on_query)
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
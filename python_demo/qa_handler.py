@@ -10,7 +10,10 @@ import pymysql
 import pymysql.cursors
 from datetime import datetime
 import os
+import time
 from dotenv import load_dotenv
+from storage import get_storage
+import metrics
 
 load_dotenv()
 
@@ -26,7 +29,7 @@ class QAHandler:
             db_config (dict): 数据库配置，如果为None则使用默认配置
         """
         # Ollama配置
-        self.ollama_base_url = "http://localhost:11434"  # Ollama默认地址
+        self.ollama_base_url = os.getenv('OLLAMA_BASE_URL', "http://localhost:11434")  # Ollama默认地址
         self.model_name = "deepseek-r1:32b"
         self.session_id = "default"  # 默认会话ID
 
@@ -43,6 +46,9 @@ class QAHandler:
         else:
             self.db_config = db_config
 
+        # 与 main.py 共享同一个存储后端（STORAGE_BACKEND=mysql/sqlite）
+        self.storage = get_storage(self.db_config)
+
         # 系统提示词
         self.system_prompt = """你是小王，一个专业的电站数据管理系统AI助手。
 你的职责是：
@@ -54,9 +60,10 @@ class QAHandler:
 请用中文回答问题，保持专业且友好的语气。"""
 
     def get_db_connection(self):
-        """获取数据库连接"""
+        """从存储后端获取数据库连接，close() 时归还连接池"""
         try:
-            connection = pymysql.connect(**self.db_config)
+            with metrics.phase('db_connect'):
+                connection = self.storage.connection()
             return connection
         except Exception as e:
             print(f"数据库连接失败: {e}")
@@ -212,22 +219,33 @@ class QAHandler:
             })
 
             # 调用Ollama API
-            response = requests.post(
-                f"{self.ollama_base_url}/api/chat",
-                json={
-                    "model": self.model_name,
-                    "messages": messages,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                    }
-                },
-                timeout=60  # 60秒超时
-            )
+            payload = json.dumps({
+                "model": self.model_name,
+                "messages": messages,
+                "stream": False,
+                "options": {
+                    "temperature": 0.7,
+                    "top_p": 0.9,
+                }
+            }).encode('utf-8')
+            started = time.perf_counter()
+            try:
+                response = requests.post(
+                    f"{self.ollama_base_url}/api/chat",
+                    data=payload,
+                    headers={'Content-Type': 'application/json'},
+                    timeout=60  # 60秒超时
+                )
+            except requests.exceptions.RequestException as e:
+                metrics.observe_ollama('/api/chat', type(e).__name__, time.perf_counter() - started,
+                                       len(payload), None)
+                raise
+
+            result = response.json() if response.status_code == 200 else None
+            metrics.observe_ollama('/api/chat', response.status_code, time.perf_counter() - started,
+                                   len(payload), len(response.content), result, self.model_name)
 
             if response.status_code == 200:
-                result = response.json()
                 answer = result.get('message', {}).get('content', '')
 
                 if answer:
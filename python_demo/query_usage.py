@@ -0,0 +1,182 @@
+"""
+查询用法统计模块
+记录 GET /data 实际使用的排序/过滤组合（查询形状）及其耗时，
+在内存中汇总后定期写入 query_usage 表，供 manage_indexes.py 推荐索引
+"""
+
+import hashlib
+import os
+import threading
+
+USAGE_TABLE = 'query_usage'
+
+# 等值条件（可作为索引前缀列）
+EQUALITY_OPS = ('=', 'isnull')
+
+# 范围条件（可使用索引做范围扫描）
+RANGE_OPS = ('>', '>=', '<', '<=', 'between', 'in')
+
+
+class QueryShape:
+    """一次查询的形状：与具体的值无关，只描述用到了哪些字段"""
+
+    def __init__(self, path, pagination, sort_field, sort_order, filters=(), search=''):
+        """
+        Args:
+            path (str): memory（列式快照）/ db（数据库）
+            pagination (str): offset / cursor
+            sort_field (str): 排序字段
+            sort_order (str): ASC / DESC
+            filters (list): filter_query.Predicate 列表
+            search (str): 搜索方式，'' 表示无搜索，index（搜索索引）/ like（LIKE 查询）
+        """
+        self.path = path
+        self.pagination = pagination
+        self.sort_field = sort_field
+        self.sort_order = sort_order
+        self.equality_fields = tuple(sorted({p.field for p in filters if p.op in EQUALITY_OPS}))
+        self.range_fields = tuple(sorted(
+            {p.field for p in filters if p.op in RANGE_OPS} - set(self.equality_fields)
+        ))
+        self.search = search
+
+    def key(self):
+        return (self.path, self.pagination, self.sort_field, self.sort_order,
+                self.equality_fields, self.range_fields, self.search)
+
+    def signature(self):
+        return hashlib.sha1(repr(self.key()).encode('utf-8')).hexdigest()
+
+
+class QueryUsageRecorder:
+    """线程安全的查询用法汇总，后台线程定期写入数据库"""
+
+    def __init__(self, get_connection, flush_interval=60.0):
+        """
+        Args:
+            get_connection (callable): 返回数据库连接的函数
+            flush_interval (float): 写入数据库的间隔秒数
+        """
+        self.get_connection = get_connection
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}  # 签名 -> [QueryShape, 调用次数, 总耗时ms, 最大耗时ms]
+        self._thread = None
+        self._stop = threading.Event()
+        self._table_ready = False
+        self.recorded_count = 0
+        self.flushed_count = 0
+        self.error_count = 0
+
+    def record(self, shape, elapsed_ms):
+        """记录一次查询（首次调用时启动后台写入线程）"""
+        signature = shape.signature()
+        with self._lock:
+            entry = self._pending.get(signature)
+            if entry is None:
+                self._pending[signature] = [shape, 1, elapsed_ms, elapsed_ms]
+            else:
+                entry[1] += 1
+                entry[2] += elapsed_ms
+                entry[3] = max(entry[3], elapsed_ms)
+            self.recorded_count += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='query-usage', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.error_count += 1
+                print(f"写入查询用法统计失败: {e}")
+
+    def _ensure_table(self, connection):
+        if self._table_ready:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {USAGE_TABLE} (
+                    signature CHAR(40) NOT NULL PRIMARY KEY,
+                    path VARCHAR(16) NOT NULL,
+                    pagination VARCHAR(16) NOT NULL,
+                    sort_field VARCHAR(64) NOT NULL,
+                    sort_order VARCHAR(4) NOT NULL,
+                    equality_fields VARCHAR(255) NOT NULL,
+                    range_fields VARCHAR(255) NOT NULL,
+                    search VARCHAR(8) NOT NULL,
+                    calls BIGINT NOT NULL,
+                    total_ms DOUBLE NOT NULL,
+                    max_ms DOUBLE NOT NULL,
+                    first_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """)
+        connection.commit()
+        self._table_ready = True
+
+    def flush(self):
+        """把汇总的用法写入数据库（失败时保留，下次合并写入）"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        connection = self.get_connection()
+        try:
+            if not connection:
+                raise RuntimeError('数据库连接失败')
+            self._ensure_table(connection)
+            with connection.cursor() as cursor:
+                cursor.executemany(f"""
+                    INSERT INTO {USAGE_TABLE}
+                        (signature, path, pagination, sort_field, sort_order,
+                         equality_fields, range_fields, search, calls, total_ms, max_ms)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE calls = calls + VALUES(calls),
+                        total_ms = total_ms + VALUES(total_ms),
+                        max_ms = GREATEST(max_ms, VALUES(max_ms)),
+                        last_seen = CURRENT_TIMESTAMP
+                """, [
+                    (signature, shape.path, shape.pagination, shape.sort_field, shape.sort_order,
+                     ','.join(shape.equality_fields), ','.join(shape.range_fields), shape.search,
+                     calls, total_ms, max_ms)
+                    for signature, (shape, calls, total_ms, max_ms) in pending.items()
+                ])
+            connection.commit()
+            self.flushed_count += sum(entry[1] for entry in pending.values())
+        except Exception:
+            with self._lock:
+                for signature, (shape, calls, total_ms, max_ms) in pending.items():
+                    entry = self._pending.get(signature)
+                    if entry is None:
+                        self._pending[signature] = [shape, calls, total_ms, max_ms]
+                    else:
+                        entry[1] += calls
+                        entry[2] += total_ms
+                        entry[3] = max(entry[3], max_ms)
+            raise
+        finally:
+            if connection:
+                connection.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'pending_shapes': len(self._pending),
+                'recorded_count': self.recorded_count,
+                'flushed_count': self.flushed_count,
+                'error_count': self.error_count,
+            }
+
+
+# 是否记录查询用法
+QUERY_USAGE_ENABLED = os.getenv('QUERY_USAGE_ENABLED', '1') not in ('0', 'false', 'False')
+
+# 写入数据库的间隔秒数
+QUERY_USAGE_FLUSH_INTERVAL = float(os.getenv('QUERY_USAGE_FLUSH_INTERVAL', 60))
+
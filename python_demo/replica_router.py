@@ -0,0 +1,217 @@
+"""
+读写分离模块
+配置了只读副本（DB_REPLICAS，见 storage.py）时，读接口的查询按 REPLICA_ROUTING 分配到副本，
+写操作和其他查询仍使用主库。
+
+副本的复制进度用变更日志的版本号衡量：后台线程定期读取各副本的最大版本号，并在主库上计算
+副本尚未复制的最早一条变更距今多久。落后超过 REPLICA_MAX_LAG_SECONDS、检查失败或检查结果
+过期的副本不再分配读请求，没有可用副本时读主库。
+
+读己之写：写接口在响应头 X-Read-Token 中返回写入后的版本号，客户端在之后的读请求中带上
+同名请求头，只有已复制到该版本的副本才会被选中。本进程已应用到缓存和索引的版本同样作为下限，
+避免副本上的旧数据写入行缓存、计数缓存，或以新的 ETag 返回
+"""
+
+import itertools
+import os
+import threading
+import time
+
+import change_log
+import metrics
+
+# 主库的节点名
+PRIMARY = 'primary'
+
+# 副本选择策略：round_robin 轮流分配，least_loaded 选择本进程借出连接最少的副本
+ROUTING_POLICIES = ('round_robin', 'least_loaded')
+REPLICA_ROUTING = os.getenv('REPLICA_ROUTING', 'round_robin')
+
+# 副本允许落后主库的最大秒数
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+
+# 检查复制进度的间隔秒数，超过 3 个间隔没有成功检查的副本视为不可用
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 1.0))
+
+read_routes = metrics.registry.counter(
+    'db_read_routes_total', '读请求分配到各数据库节点的次数', ('node',))
+
+
+class Replica:
+    """一个只读副本及其最近一次检查的复制进度"""
+
+    def __init__(self, name, storage):
+        self.name = name
+        self.storage = storage
+        self.version = None   # 已复制到的最大变更版本号
+        self.lag = None       # 落后主库的秒数
+        self.checked_at = 0.0
+        self.error = None
+        self.routed_count = 0
+        self.failure_count = 0
+
+    def available(self, now, max_lag, stale_after):
+        """最近一次检查成功、结果未过期且延迟在允许范围内"""
+        return (self.error is None and self.version is not None
+                and now - self.checked_at <= stale_after and self.lag <= max_lag)
+
+    def stats(self, now, max_lag, stale_after):
+        return {
+            'name': self.name,
+            'available': self.available(now, max_lag, stale_after),
+            'version': self.version,
+            'lag_seconds': None if self.lag is None else round(self.lag, 3),
+            'checked_ago_seconds': round(now - self.checked_at, 3) if self.checked_at else None,
+            'error': self.error,
+            'routed_count': self.routed_count,
+            'failure_count': self.failure_count,
+            'in_use': self.storage.stats().get('in_use', 0),
+        }
+
+
+class ReplicaRouter:
+    """为读请求选择数据库节点"""
+
+    def __init__(self, primary, replicas, policy=REPLICA_ROUTING,
+                 max_lag=REPLICA_MAX_LAG_SECONDS, interval=REPLICA_CHECK_INTERVAL):
+        """
+        Args:
+            primary: 主库的存储后端
+            replicas (list): [(副本名称, 存储后端)]
+            policy (str): round_robin / least_loaded
+            max_lag (float): 副本允许落后主库的最大秒数
+            interval (float): 检查复制进度的间隔秒数
+        """
+        if policy not in ROUTING_POLICIES:
+            raise ValueError(f"不支持的副本选择策略: {policy}（可选 {', '.join(ROUTING_POLICIES)}）")
+        self.primary = primary
+        self.replicas = [Replica(name, storage) for name, storage in replicas]
+        self.policy = policy
+        self.max_lag = max_lag
+        self.interval = interval
+        # 复制进度依据变更日志判断，不记录变更日志时读请求全部使用主库
+        self.enabled = bool(self.replicas) and change_log.CHANGE_LOG_ENABLED
+        if self.replicas and not self.enabled:
+            print("未启用变更日志（CHANGE_LOG_ENABLED=0），无法判断副本延迟，读请求全部使用主库")
+        self.watermark = 0  # 本进程写入过的最大版本号
+        self.primary_routed_count = 0
+        self.check_error = None
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """启动检查复制进度的后台线程（fork 后在子进程中重新启动，可重复调用）"""
+        if not self.enabled or (self._pid == os.getpid() and self._thread is not None):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='replica-check', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.check()
+                self.check_error = None
+            except Exception as e:
+                self.check_error = str(e)
+                print(f"检查副本复制进度失败: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def check(self):
+        """读取各副本已复制到的版本号，并在主库上计算它们的延迟"""
+        connection = self.primary.connection()
+        try:
+            for replica in self.replicas:
+                try:
+                    replica_connection = replica.storage.connection()
+                    try:
+                        version = change_log.latest_version(replica_connection, ensure=False)
+                    finally:
+                        replica_connection.close()
+                except Exception as e:
+                    replica.error = str(e)
+                    replica.failure_count += 1
+                    continue
+                replica.lag = change_log.pending_age(connection, version)
+                replica.version = version
+                replica.error = None
+                replica.checked_at = time.monotonic()
+        finally:
+            connection.close()
+
+    def note_version(self, version):
+        """记录本进程写入后的版本号，之后的读请求只分配给已复制到该版本的副本"""
+        with self._lock:
+            self.watermark = max(self.watermark, version)
+
+    def candidates(self, min_version=0):
+        """
+        可以分配读请求的副本，按策略排好顺序
+
+        Args:
+            min_version (int): 副本至少要复制到的版本号，None 表示只能使用主库
+        """
+        if min_version is None:
+            return []
+        now = time.monotonic()
+        required = max(min_version, self.watermark)
+        stale_after = self.interval * 3
+        replicas = [r for r in self.replicas
+                    if r.available(now, self.max_lag, stale_after) and r.version >= required]
+        if not replicas:
+            return []
+        # 轮流选择起点；least_loaded 按借出连接数稳定排序，负载相同的副本仍然轮流使用
+        start = next(self._counter) % len(replicas)
+        replicas = replicas[start:] + replicas[:start]
+        if self.policy == 'least_loaded':
+            replicas.sort(key=lambda r: r.storage.stats().get('in_use', 0))
+        return replicas
+
+    def connection(self, min_version=0):
+        """
+        为读请求获取连接，副本连接失败时尝试下一个副本，都不可用时使用主库
+
+        Returns:
+            tuple: (连接, 节点名)
+        """
+        self.start()
+        for replica in self.candidates(min_version):
+            try:
+                connection = replica.storage.connection()
+            except Exception as e:
+                replica.error = str(e)
+                replica.failure_count += 1
+                print(f"连接副本 {replica.name} 失败，改用其他节点: {e}")
+                continue
+            replica.routed_count += 1
+            read_routes.inc((replica.name,))
+            return connection, replica.name
+        connection = self.primary.connection()
+        self.primary_routed_count += 1
+        read_routes.inc((PRIMARY,))
+        return connection, PRIMARY
+
+    def stats(self):
+        now = time.monotonic()
+        stale_after = self.interval * 3
+        return {
+            'enabled': self.enabled,
+            'policy': self.policy,
+            'max_lag_seconds': self.max_lag,
+            'watermark': self.watermark,
+            'running': self._thread is not None and self._thread.is_alive() and self._pid == os.getpid(),
+            'check_error': self.check_error,
+            'primary_routed_count': self.primary_routed_count,
+            'replicas': [r.stats(now, self.max_lag, stale_after) for r in self.replicas],
+        }
@@ -0,0 +1,143 @@
+"""
+查询结果缓存模块
+按规范化后的查询参数缓存 GET /data 的完整响应体，写接口提交后整体失效。
+相同参数的并发未命中只由第一个请求查询数据库，其余请求等待并共用它的结果（single-flight），
+避免大量浏览器同时打开同一页面时重复执行同样的 COUNT 和分页查询
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """一次进行中的计算，等待者在 done 上等待结果"""
+
+    __slots__ = ('done', 'value')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class ResultCache:
+    """线程安全、按条数和字节数限制容量、有过期时间的结果缓存"""
+
+    def __init__(self, max_entries=512, max_bytes=32 * 1024 * 1024, ttl=60, wait_timeout=30):
+        """
+        Args:
+            max_entries (int): 最多缓存的结果数，超出时淘汰最久未使用的
+            max_bytes (int): 缓存结果的总字节数上限
+            ttl (float): 缓存过期秒数，兜底处理绕过本服务的写入；0 表示不过期
+            wait_timeout (float): 等待进行中的相同查询的最长秒数，超时后自行查询
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()  # key -> (value, size, cached_at)
+        self._bytes = 0
+        self._flights = {}             # (key, generation) -> _Flight
+        self._lock = threading.Lock()
+        # 每次数据变更后递增；计算开始后发生变更时结果不写入缓存，变更后的请求也不会等待变更前开始的计算
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        返回 key 对应的结果，未命中时计算；同一 key 同时只有一个计算在进行
+
+        Args:
+            key: 可哈希的缓存键
+            compute (callable): compute() 返回 (结果, 字节数)，字节数为 None 表示结果不缓存
+                （如错误响应），但仍会交给正在等待的请求
+
+        Returns:
+            tuple: (结果, 来源)，来源为 hit / shared / miss
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self.ttl or now - entry[2] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0], 'hit'
+                self._remove(key)
+            generation = self._generation
+            flight = self._flights.get((key, generation))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(key, generation)] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout) and flight.value is not None:
+                return flight.value, 'shared'
+            # 计算超时或失败：自行计算，结果不写入缓存
+            return compute()[0], 'miss'
+
+        try:
+            value, size = compute()
+            flight.value = value
+        finally:
+            with self._lock:
+                self._flights.pop((key, generation), None)
+            flight.done.set()
+
+        if size is not None and size <= self.max_bytes:
+            with self._lock:
+                if generation == self._generation:
+                    self._remove(key)
+                    self._entries[key] = (value, size, time.monotonic())
+                    self._bytes += size
+                    while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                        _, (_, evicted, _) = self._entries.popitem(last=False)
+                        self._bytes -= evicted
+        return value, 'miss'
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def invalidate(self):
+        """清空缓存，在数据增删改后调用"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def apply_changes(self, upserted_rows, deleted_ids):
+        """数据变更监听函数：任何写入都可能改变各查询的结果，直接清空"""
+        self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights),
+            }
+
+
+# 是否启用 GET /data 的结果缓存
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+
+# 全局结果缓存实例
+result_cache = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 512)),
+    max_bytes=int(os.getenv('RESULT_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL', 60)),
+)
@@ -0,0 +1,123 @@
+"""
+行解码模块
+根据 powerstation 表结构和 cursor.description 为每一列预先生成转换函数，
+在游标构造行时一次完成类型转换，替代逐行 str() 判断小数点的处理循环
+"""
+
+import pymysql.cursors
+from pymysql.constants import FIELD_TYPE
+
+# powerstation 表结构（见 powerstation.sql）
+DOUBLE_COLUMNS = ('lng', 'lat', 'annualCarbon')
+INT_COLUMNS = ('id', 'capacity', 'retire1', 'retire2', 'retire3', 'start1', 'start2', 'year1', 'year2')
+STRING_COLUMNS = ('coalType', 'country', 'plant', 'status', 'type', 'startLabel', 'regionLabel')
+
+# 驱动已经解码为 float / int 的 MySQL 字段类型
+_FLOAT_TYPES = {FIELD_TYPE.DOUBLE, FIELD_TYPE.FLOAT}
+_INT_TYPES = {FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG, FIELD_TYPE.INT24, FIELD_TYPE.LONGLONG}
+
+
+def _to_float(value):
+    return value if value is None or type(value) is float else float(value)
+
+
+def _to_int(value):
+    return value if value is None or type(value) is int else int(value)
+
+
+def _empty_if_none(value):
+    return '' if value is None else value
+
+
+def column_converter(name, type_code=None):
+    """
+    返回某一列的转换函数，无需转换时返回 None
+
+    Args:
+        name (str): 列名
+        type_code (int): cursor.description 中的字段类型，None 表示未知
+    """
+    if name in STRING_COLUMNS:
+        return _empty_if_none
+    if name in DOUBLE_COLUMNS:
+        return None if type_code in _FLOAT_TYPES else _to_float
+    if name in INT_COLUMNS:
+        return None if type_code in _INT_TYPES else _to_int
+    return None
+
+
+def build_row_mapper(fields, description=None):
+    """
+    生成把元组行转换为 dict 的函数
+
+    Args:
+        fields (list): 列名
+        description (tuple): cursor.description，用于跳过驱动已完成的转换
+
+    Returns:
+        callable: row(tuple) -> dict
+    """
+    type_codes = [d[1] for d in description] if description else [None] * len(fields)
+    conversions = [
+        (i, conv) for i, conv in (
+            (i, column_converter(name, type_code))
+            for i, (name, type_code) in enumerate(zip(fields, type_codes))
+        ) if conv is not None
+    ]
+    fields = tuple(fields)
+
+    if not conversions:
+        return lambda row: dict(zip(fields, row))
+
+    def mapper(row):
+        values = list(row)
+        for i, conv in conversions:
+            values[i] = conv(values[i])
+        return dict(zip(fields, values))
+
+    return mapper
+
+
+class TypedRowMixin:
+    """每个结果集只生成一次行转换函数，在构造行时完成类型转换"""
+
+    _row_mapper = None
+
+    def _do_get_result(self):
+        self._row_mapper = None
+        super()._do_get_result()
+
+    def _conv_row(self, row):
+        if row is None:
+            return None
+        mapper = self._row_mapper
+        if mapper is None:
+            mapper = self._row_mapper = build_row_mapper(self._fields, self.description)
+        return mapper(row)
+
+
+class TypedDictCursor(TypedRowMixin, pymysql.cursors.DictCursor):
+    """返回已转换类型的 dict 行的游标"""
+
+
+class TypedSSDictCursor(TypedRowMixin, pymysql.cursors.SSDictCursor):
+    """不缓冲结果集的 TypedDictCursor，用于流式导出"""
+
+
+_DICT_CONVERTERS = [
+    (name, column_converter(name)) for name in DOUBLE_COLUMNS + INT_COLUMNS + STRING_COLUMNS
+]
+
+
+def normalize_rows(rows):
+    """
+    就地转换已经是 dict 的行（来自内存快照，或需要先用原始值生成游标的查询）
+
+    Returns:
+        list: 传入的 rows
+    """
+    for row in rows:
+        for name, conv in _DICT_CONVERTERS:
+            if name in row:
+                row[name] = conv(row[name])
+    return rows
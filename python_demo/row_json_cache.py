@@ -0,0 +1,172 @@
+"""
+行 JSON 缓存模块
+按 id 缓存每一行序列化后的 JSON 字节，分页响应直接把缓存的行片段拼接进响应外层，
+不再对同样的行重复执行 JSON 编码；支持按 Accept-Encoding 协商 gzip / brotli 压缩
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只支持 gzip
+    brotli = None
+
+# 与 Flask jsonify 在非 debug 模式下的输出一致：ASCII 转义、键排序、紧凑分隔符
+# （debug 模式下 jsonify 缩进输出，main.spliced_response 此时改用 jsonify）
+_DUMP_ARGS = {'ensure_ascii': True, 'sort_keys': True, 'separators': (',', ':')}
+
+# 占位字符串，序列化外层后替换为拼接好的行数组
+_PLACEHOLDER = '\x00rows\x00'
+_PLACEHOLDER_JSON = json.dumps(_PLACEHOLDER, **_DUMP_ARGS).encode('ascii')
+
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_SIZE = 1024
+
+
+def encode_row(row):
+    """把一行编码为 JSON 字节"""
+    return json.dumps(row, **_DUMP_ARGS).encode('ascii')
+
+
+def splice_json(envelope, key, fragments):
+    """
+    把行片段拼接进响应外层
+
+    Args:
+        envelope (dict): 不含行数据的响应外层
+        key (str): 行数组所在的字段名
+        fragments (list): 每行的 JSON 字节
+
+    Returns:
+        bytes: 与 jsonify(dict(envelope, key=rows)) 相同的字节（含末尾换行）
+    """
+    head = json.dumps(dict(envelope, **{key: _PLACEHOLDER}), **_DUMP_ARGS).encode('ascii')
+    rows = b'[' + b','.join(fragments) + b']'
+    return head.replace(_PLACEHOLDER_JSON, rows, 1) + b'\n'
+
+
+def negotiate_encoding(accept_encoding):
+    """根据 Accept-Encoding 选择压缩方式，优先 br，其次 gzip，不支持时返回 None"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        params = params.strip().replace(' ', '')
+        quality = 1.0
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class RowJsonCache:
+    """线程安全、有容量上限和过期时间的行 JSON 缓存"""
+
+    def __init__(self, max_entries=10000, ttl=300):
+        """
+        Args:
+            max_entries (int): 最多缓存的行数，超出时淘汰最久未使用的
+            ttl (float): 缓存过期秒数，兜底处理绕过本服务的写入；0 表示不过期
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id -> (JSON 字节, cached_at)
+        self._lock = threading.Lock()
+        # 每次数据变更后递增；读取开始前记录，写入缓存时不一致说明读到的行可能已过期
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def get_many(self, row_ids):
+        """返回 {id: JSON 字节}，只包含命中且未过期的行"""
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for row_id in row_ids:
+                entry = self._entries.get(row_id)
+                if entry is not None and (not self.ttl or now - entry[1] < self.ttl):
+                    self._entries.move_to_end(row_id)
+                    found[row_id] = entry[0]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put(self, row, generation):
+        """
+        编码一行并写入缓存
+
+        Args:
+            row (dict): 已完成类型转换的行
+            generation (int): 读取这一行之前的 generation()
+
+        Returns:
+            bytes: 该行的 JSON 字节
+        """
+        fragment = encode_row(row)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[row['id']] = (fragment, time.monotonic())
+                self._entries.move_to_end(row['id'])
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return fragment
+
+    def fragments(self, rows, generation):
+        """按顺序返回多行的 JSON 字节，命中缓存的行不再编码"""
+        cached = self.get_many([row['id'] for row in rows])
+        return [cached.get(row['id']) or self.put(row, generation) for row in rows]
+
+    def apply_changes(self, upserted_rows, deleted_ids):
+        """数据变更监听函数：删除变更行的缓存"""
+        with self._lock:
+            self._generation += 1
+            for row in upserted_rows:
+                self._entries.pop(row['id'], None)
+            for row_id in deleted_ids:
+                self._entries.pop(row_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# 是否启用行 JSON 缓存（关闭后使用 jsonify 逐行编码）
+ROW_JSON_CACHE_ENABLED = os.getenv('ROW_JSON_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+
+# 是否按 Accept-Encoding 压缩分页响应
+RESPONSE_COMPRESSION_ENABLED = os.getenv('RESPONSE_COMPRESSION_ENABLED', '1') not in ('0', 'false', 'False')
+
+# 全局行 JSON 缓存实例
+row_json_cache = RowJsonCache(
+    max_entries=int(os.getenv('ROW_JSON_CACHE_MAX_ENTRIES', 10000)),
+    ttl=float(os.getenv('ROW_JSON_CACHE_TTL', 300)),
+)
@@ -0,0 +1,150 @@
+"""
+全文搜索索引模块
+在进程内为 plant / country / regionLabel / status 建立三元组（trigram）倒排索引，
+替代 LIKE '%关键词%' 的全表扫描，并按匹配位置和字段权重计算相关度
+"""
+
+import os
+import unicodedata
+
+from data_events import SyncedSnapshot
+
+# 可搜索字段及其相关度权重
+SEARCH_FIELDS = {
+    'plant': 3.0,
+    'country': 2.0,
+    'regionLabel': 1.0,
+    'status': 1.0,
+}
+
+# 未指定 searchFields 时搜索的字段（与原 LIKE 查询一致）
+DEFAULT_SEARCH_FIELDS = ['plant', 'country']
+
+GRAM_SIZE = 3
+
+
+def normalize_text(text):
+    """规范化文本：去掉重音符号并转小写，接近 MySQL utf8mb4_0900_ai_ci 的比较规则"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def _grams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class SearchIndex(SyncedSnapshot):
+    """线程安全的进程内 trigram 倒排索引"""
+
+    def __init__(self, fields=None):
+        super().__init__()
+        self.fields = dict(fields or SEARCH_FIELDS)
+        self._docs = {}      # id -> {field: 规范化文本}
+        self._postings = {}  # gram -> set(id)
+
+    def _rebuild(self, rows):
+        self._docs.clear()
+        self._postings.clear()
+        for row in rows:
+            self._add(row)
+
+    def _add(self, row):
+        row_id = row['id']
+        doc = {field: normalize_text(row.get(field)) for field in self.fields}
+        self._docs[row_id] = doc
+        for gram in _grams(' '.join(doc.values())):
+            self._postings.setdefault(gram, set()).add(row_id)
+
+    def _remove(self, row_id):
+        doc = self._docs.pop(row_id, None)
+        if doc is None:
+            return
+        for gram in _grams(' '.join(doc.values())):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(row_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def _apply(self, upserted_rows, deleted_ids):
+        for row_id in deleted_ids:
+            self._remove(row_id)
+        for row in upserted_rows:
+            self._remove(row['id'])
+            self._add(row)
+
+    def search(self, term, fields=None):
+        """
+        搜索包含关键词的记录
+
+        Args:
+            term (str): 关键词，按子串匹配（与 LIKE '%term%' 语义一致）
+            fields (list): 搜索的字段，默认 DEFAULT_SEARCH_FIELDS
+
+        Returns:
+            dict: {id: 相关度分数}
+        """
+        query = normalize_text(term.strip())
+        fields = [f for f in (fields or DEFAULT_SEARCH_FIELDS) if f in self.fields]
+        if not query or not fields:
+            return {}
+
+        with self._lock:
+            if len(query) >= GRAM_SIZE:
+                candidates = None
+                # 从最短的倒排表开始求交集
+                for gram in sorted(_grams(query), key=lambda g: len(self._postings.get(g, ()))):
+                    posting = self._postings.get(gram)
+                    if not posting:
+                        return {}
+                    candidates = set(posting) if candidates is None else candidates & posting
+                    if not candidates:
+                        return {}
+            else:
+                candidates = self._docs.keys()
+
+            scores = {}
+            for row_id in candidates:
+                doc = self._docs[row_id]
+                score = 0.0
+                for field in fields:
+                    text = doc[field]
+                    if query not in text:
+                        continue
+                    weight = self.fields[field]
+                    if text == query:
+                        score += 10 * weight
+                    elif text.startswith(query):
+                        score += 5 * weight
+                    elif (' ' + query) in text:
+                        score += 3 * weight
+                    else:
+                        score += weight
+                if score:
+                    scores[row_id] = score
+            return scores
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready,
+                'documents': len(self._docs),
+                'grams': len(self._postings),
+            }
+
+
+def parse_search_fields(value):
+    """解析 searchFields 参数，忽略不支持的字段"""
+    if not value:
+        return list(DEFAULT_SEARCH_FIELDS)
+    fields = [f.strip() for f in value.split(',') if f.strip() in SEARCH_FIELDS]
+    return fields or list(DEFAULT_SEARCH_FIELDS)
+
+
+# 是否启用搜索索引（关闭后使用 LIKE 查询）
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', '1') not in ('0', 'false', 'False')
+
+# 全局搜索索引实例
+search_index = SearchIndex()
@@ -0,0 +1,139 @@
+"""
+生产环境启动脚本
+使用 Gunicorn 的 prefork 多进程 + gthread 多线程模型运行 main.py 中的 Flask 应用，
+替代开发用的 app.run(debug=True)
+
+用法:
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:8899
+
+平滑重载（逐个替换 worker，正在处理的请求会先完成）:
+    kill -HUP <master pid>
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='以多进程 + 多线程方式启动后端服务')
+    parser.add_argument('--bind', default=os.getenv('SERVE_BIND', '127.0.0.1:8899'),
+                        help='监听地址 (默认: 127.0.0.1:8899)')
+    parser.add_argument('--workers', type=int,
+                        default=int(os.getenv('SERVE_WORKERS', multiprocessing.cpu_count() * 2 + 1)),
+                        help='worker 进程数 (默认: CPU 核数 * 2 + 1)')
+    parser.add_argument('--threads', type=int, default=int(os.getenv('SERVE_THREADS', 8)),
+                        help='每个 worker 的处理线程数 (默认: 8)')
+    parser.add_argument('--qa-threads', type=int, default=None,
+                        help='每个 worker 中可同时处理问答请求的线程数 (默认: 线程数的四分之一，至少 1)')
+    parser.add_argument('--stream-threads', type=int, default=None,
+                        help='每个 worker 中可同时保持的变更推送 (SSE) 连接数，0 表示只支持轮询 (默认: 线程数的四分之一)')
+    parser.add_argument('--timeout', type=int, default=int(os.getenv('SERVE_TIMEOUT', 120)),
+                        help='worker 无响应多少秒后被重启 (默认: 120，需大于 Ollama 的 60 秒超时)')
+    parser.add_argument('--graceful-timeout', type=int,
+                        default=int(os.getenv('SERVE_GRACEFUL_TIMEOUT', 90)),
+                        help='重载/停止时等待请求完成的秒数 (默认: 90)')
+    parser.add_argument('--preload', action='store_true',
+                        help='在 master 进程中加载应用（节省内存，但 HUP 重载不会加载新代码）')
+    return parser.parse_args()
+
+
+def post_fork(server, worker):
+    """fork 之后、加载应用之前：丢弃从 master 继承的数据库连接"""
+    import db_pool
+    db_pool.reset_pools_after_fork()
+
+
+def post_worker_init(worker):
+    """worker 加载应用之后：启动变更同步、副本检查并预加载内存索引"""
+    import main
+    if worker.cfg.workers > 1 and main.CHANGE_LOG_ENABLED:
+        # 先确定同步起点再加载全表，加载期间的变更会在之后重放
+        main.change_follower.start()
+    # 配置了只读副本时开始检查复制进度（未启用时不做任何事）
+    main.replica_router.start()
+    main.warm_up()
+    print(f"[worker {worker.pid}] 已就绪")
+
+
+def when_ready(server):
+    """master 启动完成：preload 模式下关闭 master 中加载应用时建立的连接"""
+    import db_pool
+    db_pool.close_all_pools()
+
+
+class FlaskApplication(BaseApplication):
+    """以代码方式配置的 Gunicorn 应用"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+        return app
+
+
+def clear_metrics_snapshots(directory):
+    """删除目录中 metrics.py 写入的快照（<pid>.json 及其临时文件），目录中的其他文件不受影响"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if re.fullmatch(r'\d+\.json(\.tmp)?', name):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError as e:
+                print(f"删除旧的指标快照失败: {e}")
+
+
+def main():
+    args = parse_args()
+
+    # 为问答接口保留的线程数，其余线程始终可以处理 /data 等接口
+    qa_threads = args.qa_threads or max(1, args.threads // 4)
+    if qa_threads >= args.threads:
+        raise SystemExit('--qa-threads 必须小于 --threads，否则问答请求可能占满所有线程')
+    os.environ.setdefault('QA_MAX_CONCURRENCY', str(qa_threads))
+
+    # SSE 连接在整个推送期间占用处理线程，同样单独限制
+    stream_threads = args.stream_threads if args.stream_threads is not None else args.threads // 4
+    if stream_threads < 0 or qa_threads + stream_threads >= args.threads:
+        raise SystemExit('--qa-threads 与 --stream-threads 之和必须小于 --threads，否则长连接可能占满所有线程')
+    os.environ.setdefault('CHANGE_STREAM_MAX_CONNECTIONS', str(stream_threads))
+
+    # 多个 worker 时通过快照目录合并各 worker 的指标，/metrics 返回全部 worker 的汇总
+    if args.workers > 1:
+        metrics_dir = os.environ.get('METRICS_DIR')
+        if metrics_dir:
+            # 清除上次运行留下的快照，避免把旧进程的计数合并进来
+            clear_metrics_snapshots(metrics_dir)
+        else:
+            os.environ['METRICS_DIR'] = tempfile.mkdtemp(prefix='quanzhan-metrics-')
+
+    print(f"启动服务器: http://{args.bind}  workers={args.workers} threads={args.threads} "
+          f"qa-threads={os.environ['QA_MAX_CONCURRENCY']} "
+          f"stream-threads={os.environ['CHANGE_STREAM_MAX_CONNECTIONS']}")
+    FlaskApplication({
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'preload_app': args.preload,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'when_ready': when_ready,
+        'accesslog': '-',
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
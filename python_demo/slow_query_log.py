@@ -0,0 +1,245 @@
+"""
+慢查询日志模块
+作为连接池的查询观察者（见 db_pool.add_query_observer），记录 main.py 和 qa_handler.py 中
+所有耗时超过阈值的语句：规范化后的 SQL 指纹、参数形状、扫描/返回行数，
+每个指纹首次变慢时在同一连接上捕获一次 EXPLAIN
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+import pymysql.cursors
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?(?:e[-+]?\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_VALUES_ROWS = re.compile(r'(values\s*\(\?\+\))(?:\s*,\s*\(\?\+\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+# 可以 EXPLAIN 的语句
+_EXPLAINABLE = ('select', 'update', 'delete', 'insert', 'replace', 'with')
+
+
+def fingerprint(sql):
+    """
+    规范化 SQL：字面量和占位符替换为 ?，IN 列表和多行 VALUES 合并为 (?+)，
+    统一小写和空白；只有值不同的语句得到相同的指纹
+    """
+    text = _STRING.sub('?', sql)
+    text = _PLACEHOLDER.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _WHITESPACE.sub(' ', text).strip().lower()
+    text = _LIST.sub('(?+)', text)
+    return _VALUES_ROWS.sub(r'\1', text)
+
+
+def params_shape(args, many=False):
+    """参数的形状：只描述个数和类型，不记录具体的值"""
+    if args is None:
+        return ''
+    if many:
+        rows = list(args)
+        return f"{len(rows)} 行 × {params_shape(rows[0]) if rows else '[]'}"
+    if isinstance(args, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in sorted(args.items())) + '}'
+    if not isinstance(args, (list, tuple)):
+        args = [args]
+    groups = []
+    for value in args:
+        name = 'null' if value is None else type(value).__name__
+        if groups and groups[-1][0] == name:
+            groups[-1][1] += 1
+        else:
+            groups.append([name, 1])
+    return '[' + ', '.join(name if count == 1 else f'{name}×{count}' for name, count in groups) + ']'
+
+
+class _Fingerprint:
+    """同一指纹的慢查询汇总"""
+
+    def __init__(self, text, sample):
+        self.id = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+        self.text = text
+        self.sample = sample  # 首次出现时的 SQL 模板（不含参数值）
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen = None
+        self.params_shapes = OrderedDict()
+        self.rows_examined_max = None
+        self.rows_returned_max = None
+        self.explain = None
+        self.explain_error = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'fingerprint': self.text,
+            'sample': self.sample,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'last_seen': self.last_seen,
+            'params_shapes': list(self.params_shapes),
+            'rows_examined_max': self.rows_examined_max,
+            'rows_returned_max': self.rows_returned_max,
+            'explain': self.explain,
+            'explain_error': self.explain_error,
+        }
+
+
+class SlowQueryLog:
+    """线程安全的慢查询记录"""
+
+    def __init__(self, threshold_ms=100, max_entries=200, max_fingerprints=500, capture_explain=True):
+        """
+        Args:
+            threshold_ms (float): 慢查询阈值（毫秒）
+            max_entries (int): 保留的最近慢查询条数
+            max_fingerprints (int): 最多汇总的指纹数，超出时淘汰最久未出现的
+            capture_explain (bool): 是否为每个指纹捕获一次 EXPLAIN
+        """
+        self.threshold_ms = threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self.capture_explain = capture_explain
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=max_entries)
+        self._fingerprints = OrderedDict()
+        self._rows_examined_available = True
+        self.slow_count = 0
+
+    def observe(self, query, args, elapsed, cursor):
+        """查询观察者：只处理超过阈值的语句"""
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+        many = isinstance(args, (list, tuple)) and bool(args) and isinstance(args[0], (list, tuple, dict))
+        text = fingerprint(query)
+        shape = params_shape(args, many)
+        # 非缓冲游标的结果尚未读完，不能在同一连接上执行其他语句
+        buffered = not isinstance(cursor, pymysql.cursors.SSCursor)
+        rows_returned = cursor.rowcount if buffered and cursor.rowcount is not None and cursor.rowcount >= 0 else None
+        rows_examined = self._rows_examined(cursor) if buffered else None
+
+        with self._lock:
+            entry = self._fingerprints.get(text)
+            if entry is None:
+                entry = self._fingerprints[text] = _Fingerprint(text, _WHITESPACE.sub(' ', query).strip())
+                while len(self._fingerprints) > self.max_fingerprints:
+                    self._fingerprints.popitem(last=False)
+            else:
+                self._fingerprints.move_to_end(text)
+            entry.count += 1
+            entry.total_ms += elapsed_ms
+            entry.max_ms = max(entry.max_ms, elapsed_ms)
+            entry.last_seen = time.strftime('%Y-%m-%dT%H:%M:%S')
+            entry.params_shapes[shape] = True
+            if len(entry.params_shapes) > 10:
+                entry.params_shapes.popitem(last=False)
+            if rows_examined is not None:
+                entry.rows_examined_max = max(entry.rows_examined_max or 0, rows_examined)
+            if rows_returned is not None:
+                entry.rows_returned_max = max(entry.rows_returned_max or 0, rows_returned)
+            need_explain = self.capture_explain and buffered and entry.explain is None \
+                and entry.explain_error is None and not many
+            if need_explain:
+                entry.explain_error = ''  # 占位，避免并发请求重复捕获
+            self.slow_count += 1
+            self._recent.append({
+                'fingerprint_id': entry.id,
+                'elapsed_ms': round(elapsed_ms, 3),
+                'params_shape': shape,
+                'rows_examined': rows_examined,
+                'rows_returned': rows_returned,
+                'at': entry.last_seen,
+            })
+
+        print(f"慢查询 {elapsed_ms:.1f} ms [{entry.id}] {text[:200]}")
+        if need_explain:
+            self._capture_explain(entry, cursor, query, args)
+
+    def _rows_examined(self, cursor):
+        """从 performance_schema 读取本连接上一条语句的扫描行数（不可用时不再尝试）"""
+        if not self._rows_examined_available or getattr(cursor.connection, 'dialect', 'mysql') != 'mysql':
+            return None
+        try:
+            with cursor.connection.cursor(pymysql.cursors.Cursor) as ps_cursor:
+                ps_cursor.execute("""
+                    SELECT ROWS_EXAMINED FROM performance_schema.events_statements_history
+                    WHERE THREAD_ID = PS_CURRENT_THREAD_ID() AND SQL_TEXT NOT LIKE '%%performance_schema%%'
+                    ORDER BY EVENT_ID DESC LIMIT 1
+                """)
+                row = ps_cursor.fetchone()
+            return int(row[0]) if row else None
+        except Exception as e:
+            self._rows_examined_available = False
+            print(f"无法读取扫描行数（需要启用 performance_schema）: {e}")
+            return None
+
+    def _capture_explain(self, entry, cursor, query, args):
+        if not query.lstrip().lower().startswith(_EXPLAINABLE):
+            result, error = None, '该语句不支持 EXPLAIN'
+        else:
+            try:
+                # SQLite 的 EXPLAIN 输出字节码，查询计划需用 EXPLAIN QUERY PLAN
+                explain = 'EXPLAIN QUERY PLAN ' if getattr(cursor.connection, 'dialect', 'mysql') == 'sqlite' \
+                    else 'EXPLAIN '
+                with cursor.connection.cursor(pymysql.cursors.DictCursor) as explain_cursor:
+                    explain_cursor.execute(explain + query, args)
+                    result, error = [dict(row) for row in explain_cursor.fetchall()], None
+            except Exception as e:
+                result, error = None, str(e)
+        with self._lock:
+            entry.explain = result
+            entry.explain_error = error
+
+    def snapshot(self, limit=50, sort='total'):
+        """
+        Args:
+            limit (int): 最多返回的指纹数
+            sort (str): 指纹排序方式 total（总耗时）/ max（最大耗时）/ count（次数）/ recent（最近出现）
+        """
+        keys = {
+            'total': lambda e: -e.total_ms,
+            'max': lambda e: -e.max_ms,
+            'count': lambda e: -e.count,
+        }
+        with self._lock:
+            entries = list(self._fingerprints.values())
+            if sort == 'recent':
+                entries.reverse()
+            else:
+                entries.sort(key=keys.get(sort, keys['total']))
+            return {
+                'threshold_ms': self.threshold_ms,
+                'slow_count': self.slow_count,
+                'fingerprint_count': len(self._fingerprints),
+                'fingerprints': [e.to_dict() for e in entries[:limit]],
+                'recent': list(self._recent)[::-1][:limit],
+            }
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._fingerprints.clear()
+            self.slow_count = 0
+
+
+# 是否记录慢查询
+SLOW_QUERY_LOG_ENABLED = os.getenv('SLOW_QUERY_LOG_ENABLED', '1') not in ('0', 'false', 'False')
+
+# 管理接口的访问令牌，请求需带 X-Admin-Token 头；未设置时管理接口一律返回 403
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+# 全局慢查询日志
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100)),
+    max_entries=int(os.getenv('SLOW_QUERY_LOG_SIZE', 200)),
+    capture_explain=os.getenv('SLOW_QUERY_EXPLAIN', '1') not in ('0', 'false', 'False'),
+)
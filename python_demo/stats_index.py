@@ -0,0 +1,191 @@
+"""
+统计聚合模块
+为 GET /data/stats 维护物化的分组聚合表：每种 groupBy 组合首次查询时
+从内存中的行数据生成一张表，之后随数据变更通知按差量（加上新值、减去旧值）更新，
+不再对全表重新计算
+"""
+
+import re
+
+from data_events import SyncedSnapshot
+from row_codec import DOUBLE_COLUMNS, INT_COLUMNS, STRING_COLUMNS
+
+# 可分组的字段
+GROUP_FIELDS = list(STRING_COLUMNS)
+
+# 可聚合的数值字段
+METRIC_FIELDS = [c for c in DOUBLE_COLUMNS + INT_COLUMNS if c != 'id']
+
+# 支持的聚合函数（都可以按差量维护）
+METRIC_FUNCTIONS = ('sum', 'avg')
+
+DEFAULT_METRICS = ['count']
+
+_METRIC_PATTERN = re.compile(r'^(\w+)\((\w+|\*)\)$')
+
+
+def parse_group_by(value):
+    """解析 groupBy 参数，返回字段列表（可为空，表示不分组）"""
+    fields = [f.strip() for f in (value or '').split(',') if f.strip()]
+    for field in fields:
+        if field not in GROUP_FIELDS:
+            raise ValueError(f'不支持按 {field} 分组，可选字段: {", ".join(GROUP_FIELDS)}')
+    if len(set(fields)) != len(fields):
+        raise ValueError('groupBy 中有重复字段')
+    return fields
+
+
+def parse_metrics(value):
+    """
+    解析 metrics 参数，如 "sum(capacity),avg(annualCarbon),count"
+
+    Returns:
+        list: (名称, 函数, 字段) 元组，count 的字段为 None
+    """
+    names = [m.strip() for m in (value or '').split(',') if m.strip()] or DEFAULT_METRICS
+    metrics = []
+    for name in names:
+        if name in ('count', 'count(*)'):
+            metrics.append((name, 'count', None))
+            continue
+        match = _METRIC_PATTERN.match(name)
+        if not match:
+            raise ValueError(f'无法解析统计指标: {name}')
+        func, field = match.groups()
+        if func not in METRIC_FUNCTIONS:
+            raise ValueError(f'不支持的聚合函数 {func}，可选: count, {", ".join(METRIC_FUNCTIONS)}')
+        if field not in METRIC_FIELDS:
+            raise ValueError(f'不支持聚合字段 {field}，可选字段: {", ".join(METRIC_FIELDS)}')
+        metrics.append((name, func, field))
+    return metrics
+
+
+class _Accumulator:
+    """单个分组的聚合值：行数，以及每个数值字段的合计和非空数量"""
+
+    __slots__ = ('count', 'sums', 'counts')
+
+    def __init__(self):
+        self.count = 0
+        self.sums = [0] * len(METRIC_FIELDS)
+        self.counts = [0] * len(METRIC_FIELDS)
+
+    def add(self, values, sign):
+        self.count += sign
+        for i, value in enumerate(values):
+            if value is not None:
+                self.sums[i] += sign * value
+                self.counts[i] += sign
+
+    def metric(self, func, field):
+        if func == 'count':
+            return self.count
+        i = METRIC_FIELDS.index(field)
+        # 与 SQL 一致：全部为 NULL 时 SUM / AVG 返回 NULL
+        if not self.counts[i]:
+            return None
+        total = self.sums[i]
+        if func == 'avg':
+            return round(total / self.counts[i], 4)
+        return round(total, 4) if isinstance(total, float) else total
+
+
+class StatsIndex(SyncedSnapshot):
+    """线程安全的物化分组聚合表"""
+
+    def __init__(self):
+        super().__init__()
+        self._rows = {}    # id -> (分组字段值 dict, 数值字段值 tuple)
+        self._tables = {}  # 按字段名排序的 groupBy 元组 -> {分组键: _Accumulator}
+
+    def _rebuild(self, rows):
+        self._rows.clear()
+        for row in rows:
+            self._rows[row['id']] = self._extract(row)
+        for group_by in list(self._tables):
+            self._tables[group_by] = self._build_table(group_by)
+
+    @staticmethod
+    def _extract(row):
+        dims = {field: row.get(field) for field in GROUP_FIELDS}
+        values = tuple(row.get(field) for field in METRIC_FIELDS)
+        return dims, values
+
+    def _build_table(self, group_by):
+        table = {}
+        for dims, values in self._rows.values():
+            key = tuple(dims[field] for field in group_by)
+            accumulator = table.get(key)
+            if accumulator is None:
+                accumulator = table[key] = _Accumulator()
+            accumulator.add(values, 1)
+        return table
+
+    def _delta(self, entry, sign):
+        dims, values = entry
+        for group_by, table in self._tables.items():
+            key = tuple(dims[field] for field in group_by)
+            accumulator = table.get(key)
+            if accumulator is None:
+                accumulator = table[key] = _Accumulator()
+            accumulator.add(values, sign)
+            if accumulator.count == 0:
+                del table[key]
+
+    def _apply(self, upserted_rows, deleted_ids):
+        for row_id in deleted_ids:
+            old = self._rows.pop(row_id, None)
+            if old is not None:
+                self._delta(old, -1)
+        for row in upserted_rows:
+            old = self._rows.get(row['id'])
+            if old is not None:
+                self._delta(old, -1)
+            entry = self._extract(row)
+            self._rows[row['id']] = entry
+            self._delta(entry, 1)
+
+    def query(self, group_by, metrics):
+        """
+        查询分组统计
+
+        Args:
+            group_by (list): 分组字段（parse_group_by 的结果）
+            metrics (list): 统计指标（parse_metrics 的结果）
+
+        Returns:
+            list: 每个分组一个 dict，包含分组字段和各指标，按第一个指标降序排列
+        """
+        table_key = tuple(sorted(group_by))
+        with self._lock:
+            table = self._tables.get(table_key)
+            if table is None:
+                table = self._tables[table_key] = self._build_table(table_key)
+            positions = [table_key.index(field) for field in group_by]
+            results = []
+            for key, accumulator in table.items():
+                item = {field: key[pos] for field, pos in zip(group_by, positions)}
+                for name, func, field in metrics:
+                    item[name] = accumulator.metric(func, field)
+                results.append(item)
+
+        first = metrics[0][0]
+        # NULL 排在最后，相同时按分组字段排序
+        results.sort(key=lambda item: (
+            item[first] is None,
+            -(item[first] or 0),
+            [(item[f] is None, item[f] or '') for f in group_by],
+        ))
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready,
+                'rows': len(self._rows),
+                'tables': {','.join(k) or '*': len(v) for k, v in self._tables.items()},
+            }
+
+
+# 全局统计聚合实例
+stats_index = StatsIndex()
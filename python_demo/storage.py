@@ -0,0 +1,611 @@
+"""
+存储后端模块
+main.py 和 qa_handler.py 通过存储后端获取数据库连接，由 STORAGE_BACKEND 选择：
+- mysql：共享连接池连接 MySQL（默认）
+- sqlite：进程内嵌入式 SQLite（WAL 模式），单机部署无需 MySQL，读请求没有网络往返
+
+两种后端的连接都提供 pymysql 的接口（cursor/commit/rollback/close、%s 占位符、
+DictCursor/TypedDictCursor/TypedSSDictCursor 游标），powerstation 的增删改查、分页、搜索
+和 qa_conversations 的读写使用同一套 SQL；方言不同的部分（id 分配、行数估算、索引信息、
+强制索引、变更日志建表）由后端的方法提供。DB_REPLICAS 配置的只读副本使用同一种后端（见 replica_router.py）
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+from urllib.request import pathname2url
+
+import pymysql.cursors
+
+from db_pool import get_pool, observe_cursor
+from id_allocator import reserve_ids
+from init_database import SQL_FILE_PATH, iter_dump
+from row_codec import TypedRowMixin, build_row_mapper
+from search_index import normalize_text
+
+# 存储后端：mysql / sqlite
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mysql').lower()
+
+# SQLite 数据库文件路径
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quanzhan_demo.db'))
+
+# 只读副本，逗号分隔：mysql 后端为 host 或 host:port（其他连接参数与主库相同），
+# sqlite 后端为数据库文件路径；为空时不做读写分离（见 replica_router.py）
+DB_REPLICAS = [item.strip() for item in os.getenv('DB_REPLICAS', '').split(',') if item.strip()]
+
+# SQLite 连接池保留的最大空闲连接数
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 16))
+
+# 写锁被占用时的最长等待毫秒数
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# 每个连接缓存的预编译语句数
+SQLITE_STATEMENT_CACHE = 256
+
+# SQLite 数据库文件的格式版本（PRAGMA user_version），低于该值时在建表阶段升级
+SQLITE_SCHEMA_VERSION = 2
+
+# SQLite 上为常用的排序/过滤字段建立的索引
+SQLITE_INDEXES = {
+    'powerstation': ['country', 'status', 'type', 'coalType', 'capacity', 'annualCarbon', 'plant'],
+}
+
+_INT_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint')
+_FLOAT_TYPES = ('float', 'double', 'real', 'decimal', 'numeric')
+
+# pymysql 风格的占位符：%(name)s / %s / %%
+_PLACEHOLDER = re.compile(r'%\((\w+)\)s|%s|%%')
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+
+
+@lru_cache(maxsize=65536)
+def _collation_key(text):
+    return normalize_text(text)
+
+
+def _compare_text(a, b):
+    """
+    替换 SQLite 内置的 NOCASE 排序规则：内置规则只忽略 ASCII 字母的大小写，
+    这里与 MySQL 的 utf8mb4_0900_ai_ci 和列式快照一样同时忽略大小写和重音，
+    字符串的比较、排序和范围过滤在两种后端、两种查询引擎上结果一致
+    """
+    if a.isascii() and b.isascii():
+        # ASCII 文本规范化后就是小写形式，省去 Unicode 分解
+        a, b = a.lower(), b.lower()
+    else:
+        a, b = _collation_key(a), _collation_key(b)
+    return (a > b) - (a < b)
+
+
+class MySQLStorage:
+    """MySQL 后端：连接来自共享连接池"""
+
+    name = 'mysql'
+
+    def __init__(self, db_config):
+        self.pool = get_pool(db_config)
+
+    def connection(self):
+        return self.pool.get_connection()
+
+    def reserve_ids(self, connection, table, count):
+        """原子地预留 count 个连续 id（见 id_allocator）"""
+        return reserve_ids(connection, table, count)
+
+    def table_rows(self, cursor, table):
+        """表的估算行数（来自 InnoDB 统计信息）"""
+        cursor.execute("""
+            SELECT TABLE_ROWS as table_rows FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        result = cursor.fetchone()
+        return int(result['table_rows'] or 0) if result else 0
+
+    def index_statistics(self, cursor, table):
+        """
+        Returns:
+            dict: {首列字段: (索引名, 基数)}，同一字段有多个索引时取基数最大的
+        """
+        cursor.execute("""
+            SELECT INDEX_NAME as index_name, COLUMN_NAME as column_name, CARDINALITY as cardinality
+            FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND SEQ_IN_INDEX = 1
+        """, (table,))
+        indexes = {}
+        for row in cursor.fetchall():
+            cardinality = int(row['cardinality'] or 0)
+            current = indexes.get(row['column_name'])
+            if current is None or cardinality > current[1]:
+                indexes[row['column_name']] = (row['index_name'], cardinality)
+        return indexes
+
+    def force_index(self, table, index):
+        """FROM 子句中强制使用指定索引"""
+        return f"{table} FORCE INDEX (`{index}`)"
+
+    def locking_read(self, sql):
+        """加锁读：读到的行在事务结束前不会被其他事务修改或删除"""
+        return f"{sql} FOR UPDATE"
+
+    def aborts_transaction(self, error):
+        """死锁（1213）会回滚整个事务，锁等待超时（1205）在 innodb_rollback_on_timeout 下也是，不能只跳过出错的语句"""
+        return isinstance(error, pymysql.err.OperationalError) and bool(error.args) and error.args[0] in (1205, 1213)
+
+    def stats(self):
+        return dict(self.pool.stats(), backend=self.name)
+
+
+class SQLiteCursor:
+    """
+    模拟 pymysql 游标的 SQLite 游标
+
+    普通游标在 execute 时读取全部结果（与 pymysql 的缓冲游标一致，rowcount 为结果行数），
+    SS 游标逐行读取；DictCursor 返回 dict，TypedDictCursor 额外按列做类型转换，其他游标返回元组
+    """
+
+    def __init__(self, connection, raw_cursor, cursor_class=None):
+        self.connection = connection
+        self._cursor = raw_cursor
+        self._dict_rows = cursor_class is None or issubclass(cursor_class, pymysql.cursors.DictCursorMixin)
+        self._typed = cursor_class is not None and issubclass(cursor_class, TypedRowMixin)
+        self._unbuffered = cursor_class is not None and issubclass(cursor_class, pymysql.cursors.SSCursor)
+        self._rows = None
+        self._position = 0
+        self._mapper = None
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @staticmethod
+    def _translate(query, args):
+        """把 pymysql 的占位符转换为 SQLite 的占位符（与 pymysql 一致，没有参数时不转换）"""
+        if args is None:
+            return query, ()
+        named = isinstance(args, dict)
+
+        def replace(match):
+            if match.group(0) == '%%':
+                return '%'
+            return f':{match.group(1)}' if named else '?'
+
+        return _PLACEHOLDER.sub(replace, query), args if named else tuple(args)
+
+    def _prepare_result(self):
+        self.description = self._cursor.description
+        self._rows, self._position, self._mapper = None, 0, None
+        if self.description is None:
+            self.rowcount = self._cursor.rowcount
+            return
+        fields = [d[0] for d in self.description]
+        if self._typed:
+            self._mapper = build_row_mapper(fields)
+        elif self._dict_rows:
+            self._mapper = lambda row: dict(zip(fields, row))
+        if self._unbuffered:
+            self.rowcount = -1
+        else:
+            self._rows = self._cursor.fetchall()
+            self.rowcount = len(self._rows)
+
+    def execute(self, query, args=None):
+        sql, params = self._translate(query, args)
+        self._cursor.execute(sql, params)
+        self.lastrowid = self._cursor.lastrowid
+        self._prepare_result()
+        return self.rowcount
+
+    def executemany(self, query, args):
+        rows = list(args)
+        if not rows:
+            return 0
+        sql, _ = self._translate(query, rows[0])
+        self._cursor.executemany(sql, [row if isinstance(row, dict) else tuple(row) for row in rows])
+        self.lastrowid = self._cursor.lastrowid
+        self._prepare_result()
+        return self.rowcount
+
+    def _map(self, row):
+        return self._mapper(row) if self._mapper else row
+
+    def fetchone(self):
+        if self._rows is None:
+            row = self._cursor.fetchone() if self.description is not None else None
+            return None if row is None else self._map(row)
+        if self._position >= len(self._rows):
+            return None
+        row = self._rows[self._position]
+        self._position += 1
+        return self._map(row)
+
+    def fetchmany(self, size=None):
+        size = size or self._cursor.arraysize
+        rows = []
+        for _ in range(size):
+            row = self.fetchone()
+            if row is None:
+                break
+            rows.append(row)
+        return rows
+
+    def fetchall(self):
+        if self._rows is None:
+            rows = self._cursor.fetchall() if self.description is not None else []
+        else:
+            rows, self._position = self._rows[self._position:], len(self._rows)
+        return [self._map(row) for row in rows]
+
+    def fetchall_unbuffered(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._rows = None
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """SQLite 连接代理，提供 pymysql 连接的接口；close() 归还连接池"""
+
+    dialect = 'sqlite'
+
+    def __init__(self, raw, release=None, observed=True):
+        self._raw = raw
+        self._release = release
+        self._observed = observed
+        self._unobserved = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, cursor=None):
+        # 游标的 connection 属性不再通知查询观察者（与 pymysql 原始连接一致）
+        if self._observed and self._unobserved is None:
+            self._unobserved = SQLiteConnection(self._raw, observed=False)
+        owner = self._unobserved if self._observed else self
+        raw_cursor = SQLiteCursor(owner, self._raw.cursor(), cursor)
+        return observe_cursor(raw_cursor) if self._observed else raw_cursor
+
+    def begin(self):
+        # 显式事务用于写入：立即获取写锁（按 busy_timeout 等待），
+        # 避免先读后写时因其他连接已提交而无法升级为写事务
+        if not self._raw.in_transaction:
+            self._raw.execute('BEGIN IMMEDIATE')
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def ping(self, reconnect=True):
+        return True
+
+    def close(self):
+        """归还连接到连接池（可重复调用）"""
+        release, self._release = self._release, None
+        if release:
+            release(self._raw)
+
+
+class SQLiteStorage:
+    """嵌入式 SQLite 后端：WAL 模式下读写互不阻塞，连接在进程内复用"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, pool_size=SQLITE_POOL_SIZE, busy_timeout_ms=SQLITE_BUSY_TIMEOUT_MS, read_only=False):
+        """
+        Args:
+            path (str): 数据库文件路径，不存在时创建并从 powerstation.sql 导入数据
+            pool_size (int): 保留的最大空闲连接数
+            busy_timeout_ms (int): 写锁被占用时的最长等待毫秒数
+            read_only (bool): 只读副本：文件必须已存在，不建表也不导入，连接拒绝写入
+        """
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._in_use = 0
+        self._created = 0
+        self._pid = os.getpid()
+        self._schema_ready = read_only
+
+    def _connect(self):
+        if self.read_only:
+            # mode=rw：文件不存在时报错，而不是创建一个空数据库
+            target, uri = f'file:{pathname2url(os.path.abspath(self.path))}?mode=rw', True
+        else:
+            target, uri = self.path, False
+        raw = sqlite3.connect(target, timeout=self.busy_timeout_ms / 1000, check_same_thread=False,
+                              detect_types=sqlite3.PARSE_DECLTYPES,
+                              cached_statements=SQLITE_STATEMENT_CACHE, uri=uri)
+        raw.create_collation('NOCASE', _compare_text)
+        if self.read_only:
+            raw.execute('PRAGMA query_only = ON')
+        else:
+            raw.execute('PRAGMA journal_mode = WAL')
+        raw.execute('PRAGMA synchronous = NORMAL')
+        raw.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        raw.execute('PRAGMA temp_store = MEMORY')
+        raw.execute('PRAGMA cache_size = -32000')
+        raw.execute('PRAGMA mmap_size = 268435456')
+        self._created += 1
+        return raw
+
+    def _check_fork(self):
+        """fork 之后不使用从父进程继承的连接"""
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = deque()
+            self._in_use = 0
+
+    def connection(self):
+        with self._lock:
+            self._check_fork()
+            raw = self._idle.pop() if self._idle else None
+            if raw is None:
+                raw = self._connect()
+            if not self._schema_ready:
+                try:
+                    self._ensure_schema(raw)
+                except Exception:
+                    raw.close()
+                    raise
+                self._schema_ready = True
+            self._in_use += 1
+        return SQLiteConnection(raw, self._release)
+
+    def _release(self, raw):
+        if raw.in_transaction:
+            raw.rollback()
+        with self._lock:
+            self._check_fork()
+            self._in_use = max(0, self._in_use - 1)
+            if len(self._idle) < self.pool_size:
+                self._idle.append(raw)
+                return
+        raw.close()
+
+    def _ensure_schema(self, raw):
+        """建表、建索引，powerstation 表为空时从 SQL 文件导入（多个进程同时启动时只导入一次）"""
+        started = time.perf_counter()
+        raw.execute('BEGIN IMMEDIATE')
+        try:
+            imported, empty = 0, False
+            version = raw.execute('PRAGMA user_version').fetchone()[0]
+            for item in iter_dump(SQL_FILE_PATH):
+                if item[0] == 'table':
+                    if version < 2 and raw.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                                   (item[1].name,)).fetchone():
+                        self._add_type_checks(raw, item[1])
+                    else:
+                        raw.execute(self._create_table_sql(item[1]))
+                    for column in SQLITE_INDEXES.get(item[1].name, []):
+                        raw.execute(f'CREATE INDEX IF NOT EXISTS idx_{item[1].name}_{column} '
+                                    f'ON {item[1].name} ("{column}")')
+                    empty = raw.execute(f'SELECT 1 FROM {item[1].name} LIMIT 1').fetchone() is None
+                elif empty:
+                    _, table, columns, rows = item
+                    quoted = ', '.join(f'"{c}"' for c in columns)
+                    raw.executemany(
+                        f"INSERT INTO {table} ({quoted}) VALUES ({', '.join(['?'] * len(columns))})", rows)
+                    imported += len(rows)
+            raw.execute("""
+                CREATE TABLE IF NOT EXISTS qa_conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT DEFAULT 'default',
+                    user_id TEXT DEFAULT NULL,
+                    role TEXT NOT NULL CHECK (role IN ('user', 'assistant', 'system')),
+                    content TEXT NOT NULL,
+                    model_name TEXT DEFAULT 'deepseek-r1:32b',
+                    tokens_used INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            raw.execute('CREATE INDEX IF NOT EXISTS idx_qa_session_created '
+                        'ON qa_conversations (session_id, created_at)')
+            if version < 1:
+                # 版本 1：NOCASE 改为忽略重音的排序规则，按新规则重建旧文件中的索引
+                raw.execute('REINDEX NOCASE')
+            raw.execute(f'PRAGMA user_version = {SQLITE_SCHEMA_VERSION}')
+            raw.execute("""
+                CREATE TABLE IF NOT EXISTS id_sequences (
+                    name TEXT NOT NULL PRIMARY KEY,
+                    next_id INTEGER NOT NULL
+                )
+            """)
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        if imported:
+            raw.execute('ANALYZE')
+            raw.commit()
+            print(f"✓ SQLite 数据库 {self.path} 已从 SQL 文件导入 {imported} 行，"
+                  f"用时 {time.perf_counter() - started:.2f} 秒")
+
+    @staticmethod
+    def _create_table_sql(table, name=None):
+        """
+        按 SQL 文件中的表结构生成 SQLite 建表语句（字符串列不区分大小写，与 MySQL 的排序规则一致）。
+        SQLite 不强制列类型，数值列加 CHECK 约束，非数值写入直接失败而不是以文本存下
+        """
+        definitions = []
+        for column in table.columns:
+            column_type = table.types[column]
+            if column == table.key and column_type in _INT_TYPES:
+                definitions.append(f'"{column}" INTEGER PRIMARY KEY')
+                continue
+            if column_type in _INT_TYPES:
+                sqlite_type = f"""INTEGER CHECK (typeof("{column}") IN ('integer', 'null'))"""
+            elif column_type in _FLOAT_TYPES:
+                sqlite_type = f"""REAL CHECK (typeof("{column}") IN ('real', 'integer', 'null'))"""
+            else:
+                sqlite_type = 'TEXT COLLATE NOCASE'
+            definitions.append(f'"{column}" {sqlite_type}')
+        if table.types[table.key] not in _INT_TYPES:
+            definitions.append(f'PRIMARY KEY ("{table.key}")')
+        return f"CREATE TABLE IF NOT EXISTS {name or table.name} ({', '.join(definitions)})"
+
+    def _add_type_checks(self, raw, table):
+        """
+        版本 2：旧文件中的表没有数值列的 CHECK 约束，按新结构重建表并复制数据。
+        此前写入数值列的非数值会让读取失败，复制时置为 NULL
+        """
+        numeric = [c for c in table.columns
+                   if c != table.key and table.types[c] in _INT_TYPES + _FLOAT_TYPES]
+        allowed = {c: "('integer', 'null')" if table.types[c] in _INT_TYPES else "('real', 'integer', 'null')"
+                   for c in numeric}
+        invalid = raw.execute(
+            f"SELECT COUNT(*) FROM {table.name} WHERE "
+            + ' OR '.join(f'typeof("{c}") NOT IN {allowed[c]}' for c in numeric)).fetchone()[0] if numeric else 0
+        staging = f'{table.name}_typed'
+        raw.execute(f'DROP TABLE IF EXISTS {staging}')
+        raw.execute(self._create_table_sql(table, staging))
+        selected = ', '.join(f'CASE WHEN typeof("{c}") IN {allowed[c]} THEN "{c}" END' if c in allowed else f'"{c}"'
+                             for c in table.columns)
+        quoted = ', '.join(f'"{c}"' for c in table.columns)
+        raw.execute(f'INSERT INTO {staging} ({quoted}) SELECT {selected} FROM {table.name}')
+        # 旧表的索引随表删除，之后按 SQLITE_INDEXES 在新表上重建
+        raw.execute(f'DROP TABLE {table.name}')
+        raw.execute(f'ALTER TABLE {staging} RENAME TO {table.name}')
+        if invalid:
+            print(f"⚠ SQLite 表 {table.name} 中有 {invalid} 行的数值列存有非数值，升级时已置为 NULL")
+
+    def reserve_ids(self, connection, table, count):
+        """原子地预留 count 个连续 id（序列行的更新在写事务中完成，并发写入串行执行）"""
+        if count < 1:
+            raise ValueError('预留的 id 数量必须大于 0')
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT OR IGNORE INTO id_sequences (name, next_id) VALUES (%s, 1)", (table,))
+            cursor.execute(f"""
+                UPDATE id_sequences
+                SET next_id = MAX(next_id, (SELECT COALESCE(MAX(id), 0) + 1 FROM {table})) + %s
+                WHERE name = %s
+                RETURNING next_id
+            """, (count, table))
+            next_id = int(cursor.fetchone()['next_id'])
+        connection.commit()
+        return next_id - count
+
+    def table_rows(self, cursor, table):
+        """表的估算行数（整数主键的范围，不扫描全表）"""
+        cursor.execute(f"SELECT COALESCE(MAX(rowid) - MIN(rowid) + 1, 0) as table_rows FROM {table}")
+        return int(cursor.fetchone()['table_rows'])
+
+    def index_statistics(self, cursor, table):
+        """
+        Returns:
+            dict: {首列字段: (索引名, 基数)}，基数由 ANALYZE 收集的 sqlite_stat1 折算
+        """
+        cursor.execute(f"PRAGMA index_list({table})")
+        names = [row['name'] for row in cursor.fetchall()]
+        stats = {}
+        try:
+            cursor.execute("SELECT idx, stat FROM sqlite_stat1 WHERE tbl = %s", (table,))
+            stats = {row['idx']: row['stat'] for row in cursor.fetchall()}
+        except sqlite3.OperationalError:
+            pass  # 尚未执行过 ANALYZE
+        indexes = {}
+        for name in names:
+            cursor.execute(f"PRAGMA index_info({name})")
+            columns = [row['name'] for row in cursor.fetchall()]
+            if not columns or columns[0] is None:
+                continue
+            # stat 的格式为 "总行数 每个键值平均行数 ..."
+            parts = (stats.get(name) or '').split()
+            cardinality = int(parts[0]) // max(1, int(parts[1])) if len(parts) > 1 else 0
+            current = indexes.get(columns[0])
+            if current is None or cardinality > current[1]:
+                indexes[columns[0]] = (name, cardinality)
+        return indexes
+
+    def force_index(self, table, index):
+        # SQLite 的 INDEXED BY 在无法使用索引时直接报错，交给查询规划器按统计信息选择
+        return table
+
+    def locking_read(self, sql):
+        # 写事务串行执行：读取之后其他连接提交的写入会使本事务的写操作失败，无需加锁
+        return sql
+
+    def aborts_transaction(self, error):
+        # 等待写锁超时：本事务无法继续写入，整体回滚后重试
+        return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'path': self.path,
+                'read_only': self.read_only,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'created': self._created,
+            }
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(db_config):
+    """
+    获取共享的存储后端
+
+    sqlite 后端整个进程共享同一个数据库文件；mysql 后端与 get_pool 一样按连接配置共享，
+    因此 main.py 和 QAHandler 使用的是同一组连接
+    """
+    if STORAGE_BACKEND == 'sqlite':
+        key = ('sqlite', SQLITE_PATH)
+    elif STORAGE_BACKEND == 'mysql':
+        key = ('mysql', db_config.get('host'), db_config.get('port', 3306),
+               db_config.get('user'), db_config.get('database'))
+    else:
+        raise ValueError(f'不支持的存储后端: {STORAGE_BACKEND}（可选 mysql、sqlite）')
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = SQLiteStorage(SQLITE_PATH) if key[0] == 'sqlite' else MySQLStorage(db_config)
+            _storages[key] = storage
+        return storage
+
+
+def get_replica_storages(db_config):
+    """
+    按 DB_REPLICAS 创建只读副本的存储后端（与主库使用同一种后端）
+
+    Returns:
+        list: [(副本名称, 存储后端)]，名称为 DB_REPLICAS 中的原始配置项
+    """
+    replicas = []
+    for item in DB_REPLICAS:
+        if STORAGE_BACKEND == 'sqlite':
+            replicas.append((item, SQLiteStorage(item, read_only=True)))
+            continue
+        host, _, port = item.rpartition(':')
+        if not port.isdigit():
+            host, port = item, db_config.get('port', 3306)
+        replicas.append((item, MySQLStorage({**db_config, 'host': host, 'port': int(port)})))
+    return replicas